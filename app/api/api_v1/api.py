@@ -1,7 +1,17 @@
 # -*- coding: utf-8 -*-
 from fastapi import APIRouter, Depends
 
-from app.api.api_v1.endpoints import documents, embeddings, load, red_lines, sentiments
+from app.api.api_v1.endpoints import (
+    documents,
+    embeddings,
+    export,
+    health,
+    jobs,
+    load,
+    red_lines,
+    sentences,
+    sentiments,
+)
 from app.core.auth import auth_request
 
 dependencies = [Depends(auth_request)]
@@ -9,6 +19,10 @@ dependencies = [Depends(auth_request)]
 api_router = APIRouter(prefix="/api/v1")
 api_router.include_router(load.router, dependencies=dependencies)
 api_router.include_router(documents.router, dependencies=dependencies)
+api_router.include_router(jobs.router, dependencies=dependencies)
+api_router.include_router(sentences.router, dependencies=dependencies)
+api_router.include_router(export.router, dependencies=dependencies)
 api_router.include_router(red_lines.router, dependencies=dependencies)
 api_router.include_router(embeddings.router, dependencies=dependencies)
 api_router.include_router(sentiments.router, dependencies=dependencies)
+api_router.include_router(health.router, dependencies=dependencies)
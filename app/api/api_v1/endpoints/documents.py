@@ -1,35 +1,97 @@
 # -*- coding: utf-8 -*-
 """This module contains /documents/ router."""
-from fastapi import APIRouter, Depends, HTTPException
+import datetime
+import typing
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, desc, select
 
+from app.crud.crud_bulk import delete_documents
 from app.db.database import get_session
-from app.models import Metadata
+from app.helpers.pagination import decode_token, encode_token
+from app.helpers.search import remove_documents
+from app.models import Metadata, Sentences
 
 router = APIRouter(prefix="/documents", tags=["ETL pipeline"])
 
 
 @router.get("/latest")
 def get_latest_urls(
-    offset: int = 0, limit: int = 10, session: Session = Depends(get_session)
+    response: Response,
+    offset: int = 0,
+    limit: int = 10,
+    after: typing.Optional[str] = None,
+    session: Session = Depends(get_session),
 ):
-    query = (
-        select(Metadata.url, Metadata.created_at)
-        .order_by(desc(Metadata.date), Metadata.created_at)
+    """Lists urls of the latest documents.
+
+    Token of the following page is returned in the X-Next-After header;
+    passing it as `after` reads the page straight from the index, so its
+    cost does not depend on depth (unlike offset, kept for compatibility).
+    """
+    query = select(Metadata.url, Metadata.created_at, Metadata.date, Metadata.id)
+    if after is not None:
+        try:
+            after_date, after_created_at, after_id = decode_token(
+                after,
+                (
+                    datetime.date.fromisoformat,
+                    datetime.datetime.fromisoformat,
+                    int,
+                ),
+            )
+        except ValueError as error:
+            raise HTTPException(status_code=422, detail=str(error))
+        # date <= after_date bounds the index range scan, the rest skips
+        # documents of the same date up to the last one returned
+        query = query.where(
+            Metadata.date <= after_date,
+            or_(
+                Metadata.date < after_date,
+                and_(
+                    Metadata.date == after_date,
+                    tuple_(Metadata.created_at, Metadata.id)
+                    > (after_created_at, after_id),
+                ),
+            ),
+        )
+    rows = session.exec(
+        query.order_by(desc(Metadata.date), Metadata.created_at, Metadata.id)
         .offset(offset)
         .limit(limit)
-    )
-    return session.exec(query).all()
+    ).all()
+    if len(rows) == limit and rows:
+        last = rows[-1]
+        response.headers["X-Next-After"] = encode_token(
+            (last.date, last.created_at, last.id)
+        )
+    return [{"url": row.url, "created_at": row.created_at} for row in rows]
+
+
+@router.delete("")
+def delete_documents_by_ids(
+    ids: typing.List[int] = Query(...), session: Session = Depends(get_session)
+):
+    """Deletes documents and all related entries by ids (?ids=1&ids=2)."""
+    deleted = delete_documents(session, ids)
+    session.commit()
+    remove_documents(deleted)
+    return {
+        "detail": f"deleted {len(deleted)} documents",
+        "deleted": deleted,
+        "not_found": sorted(set(ids) - set(deleted)),
+    }
 
 
 @router.delete("/{id}")
 def delete_document_by_id(id: int, session: Session = Depends(get_session)):
     """Deletes all related entries (parent and its children) by id."""
-    data = session.get(Metadata, id)
-    if not data:
+    if not delete_documents(session, [id]):
         raise HTTPException(status_code=404, detail="Document not found")
-    session.delete(data)
     session.commit()
+    remove_documents([id])
     return {"detail": f"deleted id={id}"}
 
 
@@ -38,19 +100,55 @@ def read_document_by_id(
     id: int,
     include_themes: bool = False,
     include_text: bool = False,
+    include_sentiment: bool = False,
+    include_redlines: bool = False,
+    include_features: bool = False,
+    include_stats: bool = False,
     session: Session = Depends(get_session),
 ):
     """Reads documents.
 
-    Note: the response might also include text or features fields
-    depending on the include_features parameter.
+    Note: the response might also include themes or sentences (with their
+    sentiment, red lines, features and stats) depending on the include_*
+    parameters. Every included relationship is loaded with one query.
     """
-    metadata = session.get(Metadata, id)
+    # relationship of Sentences, key of the sentence in the response
+    annotations = [
+        (Sentences.sentiments, "sentiment", include_sentiment),
+        (Sentences.redlines, "redlines", include_redlines),
+        (Sentences.phrases, "phrases", include_features),
+        (Sentences.textstats, "textstats", include_stats),
+    ]
+    annotations = [item for item in annotations if item[2]]
+    options = []
+    if include_themes:
+        options.append(selectinload(Metadata.themes))
+    if include_text or annotations:
+        options.append(selectinload(Metadata.sentences))
+        for relationship, _, _ in annotations:
+            options.append(selectinload(Metadata.sentences).selectinload(relationship))
+    metadata = session.exec(
+        select(Metadata).where(Metadata.id == id).options(*options)
+    ).first()
     if not metadata:
         raise HTTPException(status_code=404, detail="Document not found")
     metadata_as_dict = metadata.dict()
     if include_themes:
-        metadata_as_dict["themes"] = metadata.themes
-    if include_text:
-        metadata_as_dict["sentences"] = metadata.sentences
+        metadata_as_dict["themes"] = [theme.dict() for theme in metadata.themes]
+    if include_text or annotations:
+        sentences = []
+        for sentence in sorted(
+            metadata.sentences, key=lambda s: (s.paragraph_id, s.sentence_id)
+        ):
+            sentence_as_dict = sentence.dict()
+            for relationship, key, _ in annotations:
+                related = getattr(sentence, relationship.key)
+                if isinstance(related, list):
+                    sentence_as_dict[key] = [
+                        item.dict(exclude={"sentence_id"}) for item in related
+                    ]
+                elif related is not None:
+                    sentence_as_dict[key] = related.dict(exclude={"sentence_id"})
+            sentences.append(sentence_as_dict)
+        metadata_as_dict["sentences"] = sentences
     return metadata_as_dict
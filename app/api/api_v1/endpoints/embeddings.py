@@ -1,24 +1,96 @@
 # -*- coding: utf-8 -*-
 """This module contains /embeddings router."""
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session
+import datetime
+import typing
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session, select
 
 from app.db.database import get_session
-from app.helpers.ml import nlp
+from app.helpers.inference import infer
+from app.helpers.search import Match, get_index
+from app.helpers.vectors import unpack_vector
 from app.models import Embeddings as database_model
+from app.models import Sentences
 from app.schemas import Embeddings as response_model
+from app.schemas import SimilarSentence
 
 router = APIRouter(prefix="/embeddings", tags=["NLP pipeline"])
 
 
+def search_filters(
+    document_id: typing.Optional[int] = None,
+    date_from: typing.Optional[datetime.date] = None,
+    date_to: typing.Optional[datetime.date] = None,
+    speaker: typing.Optional[str] = None,
+) -> typing.Dict[str, typing.Any]:
+    """Optional filters of similarity search."""
+    return {
+        "document_id": document_id,
+        "date_from": date_from,
+        "date_to": date_to,
+        "speaker": speaker,
+    }
+
+
+def as_similar_sentences(
+    session: Session, matches: typing.List[Match]
+) -> typing.List[SimilarSentence]:
+    """Joins matches with their sentences (keeping the ranking order)."""
+    ids = [match.sentence_id for match in matches]
+    sentences = {
+        sentence.id: sentence
+        for sentence in session.exec(select(Sentences).where(Sentences.id.in_(ids)))
+    }
+    return [
+        SimilarSentence(
+            sentence_id=match.sentence_id,
+            document_id=match.document_id,
+            score=match.score,
+            speaker=sentences[match.sentence_id].speaker,
+            text=sentences[match.sentence_id].text,
+        )
+        for match in matches
+        if match.sentence_id in sentences
+    ]
+
+
 @router.post("/embed", response_model=response_model)
 def predict_text(text: str):
-    vector = nlp(text).vector.tolist()
-    return response_model(
-        model_language=nlp.meta["lang"],
-        model_name=nlp.meta["name"],
-        vector=vector,
+    return infer("embed", [text])[0]
+
+
+@router.get("/search", response_model=typing.List[SimilarSentence])
+def search_text(
+    text: str,
+    k: int = Query(10, ge=1, le=1000),
+    filters: typing.Dict[str, typing.Any] = Depends(search_filters),
+    session: Session = Depends(get_session),
+):
+    """Finds k sentences most similar to the given text."""
+    search_index = get_index()
+    search_index.refresh(session)
+    matches = search_index.search(infer("embed", [text])[0].vector, k=k, **filters)
+    return as_similar_sentences(session, matches)
+
+
+@router.get("/search/{sentence_id}", response_model=typing.List[SimilarSentence])
+def search_sentence(
+    sentence_id: int,
+    k: int = Query(10, ge=1, le=1000),
+    filters: typing.Dict[str, typing.Any] = Depends(search_filters),
+    session: Session = Depends(get_session),
+):
+    """Finds k sentences most similar to the stored sentence."""
+    search_index = get_index()
+    search_index.refresh(session)
+    vector = search_index.vector(sentence_id)
+    if vector is None:
+        raise HTTPException(status_code=404, detail="Vector not found")
+    matches = search_index.search(
+        vector, k=k, exclude_sentence_id=sentence_id, **filters
     )
+    return as_similar_sentences(session, matches)
 
 
 @router.get("/{id}", response_model=response_model)
@@ -26,4 +98,8 @@ def read_prediction(id: int, session: Session = Depends(get_session)):
     data = session.get(database_model, id)
     if not data:
         raise HTTPException(status_code=404, detail="Vector not found")
-    return data
+    return response_model(
+        model_language=data.model_language,
+        model_name=data.model_name,
+        vector=unpack_vector(data.vector, data.dimension).tolist(),
+    )
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""This module contains /export router."""
+import datetime
+import json
+import typing
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from app.crud.crud_arrow import iter_export
+from app.crud.crud_export import iter_sentence_records
+from app.db.database import get_session
+
+router = APIRouter(prefix="/export", tags=["ETL pipeline"])
+
+
+def export_filters(
+    date_from: typing.Optional[datetime.date] = None,
+    date_to: typing.Optional[datetime.date] = None,
+    speaker: typing.Optional[str] = None,
+    document_id: typing.Optional[int] = None,
+) -> typing.Dict[str, typing.Any]:
+    """Optional filters of exported sentences."""
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "speaker": speaker,
+        "document_id": document_id,
+    }
+
+
+@router.get("/sentences.ndjson")
+def export_sentences_ndjson(
+    filters: typing.Dict[str, typing.Any] = Depends(export_filters),
+    session: Session = Depends(get_session),
+):
+    """Streams annotated sentences as newline-delimited JSON.
+
+    Every line is a sentence with its sentiment, red lines, text stats and
+    extracted features; lines are sent a chunk at a time as rows are read.
+    """
+
+    # the session is closed once the response has been streamed
+    def lines() -> typing.Iterator[str]:
+        for records in iter_sentence_records(session, **filters):
+            yield "".join(
+                json.dumps(record, default=str, ensure_ascii=False) + "\n"
+                for record in records
+            )
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/sentences.parquet")
+def export_sentences_parquet(
+    include_embeddings: bool = True,
+    filters: typing.Dict[str, typing.Any] = Depends(export_filters),
+    session: Session = Depends(get_session),
+):
+    """Streams annotated sentences as a Parquet file (a row group per chunk).
+
+    Annotations are flat typed columns (e.g. textstats_ttr), embeddings a
+    fixed-size list column.
+    """
+    return StreamingResponse(
+        iter_export(
+            session, "parquet", include_embeddings=include_embeddings, **filters
+        ),
+        media_type="application/vnd.apache.parquet",
+    )
+
+
+@router.get("/sentences.arrow")
+def export_sentences_arrow(
+    include_embeddings: bool = True,
+    filters: typing.Dict[str, typing.Any] = Depends(export_filters),
+    session: Session = Depends(get_session),
+):
+    """Streams annotated sentences as Arrow IPC stream of record batches."""
+    return StreamingResponse(
+        iter_export(session, "arrow", include_embeddings=include_embeddings, **filters),
+        media_type="application/vnd.apache.arrow.stream",
+    )
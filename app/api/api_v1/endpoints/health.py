@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""This module contains /health router."""
+import typing
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.future import Engine
+
+from app.db.database import get_engine, get_pool_status
+from app.helpers.inference import cache_stats
+from app.helpers.registry import models
+from app.schemas import ModelState, PredictionCacheStats, Readiness
+
+router = APIRouter(prefix="/health", tags=["Monitoring"])
+
+
+@router.get("/pool", response_model=typing.Dict[str, int])
+def read_pool_status(engine: Engine = Depends(get_engine)):
+    """Reads database connection pool counters."""
+    return get_pool_status(engine)
+
+
+@router.get("/ready", response_model=Readiness)
+def read_readiness(response: Response):
+    """Reports which models are loaded; 503 until warm-up (if any) is done."""
+    ready = models.ready
+    if not ready:
+        response.status_code = 503
+    return Readiness(
+        ready=ready,
+        models={
+            name: ModelState(loaded=state.loaded, load_seconds=state.load_seconds)
+            for name, state in models.status().items()
+        },
+    )
+
+
+@router.get("/cache", response_model=PredictionCacheStats)
+def read_cache_stats():
+    """Reads hit rates & size of the prediction cache (of the model server,
+    if one is used)."""
+    stats = cache_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Prediction cache is disabled")
+    return stats
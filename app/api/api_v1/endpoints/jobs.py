@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""This module contains /jobs router."""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+
+from app.db.database import get_session
+from app.models import IngestionJob as database_model
+from app.schemas import IngestionJob as response_model
+
+router = APIRouter(prefix="/jobs", tags=["ETL pipeline"])
+
+
+@router.get("/{id}", response_model=response_model)
+def read_job(id: int, session: Session = Depends(get_session)):
+    """Reads ingestion job state, per-stage progress and error (if any)."""
+    data = session.get(database_model, id)
+    if not data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return data
@@ -1,20 +1,51 @@
 # -*- coding: utf-8 -*-
-"""This module contains /documents/ router."""
+"""This module contains /upload router."""
 import typing
 
-from fastapi import APIRouter, Depends, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
 from sqlmodel import Session
 
+from app.core.config import Settings, get_settings
+from app.core.jobs import notify_workers
+from app.crud.crud_archive import InvalidArchive, get_process_pool, ingest_archive
 from app.crud.crud_html import create_html_processor
+from app.crud.crud_jobs import enqueue_document
 from app.db.database import get_session
+from app.schemas import ArchiveSummary
 
 router = APIRouter(prefix="/upload", tags=["ETL pipeline"])
 
 
-@router.post("/", response_model=typing.Dict[str, int])
+@router.post("/", response_model=typing.Dict[str, int], status_code=202)
 def upload_html(file: UploadFile, session: Session = Depends(get_session)):
-    """Uploads new documents."""
+    """Uploads new documents.
+
+    The document is validated and stored right away, while its processing
+    is queued; use /jobs/{job_id} to follow the progress.
+    """
     html_contents = file.file.read()
     document = create_html_processor(html_contents)
-    document.create(session)
-    return {"status": 201}
+    job = enqueue_document(session, document)
+    notify_workers()
+    return {"status": 202, "job_id": job.id}
+
+
+@router.post("/archive", response_model=ArchiveSummary)
+def upload_archive(
+    file: UploadFile,
+    session: Session = Depends(get_session),
+    settings: Settings = Depends(get_settings),
+):
+    """Uploads zip or tar(.gz) archive of exported pages.
+
+    Documents are extracted and annotated in parallel; already stored
+    documents are skipped. Returns per-file summary.
+    """
+    try:
+        return ingest_archive(
+            session, file.file, get_process_pool(settings.ARCHIVE_WORKERS)
+        )
+    except InvalidArchive as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 """This module contains /classification router."""
-from fastapi import APIRouter, Depends, HTTPException
+import typing
+
+from fastapi import APIRouter, Body, Depends, HTTPException
 from sqlmodel import Session
 
-from app.crud.crud_html import classifier
 from app.db.database import get_session
+from app.helpers.inference import infer
+from app.helpers.red_lines import DEFAULT_BATCH_SIZE
 from app.models import RedLines as database_model
 from app.schemas import RedLines as response_model
 
@@ -13,7 +16,14 @@ router = APIRouter(prefix="/classifier", tags=["NLP pipeline"])
 
 @router.post("/predict", response_model=response_model)
 def predict_text(text: str):
-    return classifier.store(text)
+    return infer("red_lines", [text])[0]
+
+
+@router.post("/predict_batch", response_model=typing.List[response_model])
+def predict_texts(
+    texts: typing.List[str] = Body(...), batch_size: int = DEFAULT_BATCH_SIZE
+):
+    return infer("red_lines", texts, batch_size=batch_size)
 
 
 @router.get("/{id}", response_model=response_model)
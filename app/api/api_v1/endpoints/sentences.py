@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""This module contains /sentences router."""
+import datetime
+import typing
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import REAL, and_, cast, func, literal_column, or_
+from sqlmodel import Session, select
+
+from app.db.database import get_session
+from app.helpers.pagination import decode_token, encode_token
+from app.helpers.registry import get_nlp
+from app.helpers.transform import lemmatize
+from app.models import Metadata, Sentences
+from app.models.models import TEXT_SEARCH_CONFIG
+from app.schemas import SentenceMatch, SentenceSearchResults
+
+router = APIRouter(prefix="/sentences", tags=["ETL pipeline"])
+
+
+@router.get("/search", response_model=SentenceSearchResults)
+def search_sentences(
+    query: str,
+    speaker: typing.Optional[str] = None,
+    date_from: typing.Optional[datetime.date] = None,
+    date_to: typing.Optional[datetime.date] = None,
+    document_id: typing.Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    after: typing.Optional[str] = None,
+    session: Session = Depends(get_session),
+):
+    """Full-text search over lemmatized sentences, ranked by relevance.
+
+    The query is lemmatized the same way as stored sentences, so any form
+    of a word matches. Pass `next` of a response as `after` to read the
+    following page.
+    """
+    lemmas = lemmatize(get_nlp()(query))
+    if not lemmas:
+        raise HTTPException(status_code=422, detail="Query has no searchable words")
+    text_search = Sentences.__table__.c.text_search
+    tsquery = func.plainto_tsquery(
+        literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig"), lemmas
+    )
+    rank = func.ts_rank(text_search, tsquery)
+
+    statement = (
+        select(
+            Sentences.id,
+            Sentences.document_id,
+            Metadata.date,
+            Sentences.speaker,
+            Sentences.text,
+            rank.label("rank"),
+        )
+        .join(Metadata, Metadata.id == Sentences.document_id)
+        .where(text_search.op("@@")(tsquery))
+    )
+    if speaker is not None:
+        statement = statement.where(Sentences.speaker == speaker)
+    if date_from is not None:
+        statement = statement.where(Metadata.date >= date_from)
+    if date_to is not None:
+        statement = statement.where(Metadata.date <= date_to)
+    if document_id is not None:
+        statement = statement.where(Sentences.document_id == document_id)
+    if after is not None:
+        try:
+            after_rank, after_id = decode_token(after, (float, int))
+        except ValueError as error:
+            raise HTTPException(status_code=422, detail=str(error))
+        # ts_rank() returns real, compared without loss of precision
+        after_rank = cast(after_rank, REAL)
+        statement = statement.where(
+            or_(rank < after_rank, and_(rank == after_rank, Sentences.id > after_id))
+        )
+
+    rows = session.exec(
+        statement.order_by(rank.desc(), Sentences.id).limit(limit + 1)
+    ).all()
+    results = [
+        SentenceMatch(
+            sentence_id=row.id,
+            document_id=row.document_id,
+            date=row.date,
+            speaker=row.speaker,
+            text=row.text,
+            rank=row.rank,
+        )
+        for row in rows[:limit]
+    ]
+    next_token = None
+    if len(rows) > limit:
+        next_token = encode_token((results[-1].rank, results[-1].sentence_id))
+    return SentenceSearchResults(results=results, next=next_token)
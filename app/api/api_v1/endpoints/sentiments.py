@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 """This module contains /sentiment router."""
-from fastapi import APIRouter, Depends, HTTPException
+import typing
+
+from fastapi import APIRouter, Body, Depends, HTTPException
 from sqlmodel import Session
 
-from app.crud.crud_html import sentiment
 from app.db.database import get_session
+from app.helpers.inference import infer
 from app.models import Sentiment as database_model
 from app.schemas import Sentiment as response_model
 
@@ -13,7 +15,12 @@ router = APIRouter(prefix="/sentiment", tags=["NLP pipeline"])
 
 @router.post("/predict", response_model=response_model)
 def predict_text(text: str):
-    return sentiment.predict(text)
+    return infer("sentiment", [text])[0]
+
+
+@router.post("/predict_batch", response_model=typing.List[response_model])
+def predict_texts(texts: typing.List[str] = Body(...)):
+    return infer("sentiment", texts)
 
 
 @router.get("/{id}", response_model=response_model)
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""This module contains command-line entry points.
+
+Usage:
+    python -m app.cli ingest "exports/*.html" --workers 8 --batch-size 50
+    python -m app.cli build-index /data/ann --nlist 4096
+    python -m app.cli export sentences.parquet --date-from 2022-01-01
+    python -m app.cli serve-models --socket /run/speeches/models.sock
+
+Documents are extracted and annotated across worker processes (each loads
+the models once) and written in batched transactions. Completed documents
+are appended to a checkpoint file, so an interrupted run resumes where it
+stopped.
+
+build-index (re)builds the approximate similarity index of all stored
+embeddings (see app.helpers.ann); API workers pick the new one up on
+their next refresh.
+
+export writes annotated sentences as Parquet or Arrow IPC stream (see
+app.crud.crud_arrow), a record batch at a time.
+
+serve-models runs the model server (see app.helpers.inference) that API
+workers send their NLP requests to when INFERENCE_SOCKET is set.
+"""
+import argparse
+import datetime
+import glob
+import logging
+import os
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.core.config import get_settings
+from app.db.database import create_db_engine
+from app.schemas import AnnotatedDocument
+
+# modules used by a single subcommand (e.g. pyarrow of export) are imported
+# by the subcommand, so that the others do not pay for them
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = "ingest.checkpoint"
+
+
+def read_document_id(path: str) -> typing.Optional[int]:
+    from app.crud.crud_html import read_document_id as read_id
+
+    return read_id(Path(path).read_bytes())
+
+
+def annotate_file(path: str) -> AnnotatedDocument:
+    from app.crud.crud_html import annotate_html
+
+    return annotate_html(Path(path).read_bytes())
+
+
+def collect_paths(pattern: str) -> typing.List[str]:
+    """Expands a directory (searched recursively for HTML files) or a glob."""
+    if os.path.isdir(pattern):
+        paths = [
+            str(path)
+            for path in Path(pattern).rglob("*")
+            if path.suffix.lower() in (".html", ".htm")
+        ]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(paths)
+
+
+def read_checkpoint(path: Path) -> typing.Set[str]:
+    """Reads paths of the files completed by previous runs."""
+    if not path.exists():
+        return set()
+    with path.open("r", encoding="utf-8") as file_content:
+        return {
+            line.rstrip("\n").split("\t", 1)[1] for line in file_content if line.strip()
+        }
+
+
+def ingest(
+    pattern: str,
+    workers: int,
+    batch_size: int,
+    checkpoint: Path,
+) -> None:
+    from app.crud.crud_bulk import existing_ids, insert_documents
+
+    completed = read_checkpoint(checkpoint)
+    paths = [path for path in collect_paths(pattern) if path not in completed]
+    logger.info("%s files to process (%s in checkpoint)", len(paths), len(completed))
+    engine = create_db_engine(get_settings())
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    with pool, Session(engine) as session, checkpoint.open(
+        "a", encoding="utf-8"
+    ) as checkpoint_file:
+
+        def mark_completed(items: typing.Iterable[typing.Tuple[typing.Any, str]]):
+            for document_id, path in items:
+                checkpoint_file.write(f"{document_id}\t{path}\n")
+            checkpoint_file.flush()
+
+        # skip invalid files and documents that are already stored
+        document_ids = pool.map(read_document_id, paths, chunksize=16)
+        candidates = []
+        for path, document_id in zip(paths, document_ids):
+            if document_id is None:
+                logger.warning("Invalid HTML: %s", path)
+            else:
+                candidates.append((document_id, path))
+        stored = set()
+        for start in range(0, len(candidates), 1000):
+            chunk = candidates[start : start + 1000]
+            stored |= existing_ids(session, (idx for idx, _ in chunk))
+        mark_completed(item for item in candidates if item[0] in stored)
+        queued, seen = [], set()
+        for document_id, path in candidates:
+            if document_id not in stored and document_id not in seen:
+                seen.add(document_id)
+                queued.append((document_id, path))
+        logger.info("%s new documents", len(queued))
+
+        # keep a bounded number of files in flight while writing batches
+        in_flight: typing.Dict[Future, typing.Tuple[int, str]] = {}
+        batch: typing.List[typing.Tuple[AnnotatedDocument, int, str]] = []
+        written = 0
+        queued.reverse()
+        while queued or in_flight:
+            while queued and len(in_flight) < workers * 2:
+                document_id, path = queued.pop()
+                in_flight[pool.submit(annotate_file, path)] = (document_id, path)
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                document_id, path = in_flight.pop(future)
+                try:
+                    batch.append((future.result(), document_id, path))
+                except Exception as generic_exception:
+                    logger.error("Failed to process %s: %r", path, generic_exception)
+            if len(batch) >= batch_size or (not queued and not in_flight and batch):
+                insert_documents(session, [annotated for annotated, _, _ in batch])
+                session.commit()
+                mark_completed((document_id, path) for _, document_id, path in batch)
+                written += len(batch)
+                logger.info("Written %s/%s documents", written, len(seen))
+                batch = []
+    engine.dispose()
+
+
+def build_index(path: str, nlist: typing.Optional[int]) -> None:
+    from app.helpers.ann import build_index_from_db
+
+    engine = create_db_engine(get_settings())
+    with Session(engine) as session:
+        build_index_from_db(session, path, nlist=nlist)
+    engine.dispose()
+
+
+def export(path: Path, file_format: str, **kwargs: typing.Any) -> None:
+    from app.crud.crud_arrow import FORMATS, write_export
+
+    if file_format not in FORMATS:
+        raise SystemExit(f"Unknown format {file_format!r}, use one of {FORMATS}")
+    engine = create_db_engine(get_settings())
+    with Session(engine) as session, path.open("wb") as sink:
+        n_rows = write_export(session, sink, file_format, **kwargs)
+    engine.dispose()
+    logger.info("Exported %s sentences to %s", n_rows, path)
+
+
+def serve_models(
+    socket: typing.Optional[str],
+    max_batch_size: typing.Optional[int],
+    max_wait_ms: typing.Optional[float],
+) -> None:
+    from app.helpers.cache import create_prediction_cache, set_prediction_cache
+    from app.helpers.inference import ModelServer
+
+    settings = get_settings()
+    address = socket or settings.INFERENCE_SOCKET
+    if not address:
+        raise SystemExit("Pass --socket or set INFERENCE_SOCKET")
+    set_prediction_cache(create_prediction_cache(settings, create_db_engine(settings)))
+    server = ModelServer(
+        address,
+        authkey=settings.SECRET_TOKEN.encode(),
+        max_batch_size=max_batch_size or settings.INFERENCE_MAX_BATCH_SIZE,
+        max_wait=(
+            max_wait_ms / 1000
+            if max_wait_ms is not None
+            else settings.INFERENCE_MAX_WAIT
+        ),
+    )
+    server.serve_forever()
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="bulk load exported pages into the database"
+    )
+    ingest_parser.add_argument("pattern", help="directory or glob of HTML files")
+    ingest_parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    ingest_parser.add_argument(
+        "--batch-size", type=int, default=50, help="documents per transaction"
+    )
+    ingest_parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=Path(DEFAULT_CHECKPOINT),
+        help="file with completed documents (used to resume)",
+    )
+
+    index_parser = subparsers.add_parser(
+        "build-index", help="build approximate similarity index of embeddings"
+    )
+    index_parser.add_argument("path", help="index directory")
+    index_parser.add_argument(
+        "--nlist", type=int, default=None, help="number of lists (default sqrt(n))"
+    )
+
+    export_parser = subparsers.add_parser(
+        "export", help="export annotated sentences as Parquet/Arrow"
+    )
+    export_parser.add_argument("path", type=Path, help="output file")
+    export_parser.add_argument(
+        "--format",
+        default=None,
+        help="parquet or arrow (defaults to the file extension, else parquet)",
+    )
+    export_parser.add_argument("--date-from", type=datetime.date.fromisoformat)
+    export_parser.add_argument("--date-to", type=datetime.date.fromisoformat)
+    export_parser.add_argument("--speaker")
+    export_parser.add_argument("--document-id", type=int)
+    export_parser.add_argument(
+        "--no-embeddings", action="store_true", help="skip embedding vectors"
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve-models", help="run model server with micro-batching"
+    )
+    serve_parser.add_argument(
+        "--socket", default=None, help="unix socket (defaults to INFERENCE_SOCKET)"
+    )
+    serve_parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=None,
+        help="texts per batch (defaults to INFERENCE_MAX_BATCH_SIZE)",
+    )
+    serve_parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=None,
+        help="wait for more requests after the first one "
+        "(defaults to INFERENCE_MAX_WAIT)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "ingest":
+        ingest(args.pattern, args.workers, args.batch_size, args.checkpoint)
+    elif args.command == "build-index":
+        build_index(args.path, args.nlist)
+    elif args.command == "export":
+        file_format = args.format or (
+            "arrow" if args.path.suffix in (".arrow", ".arrows") else "parquet"
+        )
+        export(
+            args.path,
+            file_format,
+            include_embeddings=not args.no_embeddings,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            speaker=args.speaker,
+            document_id=args.document_id,
+        )
+    elif args.command == "serve-models":
+        serve_models(args.socket, args.max_batch_size, args.max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""This module contains compression of stored raw exports.
+
+The codec is recorded next to every compressed value, so that rows written
+with a different codec (or uncompressed ones) are still read correctly.
+"""
+import gzip
+
+import zstandard
+
+IDENTITY = "identity"
+GZIP = "gzip"
+ZSTD = "zstd"
+CODECS = (IDENTITY, GZIP, ZSTD)
+DEFAULT_CODEC = ZSTD
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 9
+
+
+def compress(data: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == GZIP:
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == IDENTITY:
+        return data
+    raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == GZIP:
+        return gzip.decompress(data)
+    if codec == IDENTITY:
+        return data
+    raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
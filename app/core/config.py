@@ -28,6 +28,45 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     DATABASE_URI: Optional[PostgresDsn] = None
+    # connection pool of the application-wide engine
+    POOL_SIZE: int = 5
+    MAX_OVERFLOW: int = 10
+    POOL_PRE_PING: bool = True
+    POOL_RECYCLE: int = 1800
+    # background processing of uploads (0 disables workers in this process)
+    INGEST_WORKERS: int = 1
+    INGEST_POLL_INTERVAL: float = 5.0
+    # seconds a job stays leased to its worker without progress; abandoned
+    # jobs are claimed again up to INGEST_MAX_ATTEMPTS times
+    INGEST_LEASE: float = 600.0
+    INGEST_MAX_ATTEMPTS: int = 3
+    # processes used for archive uploads (defaults to the number of cores)
+    ARCHIVE_WORKERS: Optional[int] = None
+    # seconds between checks for new rows of in-memory embeddings index
+    SEARCH_REFRESH_INTERVAL: float = 30.0
+    # load similarity index at startup & refresh it in the background, rather
+    # than in search requests
+    WARM_UP_SEARCH_INDEX: bool = True
+    # directory of disk-persisted approximate index (exact search if unset)
+    ANN_INDEX_PATH: Optional[str] = None
+    ANN_NPROBE: int = 16
+    # load models at startup, in the background (see /health/ready), rather
+    # than on first use
+    WARM_UP_MODELS: bool = False
+    # unix socket of the model server (models run in process if unset) and
+    # micro-batching of its requests
+    INFERENCE_SOCKET: Optional[str] = None
+    INFERENCE_MAX_BATCH_SIZE: int = 32
+    INFERENCE_MAX_WAIT: float = 0.002
+    INFERENCE_TIMEOUT: float = 60.0
+    # predictions cached in process (LRU of PREDICTION_CACHE_SIZE entries) and
+    # in the prediction_cache table, whose least recently used rows beyond
+    # MAX_ROWS (or unused for MAX_AGE_DAYS) are evicted
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_SIZE: int = 10_000
+    PREDICTION_CACHE_PERSIST: bool = True
+    PREDICTION_CACHE_MAX_ROWS: Optional[int] = 1_000_000
+    PREDICTION_CACHE_MAX_AGE_DAYS: Optional[int] = None
 
     @root_validator
     def assemble_db_connection(cls, values: Dict[str, Any]) -> Any:
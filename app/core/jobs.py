@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""This module contains background workers that process queued ingestion jobs."""
+import logging
+import threading
+import typing
+
+from sqlalchemy.future import Engine
+from sqlmodel import Session
+
+from app.crud.crud_jobs import (
+    DEFAULT_LEASE,
+    DEFAULT_MAX_ATTEMPTS,
+    LeaseLost,
+    claim_next_job,
+    process_job,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionWorkers:
+    """Pool of threads that claim and process queued ingestion jobs.
+
+    Workers poll the queue every poll_interval seconds; notify() wakes them
+    up right away after a job has been queued by this process. Jobs abandoned
+    by crashed workers are claimed again once their lease expires.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        n_workers: int = 1,
+        poll_interval: float = 5,
+        lease: float = DEFAULT_LEASE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.engine = engine
+        self.n_workers = n_workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: typing.List[threading.Thread] = []
+
+    def start(self) -> None:
+        for number in range(self.n_workers):
+            thread = threading.Thread(
+                target=self._run, name=f"ingestion-worker-{number}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        """Stops workers once they finish their current job."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                processed = self._process_next()
+            except Exception as generic_exception:
+                # e.g. database is unavailable, retry after poll_interval
+                logger.exception(generic_exception)
+                processed = False
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+
+    def _process_next(self) -> bool:
+        with Session(self.engine) as session:
+            job = claim_next_job(
+                session, lease=self.lease, max_attempts=self.max_attempts
+            )
+            if job is None:
+                return False
+            logger.info(
+                "Processing job id=%s (document id=%s)", job.id, job.document_id
+            )
+            try:
+                process_job(session, job)
+            except LeaseLost:
+                logger.warning("Job id=%s was claimed again by another worker", job.id)
+            except Exception as generic_exception:
+                logger.error("Job id=%s failed: %r", job.id, generic_exception)
+        return True
+
+
+_workers: typing.Optional[IngestionWorkers] = None
+
+
+def start_workers(
+    engine: Engine,
+    n_workers: int,
+    poll_interval: float,
+    lease: float = DEFAULT_LEASE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> None:
+    """Starts application-wide ingestion workers - called on startup."""
+    global _workers
+    if _workers is None and n_workers > 0:
+        _workers = IngestionWorkers(
+            engine, n_workers, poll_interval, lease=lease, max_attempts=max_attempts
+        )
+        _workers.start()
+
+
+def stop_workers() -> None:
+    """Stops application-wide ingestion workers - called on shutdown."""
+    global _workers
+    if _workers is not None:
+        _workers.stop()
+        _workers = None
+
+
+def notify_workers() -> None:
+    """Wakes up idle workers (if any run in this process)."""
+    if _workers is not None:
+        _workers.notify()
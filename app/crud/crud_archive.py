@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""This module contains bulk ingestion of zip/tar archives of exported pages.
+
+Document ids are read in process (parsing metadata only); annotation of new
+documents runs across a process pool, so each page is sent to it once.
+Documents which are already stored are skipped using one set query per chunk
+of files.
+"""
+import multiprocessing
+import os
+import tarfile
+import typing
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlmodel import Session
+
+from app.crud.crud_bulk import existing_ids, insert_documents
+from app.crud.crud_html import annotate_html, read_document_id
+from app.helpers.search import refresh_if_loaded
+from app.schemas import AnnotatedDocument, ArchiveFile, ArchiveSummary
+
+HTML_SUFFIXES = (".html", ".htm")
+# files read from the archive (and held in memory) at a time
+CHUNK_SIZE = 64
+
+_pool: typing.Optional[ProcessPoolExecutor] = None
+
+
+class InvalidArchive(ValueError):
+    pass
+
+
+def get_process_pool(max_workers: typing.Optional[int] = None) -> ProcessPoolExecutor:
+    """Returns application-wide process pool, creating it on first use.
+
+    Workers are spawned (rather than forked from a multi-threaded server)
+    and keep their models loaded between archives.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=max_workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Stops application-wide process pool - called on shutdown."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def iter_archive(
+    fileobj: typing.BinaryIO,
+) -> typing.Iterator[typing.Tuple[str, bytes]]:
+    """Yields (name, contents) of HTML files stored in zip or tar(.gz) archive.
+
+    Raises InvalidArchive if the archive is corrupted (possibly after some
+    files have been yielded).
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        try:
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(
+                        HTML_SUFFIXES
+                    ):
+                        yield info.filename, archive.read(info)
+        except (zipfile.BadZipFile, zlib.error, EOFError) as error:
+            raise InvalidArchive(f"Corrupted zip archive: {error}")
+        return
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError:
+        raise InvalidArchive("Expected zip or tar(.gz) archive")
+    try:
+        with archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(HTML_SUFFIXES):
+                    extracted = archive.extractfile(member)
+                    if extracted is not None:
+                        yield member.name, extracted.read()
+    except (tarfile.TarError, zlib.error, EOFError) as error:
+        raise InvalidArchive(f"Corrupted tar archive: {error}")
+
+
+def chunked(
+    iterable: typing.Iterable[typing.Any], size: int
+) -> typing.Iterator[typing.List[typing.Any]]:
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ingest_archive(
+    db: Session, fileobj: typing.BinaryIO, pool: ProcessPoolExecutor
+) -> ArchiveSummary:
+    """Creates documents out of every new valid HTML file in the archive.
+
+    Each chunk of new documents is written in a single transaction; its files
+    are reported as created once it has been committed (or as failed).
+    """
+    files: typing.List[ArchiveFile] = []
+    seen: typing.Set[int] = set()
+    for chunk in chunked(iter_archive(fileobj), CHUNK_SIZE):
+        document_ids = [read_document_id(html_contents) for _, html_contents in chunk]
+        stored = existing_ids(db, (idx for idx in document_ids if idx is not None))
+
+        new = []
+        for (name, html_contents), document_id in zip(chunk, document_ids):
+            if document_id is None:
+                files.append(ArchiveFile(name=name, status="invalid"))
+            elif document_id in stored or document_id in seen:
+                files.append(ArchiveFile(name=name, id=document_id, status="duplicate"))
+            else:
+                seen.add(document_id)
+                new.append(
+                    (name, document_id, pool.submit(annotate_html, html_contents))
+                )
+
+        annotated: typing.List[typing.Tuple[str, AnnotatedDocument]] = []
+        for name, document_id, future in new:
+            try:
+                annotated.append((name, future.result()))
+            except Exception as generic_exception:
+                files.append(
+                    ArchiveFile(
+                        name=name,
+                        id=document_id,
+                        status="failed",
+                        detail=repr(generic_exception),
+                    )
+                )
+        try:
+            insert_documents(db, [document for _, document in annotated])
+            db.commit()
+        except Exception as generic_exception:
+            db.rollback()
+            status, detail = "failed", repr(generic_exception)
+        else:
+            status, detail = "created", None
+        files.extend(
+            ArchiveFile(
+                name=name, id=document.document.id, status=status, detail=detail
+            )
+            for name, document in annotated
+        )
+        if annotated and status == "created":
+            refresh_if_loaded(db)
+    return ArchiveSummary(
+        created=sum(f.status == "created" for f in files),
+        duplicate=sum(f.status == "duplicate" for f in files),
+        invalid=sum(f.status == "invalid" for f in files),
+        failed=sum(f.status == "failed" for f in files),
+        files=files,
+    )
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""This module contains columnar (Arrow/Parquet) export of annotated sentences.
+
+Rows of crud_export.sentences_query are converted into typed Arrow record
+batches a chunk at a time (nested annotations become flat prefixed columns,
+embeddings a fixed-size list column), so pandas reads them without parsing.
+"""
+import json
+import typing
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import types
+from sqlmodel import Session
+
+from app.crud.crud_export import sentences_query
+from app.helpers.search import latest_dimension
+from app.helpers.vectors import unpack_vector
+
+# rows per record batch (and Parquet row group)
+CHUNK_SIZE = 10_000
+FORMATS = ("parquet", "arrow")
+
+PHRASES_TYPE = pa.list_(
+    pa.struct(
+        [
+            ("entity_type", pa.string()),
+            ("label", pa.string()),
+            ("match", pa.string()),
+            ("match_processed", pa.string()),
+            ("span_location", pa.list_(pa.int32())),
+        ]
+    )
+)
+
+
+def _arrow_type(sql_type: types.TypeEngine) -> pa.DataType:
+    if isinstance(sql_type, types.Integer):
+        return pa.int64()
+    if isinstance(sql_type, types.Float):
+        return pa.float64()
+    if isinstance(sql_type, types.Date):
+        return pa.date32()
+    if isinstance(sql_type, types.DateTime):
+        return pa.timestamp("us")
+    # strings (JSON columns are stored serialized)
+    return pa.string()
+
+
+def _embeddings_array(
+    rows: typing.Sequence[typing.Any], dimension: int
+) -> pa.FixedSizeListArray:
+    # missing vectors are NaN (rather than null, which Parquet readers do not
+    # support for fixed-size lists)
+    vectors = np.full((len(rows), dimension), np.nan, dtype=np.float32)
+    for position, row in enumerate(rows):
+        if row.embedding_dimension == dimension:
+            vectors[position] = unpack_vector(row.embedding_vector, dimension)
+    return pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), dimension)
+
+
+def record_batches(
+    db: Session,
+    include_embeddings: bool = True,
+    chunk_size: int = CHUNK_SIZE,
+    **filters: typing.Any,
+) -> typing.Tuple[pa.Schema, typing.Iterator[pa.RecordBatch]]:
+    """Returns schema and (lazy) record batches of annotated sentences."""
+    dimension = None
+    if include_embeddings:
+        dimension = latest_dimension(db)
+    query = sentences_query(embeddings=dimension is not None, **filters)
+
+    columns = []
+    for column in query.selected_columns:
+        if column.key in ("embedding_dimension", "embedding_vector"):
+            continue
+        name = column.key.replace("__", "_")
+        if column.key == "phrases":
+            columns.append((column.key, pa.field(name, PHRASES_TYPE)))
+        else:
+            columns.append((column.key, pa.field(name, _arrow_type(column.type))))
+    fields = [field for _, field in columns]
+    if dimension is not None:
+        fields.append(pa.field("embedding", pa.list_(pa.float32(), dimension)))
+    schema = pa.schema(fields)
+
+    def batches() -> typing.Iterator[pa.RecordBatch]:
+        result = db.execute(
+            query.execution_options(stream_results=True, yield_per=chunk_size)
+        )
+        for rows in result.partitions(chunk_size):
+            arrays = []
+            for key, field in columns:
+                values = [row._mapping[key] for row in rows]
+                if field.type == pa.string():
+                    values = [
+                        value
+                        if value is None or isinstance(value, str)
+                        else json.dumps(value, ensure_ascii=False)
+                        for value in values
+                    ]
+                arrays.append(pa.array(values, type=field.type))
+            if dimension is not None:
+                arrays.append(_embeddings_array(rows, dimension))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    return schema, batches()
+
+
+class _Chunks:
+    """Write-only file object whose contents are drained after every batch."""
+
+    def __init__(self):
+        self.closed = False
+        self._parts: typing.List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def _writer(sink: typing.Any, schema: pa.Schema, file_format: str):
+    if file_format == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    if file_format == "arrow":
+        return pa.ipc.new_stream(sink, schema)
+    raise ValueError(f"Unknown format {file_format!r}, expected one of {FORMATS}")
+
+
+def write_export(
+    db: Session, sink: typing.Any, file_format: str = "parquet", **kwargs: typing.Any
+) -> int:
+    """Writes Parquet file or Arrow IPC stream; returns number of rows."""
+    schema, batches = record_batches(db, **kwargs)
+    n_rows = 0
+    with _writer(sink, schema, file_format) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            n_rows += batch.num_rows
+    return n_rows
+
+
+def iter_export(
+    db: Session, file_format: str = "parquet", **kwargs: typing.Any
+) -> typing.Iterator[bytes]:
+    """Yields bytes of Parquet file or Arrow IPC stream, a batch at a time."""
+    schema, batches = record_batches(db, **kwargs)
+    sink = _Chunks()
+    with _writer(sink, schema, file_format) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""This module contains set-based bulk writes of annotated documents.
+
+Instead of flushing an ORM object graph row by row, every table is written
+with a few multi-row INSERT statements; generated sentence ids are read back
+with RETURNING and used to wire up the child rows. Deletes rely on
+ON DELETE CASCADE foreign keys, so a document is removed with one statement.
+"""
+import datetime
+import typing
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from app.core.compression import DEFAULT_CODEC, compress
+from app.helpers.vectors import pack_vector
+from app.models import (
+    Embeddings,
+    Exports,
+    ExtractedFeatures,
+    Metadata,
+    RedLines,
+    Sentences,
+    Sentiment,
+    TextStatistics,
+    Themes,
+)
+from app.schemas import AnnotatedDocument
+
+# rows per INSERT ... VALUES ... RETURNING statement
+CHUNK_SIZE = 1000
+
+SentenceKey = typing.Tuple[int, int, int]
+Row = typing.Dict[str, typing.Any]
+
+
+def insert_documents(
+    db: Session,
+    documents: typing.Sequence[AnnotatedDocument],
+    store_exports: bool = True,
+) -> None:
+    """Inserts annotated documents within the session's transaction.
+
+    store_exports=False skips the raw exports, e.g. when they were stored
+    before the document got annotated. The caller is responsible for
+    committing (or rolling back).
+    """
+    if not documents:
+        return
+    now = datetime.datetime.utcnow()
+    if store_exports:
+        db.execute(
+            insert(Exports.__table__),
+            [
+                {
+                    "id": annotated.document.id,
+                    "html_contents": compress(annotated.html_contents),
+                    "html_codec": DEFAULT_CODEC,
+                    "created_at": now,
+                }
+                for annotated in documents
+            ],
+        )
+    db.execute(
+        insert(Metadata.__table__),
+        [
+            {
+                "id": annotated.document.id,
+                "created_at": now,
+                "title": annotated.document.title,
+                "date": annotated.document.date,
+                "url": str(annotated.document.url),
+            }
+            for annotated in documents
+        ],
+    )
+    themes = [
+        {
+            "document_id": annotated.document.id,
+            "category": theme.category,
+            "theme": theme.theme,
+        }
+        for annotated in documents
+        for theme in annotated.document.themes or []
+    ]
+    if themes:
+        db.execute(insert(Themes.__table__), themes)
+
+    sentence_ids = _insert_sentences(db, documents)
+    textstats: typing.List[Row] = []
+    redlines: typing.List[Row] = []
+    embeddings: typing.List[Row] = []
+    sentiments: typing.List[Row] = []
+    phrases: typing.List[Row] = []
+    for annotated in documents:
+        for item in annotated.sentences:
+            sentence_id = sentence_ids[_sentence_key(item.sentence)]
+            if item.textstats is not None:
+                textstats.append({"sentence_id": sentence_id, **item.textstats.dict()})
+            redlines.append(
+                {
+                    "sentence_id": sentence_id,
+                    "predicted_at": now,
+                    **item.redlines.dict(),
+                }
+            )
+            embeddings.append(
+                {
+                    "sentence_id": sentence_id,
+                    "model_language": item.embeddings.model_language,
+                    "model_name": item.embeddings.model_name,
+                    "dimension": len(item.embeddings.vector),
+                    "vector": pack_vector(item.embeddings.vector),
+                }
+            )
+            sentiments.append(
+                {
+                    "sentence_id": sentence_id,
+                    "predicted_at": now,
+                    **item.sentiment.dict(),
+                }
+            )
+            phrases.extend(
+                {"sentence_id": sentence_id, **phrase} for phrase in item.phrases
+            )
+    for table, rows in (
+        (TextStatistics.__table__, textstats),
+        (RedLines.__table__, redlines),
+        (Embeddings.__table__, embeddings),
+        (Sentiment.__table__, sentiments),
+        (ExtractedFeatures.__table__, phrases),
+    ):
+        if rows:
+            # executemany is batched into multi-row VALUES by psycopg2's
+            # execute_values (SQLAlchemy's default executemany_mode)
+            db.execute(insert(table), rows)
+
+
+def existing_ids(db: Session, ids: typing.Iterable[int]) -> typing.Set[int]:
+    """Returns ids (out of the given ones) of documents that are already stored."""
+    ids = list(ids)
+    if not ids:
+        return set()
+    return set(db.exec(select(Exports.id).where(Exports.id.in_(ids))).all())
+
+
+def delete_documents(db: Session, ids: typing.Iterable[int]) -> typing.List[int]:
+    """Deletes documents (and every row referencing them) by id.
+
+    Deleting the raw exports cascades to metadata, themes, sentences and
+    their children within the database. Returns ids of deleted documents;
+    the caller is responsible for committing.
+    """
+    ids = list(ids)
+    if not ids:
+        return []
+    statement = (
+        delete(Exports.__table__)
+        .where(Exports.id.in_(select(Metadata.id).where(Metadata.id.in_(ids))))
+        .returning(Exports.id)
+    )
+    return sorted(row.id for row in db.execute(statement))
+
+
+def _sentence_key(sentence) -> SentenceKey:
+    return (sentence.document_id, sentence.paragraph_id, sentence.sentence_id)
+
+
+def _insert_sentences(
+    db: Session, documents: typing.Sequence[AnnotatedDocument]
+) -> typing.Dict[SentenceKey, int]:
+    """Inserts sentences and maps (document, paragraph, sentence) to row id."""
+    table = Sentences.__table__
+    rows = [
+        item.sentence.dict() for annotated in documents for item in annotated.sentences
+    ]
+    sentence_ids: typing.Dict[SentenceKey, int] = {}
+    for start in range(0, len(rows), CHUNK_SIZE):
+        statement = (
+            insert(table)
+            .values(rows[start : start + CHUNK_SIZE])
+            .returning(
+                table.c.id,
+                table.c.document_id,
+                table.c.paragraph_id,
+                table.c.sentence_id,
+            )
+        )
+        for row in db.execute(statement):
+            sentence_ids[(row.document_id, row.paragraph_id, row.sentence_id)] = row.id
+    return sentence_ids
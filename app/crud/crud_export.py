@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""This module contains streaming export of annotated sentences.
+
+Sentences are joined with their sentiment, red lines and text statistics
+(one-to-one) while extracted features are aggregated into a JSON array per
+sentence, so every sentence is exactly one row. Rows are read through a
+server-side cursor, a chunk at a time.
+"""
+import datetime
+import typing
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlmodel import Session, select
+
+from app.models import (
+    Embeddings,
+    ExtractedFeatures,
+    Metadata,
+    RedLines,
+    Sentences,
+    Sentiment,
+    TextStatistics,
+)
+
+# rows fetched from the server-side cursor at a time
+CHUNK_SIZE = 1000
+
+Record = typing.Dict[str, typing.Any]
+
+# nested objects of a record: key -> columns
+GROUPS = {
+    "sentiment": [
+        Sentiment.__table__.c.model_name,
+        Sentiment.__table__.c.prediction,
+        Sentiment.__table__.c.prediction_label,
+    ],
+    "redlines": [
+        RedLines.__table__.c.model_name,
+        RedLines.__table__.c.model_version,
+        RedLines.__table__.c.prediction,
+    ],
+    "textstats": [
+        column
+        for column in TextStatistics.__table__.c
+        if column.name not in ("id", "sentence_id")
+    ],
+}
+
+
+def sentences_query(
+    date_from: typing.Optional[datetime.date] = None,
+    date_to: typing.Optional[datetime.date] = None,
+    speaker: typing.Optional[str] = None,
+    document_id: typing.Optional[int] = None,
+    embeddings: bool = False,
+):
+    """Returns query of annotated sentences (one row per sentence).
+
+    embeddings=True adds packed vectors (embedding_dimension and
+    embedding_vector columns).
+    """
+    features = ExtractedFeatures.__table__.c
+    phrases = (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "entity_type",
+                        features.entity_type,
+                        "label",
+                        features.label,
+                        "match",
+                        features.match,
+                        "match_processed",
+                        features.match_processed,
+                        "span_location",
+                        features.span_location,
+                    ),
+                    features.id,
+                )
+            )
+        )
+        .where(features.sentence_id == Sentences.id)
+        .scalar_subquery()
+    )
+    query = (
+        select(
+            Sentences.id,
+            Sentences.document_id,
+            Metadata.date,
+            Sentences.paragraph_id,
+            Sentences.sentence_id,
+            Sentences.speaker,
+            Sentences.text,
+            Sentences.text_lemmatized,
+            *(
+                column.label(f"{group}__{column.name}")
+                for group, columns in GROUPS.items()
+                for column in columns
+            ),
+            phrases.label("phrases"),
+        )
+        .join(Metadata, Metadata.id == Sentences.document_id)
+        .outerjoin(Sentiment, Sentiment.sentence_id == Sentences.id)
+        .outerjoin(RedLines, RedLines.sentence_id == Sentences.id)
+        .outerjoin(TextStatistics, TextStatistics.sentence_id == Sentences.id)
+    )
+    if embeddings:
+        query = query.add_columns(
+            Embeddings.dimension.label("embedding_dimension"),
+            Embeddings.vector.label("embedding_vector"),
+        ).outerjoin(Embeddings, Embeddings.sentence_id == Sentences.id)
+    if date_from is not None:
+        query = query.where(Metadata.date >= date_from)
+    if date_to is not None:
+        query = query.where(Metadata.date <= date_to)
+    if speaker is not None:
+        query = query.where(Sentences.speaker == speaker)
+    if document_id is not None:
+        query = query.where(Sentences.document_id == document_id)
+    return query.order_by(Sentences.id)
+
+
+def as_record(row: typing.Any) -> Record:
+    """Converts a row into a record with nested annotations."""
+    record: Record = {}
+    for key, value in row._mapping.items():
+        group, _, name = key.partition("__")
+        if name:
+            record.setdefault(group, {})[name] = value
+        else:
+            record[key] = value if key != "phrases" else value or []
+    for group in GROUPS:
+        # missing (outer joined) annotation
+        if all(value is None for value in record[group].values()):
+            record[group] = None
+    return record
+
+
+def iter_sentence_records(
+    db: Session, chunk_size: int = CHUNK_SIZE, **filters: typing.Any
+) -> typing.Iterator[typing.List[Record]]:
+    """Yields chunks of annotated sentence records matching the filters.
+
+    Memory use is bounded by chunk_size, however many rows match.
+    """
+    result = db.execute(
+        sentences_query(**filters).execution_options(
+            stream_results=True, yield_per=chunk_size
+        )
+    )
+    for rows in result.partitions(chunk_size):
+        yield [as_record(row) for row in rows]
@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
+import typing
+
 from fastapi import HTTPException
 from sqlmodel import Session
 
-from app.helpers.ml import create_pipeline, nlp
-from app.helpers.red_lines import RedLinesClassifier
-from app.helpers.sentiment import SentimentScorer
-from app.helpers.textstats import calculate_stats
+from app import schemas
+from app.crud.crud_bulk import insert_documents
+from app.helpers.analysis import DocumentAnalysis
+from app.helpers.inference import infer
+from app.helpers.parsing import parse_page
+from app.helpers.registry import get_key_phrase_matcher
+from app.helpers.search import refresh_if_loaded
+from app.helpers.textstats import calculate_stats_many
 from app.helpers.transform import InvalidHTML, Transformer
+from app.helpers.vectors import pack_vector
 from app.models import (
     Embeddings,
     Exports,
@@ -19,9 +26,8 @@ from app.models import (
     Themes,
 )
 
-KeyPhraseMatcher = create_pipeline()
-classifier = RedLinesClassifier()
-sentiment = SentimentScorer()
+# annotation stages, in order
+STAGES = ("parse", "red_lines", "sentiment", "features")
 
 
 class CRUDHTHML:
@@ -32,84 +38,155 @@ class CRUDHTHML:
         id_check = db.get(Metadata, self.backend.document_id)
         return bool(id_check)
 
-    def create(self, db: Session) -> None:
+    def annotate(
+        self, on_stage: typing.Optional[typing.Callable[[str], None]] = None
+    ) -> schemas.AnnotatedDocument:
+        """Runs all annotation stages over the document.
+
+        on_stage is called with the name of each stage (see STAGES) as it starts.
+        """
+        notify = on_stage if on_stage is not None else lambda stage: None
+        notify("parse")
+        analysis = DocumentAnalysis(self.backend, get_key_phrase_matcher())
+        texts = [item.sentence.text for item in analysis.sentences]
+        notify("red_lines")
+        red_lines_predictions = infer("red_lines", texts)
+        notify("sentiment")
+        sentiment_predictions = infer("sentiment", texts)
+        notify("features")
+        textstats = calculate_stats_many(texts)
+        sentences = [
+            schemas.AnnotatedSentence(
+                sentence=item.sentence,
+                textstats=stats,
+                redlines=prediction,
+                embeddings=schemas.Embeddings(
+                    model_language=analysis.model_meta["lang"],
+                    model_name=analysis.model_meta["name"],
+                    vector=item.vector,
+                ),
+                sentiment=sentiment_prediction,
+                phrases=list(analysis.key_phrases(item)),
+            )
+            for item, prediction, sentiment_prediction, stats in zip(
+                analysis.sentences,
+                red_lines_predictions,
+                sentiment_predictions,
+                textstats,
+            )
+        ]
+        return schemas.AnnotatedDocument(
+            document=analysis.document,
+            html_contents=self.backend.html_contents,
+            sentences=sentences,
+        )
+
+    def create(self, db: Session, bulk: bool = True) -> None:
+        """Annotates the document and writes it in a single transaction.
+
+        bulk=True inserts each table with a few multi-row statements,
+        bulk=False builds the ORM object graph and lets the session flush it.
+        """
         if self.is_present(db):
             raise HTTPException(
                 status_code=409, detail="This file has already been added"
             )
-        model = self.backend.as_model()
-        metadata = Metadata(
-            id=model.id, title=model.title, date=model.date, url=model.url
+        annotated = self.annotate()
+        if bulk:
+            insert_documents(db, [annotated])
+        else:
+            db.add(as_metadata(annotated))
+        db.commit()
+        refresh_if_loaded(db)
+
+
+def as_metadata(annotated: schemas.AnnotatedDocument) -> Metadata:
+    """Builds ORM object graph of an annotated document."""
+    model = annotated.document
+    metadata = Metadata(id=model.id, title=model.title, date=model.date, url=model.url)
+    metadata.raw_export = Exports.from_html(model.id, annotated.html_contents)
+    if model.themes is not None:
+        for value in model.themes:
+            theme = Themes(
+                document_id=model.id, category=value.category, theme=value.theme
+            )
+            metadata.themes.append(theme)
+    for item in annotated.sentences:
+        sent = item.sentence
+        sentence = Sentences(
+            document_id=sent.document_id,
+            paragraph_id=sent.paragraph_id,
+            sentence_id=sent.sentence_id,
+            speaker=sent.speaker,
+            text=sent.text,
+            text_lemmatized=sent.text_lemmatized,
         )
-        metadata.raw_export = Exports(
-            id=model.id, html_contents=self.backend.html_contents
+        if item.textstats is not None:
+            sentence.textstats = TextStatistics.from_orm(item.textstats)
+
+        prediction = item.redlines
+        sentence.redlines = RedLines(
+            sentence_id=sent.sentence_id,
+            model_language=prediction.model_language,
+            model_name=prediction.model_name,
+            model_type=prediction.model_type,
+            model_performance=prediction.model_performance,
+            model_version=prediction.model_version,
+            prediction=prediction.prediction,
         )
-        if model.themes is not None:
-            for value in model.themes:
-                theme = Themes(
-                    document_id=model.id, category=value.category, theme=value.theme
-                )
-                metadata.themes.append(theme)
-        for sent in model.sentences:
-            sentence = Sentences(
-                document_id=sent.document_id,
-                paragraph_id=sent.paragraph_id,
-                sentence_id=sent.sentence_id,
-                speaker=sent.speaker,
-                text=sent.text,
-                text_lemmatized=sent.text_lemmatized,
-            )
-            ts = calculate_stats(sentence.text)
-            if ts is not None:
-                sentence.textstats = TextStatistics.from_orm(ts)
-
-            prediction = classifier.store(sent.text)
-            sentence.redlines = RedLines(
-                sentence_id=sent.sentence_id,
-                model_language=prediction.model_language,
-                model_name=prediction.model_name,
-                model_type=prediction.model_type,
-                model_performance=prediction.model_performance,
-                model_version=prediction.model_version,
-                prediction=prediction.prediction,
-            )
 
-            vector = nlp(sent.text).vector.tolist()
-            sentence.embeddings = Embeddings(
-                sentence_id=sent.sentence_id,
-                model_language=nlp.meta["lang"],
-                model_name=nlp.meta["name"],
-                vector=vector,
-            )
+        sentence.embeddings = Embeddings(
+            sentence_id=sent.sentence_id,
+            model_language=item.embeddings.model_language,
+            model_name=item.embeddings.model_name,
+            dimension=len(item.embeddings.vector),
+            vector=pack_vector(item.embeddings.vector),
+        )
 
-            sentiment_prediction = sentiment.predict(sent.text)
-            sentence.sentiments = Sentiment(
-                sentence_id=sent.sentence_id,
-                model_name=sentiment_prediction.model_name,
-                tokenizer_name=sentiment_prediction.tokenizer_name,
-                prediction=sentiment_prediction.prediction,
-                prediction_label=sentiment_prediction.prediction_label,
-            )
+        sentiment_prediction = item.sentiment
+        sentence.sentiments = Sentiment(
+            sentence_id=sent.sentence_id,
+            model_name=sentiment_prediction.model_name,
+            tokenizer_name=sentiment_prediction.tokenizer_name,
+            prediction=sentiment_prediction.prediction,
+            prediction_label=sentiment_prediction.prediction_label,
+        )
 
-            data_tuple = [(sentence.text, "discard")]
-            for noun_phrase in KeyPhraseMatcher.yield_key_phrases(data_tuple):
-                phrase = ExtractedFeatures(
-                    sentence_id=sentence.id,
-                    entity_type=noun_phrase["entity_type"],
-                    label=noun_phrase["label"],
-                    match=noun_phrase["match"],
-                    match_processed=noun_phrase["match_processed"],
-                    span_location=noun_phrase["span_location"],
-                )
-                sentence.phrases.append(phrase)
-            metadata.sentences.append(sentence)
-        db.add(metadata)
-        db.commit()
+        for noun_phrase in item.phrases:
+            phrase = ExtractedFeatures(
+                sentence_id=sentence.id,
+                entity_type=noun_phrase["entity_type"],
+                label=noun_phrase["label"],
+                match=noun_phrase["match"],
+                match_processed=noun_phrase["match_processed"],
+                span_location=noun_phrase["span_location"],
+            )
+            sentence.phrases.append(phrase)
+        metadata.sentences.append(sentence)
+    return metadata
 
 
 def create_html_processor(html_contents: bytes) -> CRUDHTHML:
     try:
-        backend = Transformer(html_contents=html_contents, nlp_model=nlp)
+        backend = Transformer(html_contents=html_contents)
     except InvalidHTML:
         raise HTTPException(status_code=422, detail="Unprocessable entity")
     return CRUDHTHML(backend=backend)
+
+
+def read_document_id(html_contents: bytes) -> typing.Optional[int]:
+    """Returns document id of a valid export (None if HTML is invalid).
+
+    Parses metadata only, so no model gets loaded.
+    """
+    try:
+        return parse_page(html_contents).metadata().document_id
+    except InvalidHTML:
+        return None
+
+
+def annotate_html(html_contents: bytes) -> schemas.AnnotatedDocument:
+    """Extracts & annotates an export; picklable entry point for process pools,
+    where each worker process loads the models once (on first use)."""
+    backend = Transformer(html_contents=html_contents)
+    return CRUDHTHML(backend=backend).annotate()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""This module contains ingestion jobs queue backed by the ingestion_jobs table.
+
+Uploads store the raw export together with a queued job; background workers
+claim queued jobs with SELECT ... FOR UPDATE SKIP LOCKED, so several worker
+threads (or processes) never pick the same job.
+
+A claimed job is leased to its worker: the lease (claimed_at) is renewed as
+the job moves through its stages, and running jobs whose lease has expired
+(the worker crashed or the app was redeployed mid-job) are claimed again,
+up to max_attempts times before they are marked as failed.
+"""
+import datetime
+import typing
+
+from fastapi import HTTPException
+from sqlmodel import Session, and_, or_, select
+
+from app.crud.crud_bulk import insert_documents
+from app.crud.crud_html import CRUDHTHML, STAGES
+from app.helpers.search import refresh_if_loaded
+from app.helpers.transform import Transformer
+from app.models import Exports, IngestionJob
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# annotation stages followed by the database write
+JOB_STAGES = (*STAGES, "write")
+
+# seconds a claimed job stays leased to its worker without progress
+DEFAULT_LEASE = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class LeaseLost(RuntimeError):
+    """The job was claimed again by another worker (or finished) meanwhile."""
+
+
+def enqueue_document(db: Session, document: CRUDHTHML) -> IngestionJob:
+    """Stores raw export of a validated document and queues its processing."""
+    document_id = document.backend.document_id
+    if db.get(Exports, document_id) is not None:
+        raise HTTPException(status_code=409, detail="This file has already been added")
+    db.add(Exports.from_html(document_id, document.backend.html_contents))
+    job = IngestionJob(
+        document_id=document_id,
+        state=QUEUED,
+        progress={stage: "pending" for stage in JOB_STAGES},
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_next_job(
+    db: Session,
+    lease: float = DEFAULT_LEASE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> typing.Optional[IngestionJob]:
+    """Marks the oldest queued (or abandoned running) job as running and
+    returns it, leased to the caller for lease seconds."""
+    while True:
+        now = datetime.datetime.utcnow()
+        query = (
+            select(IngestionJob)
+            .where(
+                or_(
+                    IngestionJob.state == QUEUED,
+                    and_(
+                        IngestionJob.state == RUNNING,
+                        IngestionJob.claimed_at
+                        < now - datetime.timedelta(seconds=lease),
+                    ),
+                )
+            )
+            .order_by(IngestionJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = db.exec(query).first()
+        if job is None:
+            db.rollback()
+            return None
+        if job.attempts >= max_attempts:
+            _fail(db, job, f"Lease expired {job.attempts} times")
+            continue
+        job.state = RUNNING
+        job.attempts += 1
+        job.claimed_at = now
+        job.updated_at = now
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+
+def _renew_lease(db: Session, job: IngestionJob) -> None:
+    """Locks the job and renews its lease; raises LeaseLost if the job is no
+    longer leased to the caller."""
+    claimed_at = job.claimed_at
+    db.refresh(job, with_for_update=True)
+    if job.state != RUNNING or job.claimed_at != claimed_at:
+        db.rollback()
+        raise LeaseLost(f"Job id={job.id} was claimed again")
+    job.claimed_at = datetime.datetime.utcnow()
+
+
+def _fail(db: Session, job: IngestionJob, error: str) -> None:
+    """Marks the job as failed and removes its export (so that the file could
+    be uploaded again)."""
+    export = db.get(Exports, job.document_id)
+    if export is not None:
+        db.delete(export)
+    job.state = FAILED
+    job.error = error
+    job.updated_at = datetime.datetime.utcnow()
+    db.add(job)
+    db.commit()
+
+
+def set_stage(db: Session, job: IngestionJob, stage: str) -> None:
+    """Marks previous stages as done and the given stage as running
+    (renewing the lease of the job)."""
+    _renew_lease(db, job)
+    index = JOB_STAGES.index(stage)
+    progress = {
+        name: DONE if position < index else RUNNING if position == index else "pending"
+        for position, name in enumerate(JOB_STAGES)
+    }
+    job.stage = stage
+    job.progress = progress
+    job.updated_at = datetime.datetime.utcnow()
+    db.add(job)
+    db.commit()
+
+
+def process_job(db: Session, job: IngestionJob) -> None:
+    """Annotates the stored export and writes the document.
+
+    On failure the export is removed (so that the file could be uploaded
+    again) and the error is recorded on the job, unless the job has been
+    claimed again by another worker meanwhile (LeaseLost is raised then).
+    """
+    try:
+        export = db.get(Exports, job.document_id)
+        if export is None:
+            raise ValueError(f"Export id={job.document_id} not found")
+        document = CRUDHTHML(backend=Transformer(html_contents=export.html))
+        annotated = document.annotate(on_stage=lambda stage: set_stage(db, job, stage))
+        set_stage(db, job, "write")
+        # the job stays locked until the document and its state are committed
+        _renew_lease(db, job)
+        insert_documents(db, [annotated], store_exports=False)
+        job.state = DONE
+        job.stage = None
+        job.progress = {stage: DONE for stage in JOB_STAGES}
+        job.updated_at = datetime.datetime.utcnow()
+        db.add(job)
+        db.commit()
+    except LeaseLost:
+        raise
+    except Exception as generic_exception:
+        db.rollback()
+        _renew_lease(db, job)
+        _fail(db, job, repr(generic_exception))
+        raise
+    refresh_if_loaded(db)
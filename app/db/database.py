@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 """This module contains database engine & session generator."""
+import threading
 import typing
 
 from fastapi import Depends
@@ -8,10 +9,55 @@ from sqlmodel import Session, create_engine
 
 from app.core.config import Settings, get_settings
 
+_engine: typing.Optional[Engine] = None
+_engine_lock = threading.Lock()
 
-def get_engine(settings: Settings = Depends(get_settings)):
-    """Creates connection engine - used for dependency injection."""
-    return create_engine(str(settings.DATABASE_URI))
+
+def create_db_engine(settings: Settings) -> Engine:
+    """Creates connection engine with a connection pool."""
+    return create_engine(
+        str(settings.DATABASE_URI),
+        pool_size=settings.POOL_SIZE,
+        max_overflow=settings.MAX_OVERFLOW,
+        pool_pre_ping=settings.POOL_PRE_PING,
+        pool_recycle=settings.POOL_RECYCLE,
+    )
+
+
+def init_engine(settings: Settings) -> Engine:
+    """Creates application-wide engine once - called on startup."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_db_engine(settings)
+    return _engine
+
+
+def dispose_engine() -> None:
+    """Closes pooled connections of application-wide engine - called on shutdown."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+def get_engine(settings: Settings = Depends(get_settings)) -> Engine:
+    """Returns application-wide engine - used for dependency injection."""
+    if _engine is not None:
+        return _engine
+    return init_engine(settings)
+
+
+def get_pool_status(engine: Engine) -> typing.Dict[str, int]:
+    """Reads connection pool counters (for monitoring)."""
+    pool = engine.pool
+    return {
+        "size": pool.size(),  # type: ignore
+        "checked_out": pool.checkedout(),  # type: ignore
+        "overflow": pool.overflow(),  # type: ignore
+        "idle": pool.checkedin(),  # type: ignore
+    }
 
 
 def get_session(engine: Engine = Depends(get_engine)) -> typing.Iterator[Session]:
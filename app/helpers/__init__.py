@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
 from app.helpers.ml import create_pipeline
-from app.helpers.textstats import calculate_stats
+from app.helpers.textstats import calculate_stats, calculate_stats_many
 from app.helpers.transform import Transformer
 
-__all__ = ["create_pipeline", "calculate_stats", "Transformer"]
+__all__ = [
+    "create_pipeline",
+    "calculate_stats",
+    "calculate_stats_many",
+    "Transformer",
+]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""This module contains document-level analysis shared by annotation stages."""
+import typing
+
+import numpy as np
+from spacy.tokens import Span
+
+from app.helpers.ml import ML
+from app.helpers.transform import CleanedText, Transformer
+from app.schemas import Document, Sentence
+
+
+class SentenceAnalysis(typing.NamedTuple):
+    """Sentence schema paired with its span from the paragraph parse."""
+
+    sentence: Sentence
+    span: Span
+    cleaned: CleanedText
+
+    @property
+    def vector(self) -> typing.List[float]:
+        """Average of the tokens kept in the stored text (as if it was parsed)."""
+        start = self.span.start_char
+        tokens = [
+            token
+            for token in self.span
+            if self.cleaned.locate(token.idx - start, token.idx - start + len(token))
+        ]
+        if not tokens or len(tokens) == len(self.span):
+            return self.span.vector.tolist()
+        return np.mean([token.vector for token in tokens], axis=0).tolist()
+
+
+class DocumentAnalysis:
+    """Keeps the paragraph parses made by Transformer so that lemmas,
+    vectors, key phrases and named entities all come from a single parse."""
+
+    def __init__(self, backend: Transformer, matcher: ML):
+        self.backend = backend
+        self.matcher = matcher
+        self.document: Document = backend.as_model()
+        self.sentences = [
+            SentenceAnalysis(sentence=sentence, span=span, cleaned=cleaned)
+            for sentence, span, cleaned in zip(
+                self.document.sentences, backend.spans, backend.cleaned  # type: ignore
+            )
+        ]
+
+    @property
+    def model_meta(self) -> typing.Dict[str, typing.Any]:
+        """Metadata of the spaCy model the document was parsed with."""
+        return self.backend.nlp.meta
+
+    def key_phrases(
+        self, item: SentenceAnalysis
+    ) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        return self.matcher.yield_sentence_key_phrases(item.span, cleaned=item.cleaned)
@@ -0,0 +1,679 @@
+# -*- coding: utf-8 -*-
+"""This module contains disk-persisted approximate similarity search (IVF).
+
+Layout of an index directory:
+
+    CURRENT                  name of the active generation
+    lock                     held by processes writing to the index
+    <generation>/
+        meta.json            dimension, number of lists & last embeddings id
+        centroids.npy        (nlist, dimension) normalized list centroids
+        offsets.npy          start of every list in the arrays below
+        vectors.npy          (n, dimension) normalized vectors grouped by list
+        sentence_ids.npy, document_ids.npy, dates.npy, speakers.npy
+        speakers.json        speaker names (indexed by codes of speakers.npy)
+        deleted.npy          sentence ids of deleted documents
+        deltas.json          names of the active delta segments & gaps in the
+                             indexed ids (see search.fetch_added)
+        delta-<last id>-<t>/ rows added after the generation was built
+            vectors.npy, sentence_ids.npy, document_ids.npy, dates.npy,
+            speakers.npy
+
+Arrays are opened with numpy.load(mmap_mode="r"), so opening an index is
+instant and its pages are shared (through the page cache) by every process
+reading it. Search scores nprobe lists closest to the query and, exactly,
+delta segments; once there are more than MAX_DELTAS of them, they are merged
+into one. Rebuilding the index (python -m app.cli build-index) folds delta
+segments in and drops deleted rows.
+"""
+import contextlib
+import datetime
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import typing
+from pathlib import Path
+
+import numpy as np
+from sqlmodel import Session, func, select
+
+from app.helpers.search import (
+    MAX_GAPS,
+    EmbeddingRows,
+    Gap,
+    Match,
+    fetch_added,
+    fetch_embeddings,
+    missing_ranges,
+)
+from app.models import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NPROBE = 16
+# vectors used to train list centroids
+SAMPLE_SIZE = 100_000
+ITERATIONS = 10
+# budget of a (rows, nlist) score matrix computed at once
+SCORES_BUDGET = 2**24
+ARRAYS = ("sentence_ids", "document_ids", "dates", "speakers")
+# delta segments are merged into one once there are more of them
+MAX_DELTAS = 8
+RE_DELTA = re.compile(r"delta-(\d+)")
+
+
+class _Delta(typing.NamedTuple):
+    vectors: np.ndarray
+    sentence_ids: np.ndarray
+    document_ids: np.ndarray
+    dates: np.ndarray
+    speakers: np.ndarray
+
+
+class _State(typing.NamedTuple):
+    generation: typing.Optional[str]
+    last_id: int
+    dimension: int
+    centroids: np.ndarray
+    offsets: np.ndarray
+    vectors: np.ndarray
+    sentence_ids: np.ndarray
+    document_ids: np.ndarray
+    dates: np.ndarray
+    speakers: np.ndarray
+    speaker_codes: typing.Dict[typing.Optional[str], int]
+    deltas: typing.Dict[str, _Delta]
+    gaps: typing.List[Gap]
+    deleted: np.ndarray
+
+
+def _atomic_save(path: Path, array: np.ndarray) -> None:
+    """Writes .npy file, replacing it atomically."""
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with temporary.open("wb") as file_content:
+        np.save(file_content, array)
+    os.replace(temporary, path)
+
+
+def _save_delta(path: Path, delta: _Delta) -> None:
+    """Writes a delta segment (a directory of .npy files) atomically."""
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporary.mkdir()
+    for field, array in zip(_Delta._fields, delta):
+        np.save(temporary / f"{field}.npy", array)
+    os.rename(temporary, path)
+
+
+def _delta_last_id(name: str) -> int:
+    return int(RE_DELTA.match(name).group(1))  # type: ignore
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporary.write_text(text, encoding="utf-8")
+    os.replace(temporary, path)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Returns index of the closest centroid of every vector."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    step = max(1, SCORES_BUDGET // max(1, len(centroids)))
+    for start in range(0, len(vectors), step):
+        chunk = np.asarray(vectors[start : start + step], dtype=np.float32)
+        labels[start : start + step] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(
+    sample: np.ndarray,
+    nlist: int,
+    iterations: int = ITERATIONS,
+    rng: typing.Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """Spherical k-means: returns (nlist, dimension) normalized centroids."""
+    rng = rng or np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign_lists(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        centroids[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        # empty lists are reseeded with random vectors of the sample
+        empty = np.flatnonzero(~filled)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms == 0, 1, norms)
+    return centroids
+
+
+def build_index(
+    path: typing.Union[str, Path],
+    batches: typing.Iterable[EmbeddingRows],
+    last_id: int = 0,
+    nlist: typing.Optional[int] = None,
+    sample_size: int = SAMPLE_SIZE,
+    seed: int = 0,
+) -> str:
+    """Builds a new generation of the index and makes it current.
+
+    Rows are streamed to disk first, so memory use does not depend on the
+    number of rows. Returns name of the generation.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    generation = f"gen-{time.time_ns()}"
+    build_dir = path / f".{generation}.tmp"
+    build_dir.mkdir()
+    rng = np.random.default_rng(seed)
+
+    # 1. unsorted rows, appended to raw files
+    raw = {
+        name: (build_dir / f"{name}.raw").open("wb") for name in ("vectors",) + ARRAYS
+    }
+    speaker_codes: typing.Dict[typing.Optional[str], int] = {}
+    n_rows, dimension, read_id = 0, 0, 0
+    # ids missing from the batches (rows of transactions not committed yet)
+    gaps: typing.List[typing.Tuple[int, int]] = []
+    with contextlib.ExitStack() as stack:
+        for file_content in raw.values():
+            stack.enter_context(file_content)
+        for rows in batches:
+            dimension = rows.vectors.shape[1]
+            codes = np.fromiter(
+                (
+                    speaker_codes.setdefault(s, len(speaker_codes))
+                    for s in rows.speakers
+                ),
+                dtype=np.int32,
+                count=len(rows.speakers),
+            )
+            raw["vectors"].write(rows.vectors.astype(np.float32).tobytes())
+            raw["sentence_ids"].write(rows.sentence_ids.astype(np.int64).tobytes())
+            raw["document_ids"].write(rows.document_ids.astype(np.int64).tobytes())
+            raw["dates"].write(rows.dates.astype("datetime64[D]").tobytes())
+            raw["speakers"].write(codes.tobytes())
+            n_rows += len(codes)
+            gaps = (gaps + missing_ranges(read_id, rows.ids))[-MAX_GAPS:]
+            read_id = rows.last_id
+            last_id = max(last_id, rows.last_id)
+    if last_id > read_id:
+        gaps = (gaps + [(read_id + 1, last_id)])[-MAX_GAPS:]
+    dtypes = {
+        "sentence_ids": np.int64,
+        "document_ids": np.int64,
+        "dates": np.dtype("datetime64[D]"),
+        "speakers": np.int32,
+    }
+    if n_rows:
+        unsorted = {
+            name: np.memmap(build_dir / f"{name}.raw", dtype=dtype, mode="r")
+            for name, dtype in dtypes.items()
+        }
+        unsorted["vectors"] = np.memmap(
+            build_dir / "vectors.raw",
+            dtype=np.float32,
+            mode="r",
+            shape=(n_rows, dimension),
+        )
+    else:
+        unsorted = {name: np.empty(0, dtype) for name, dtype in dtypes.items()}
+        unsorted["vectors"] = np.empty((0, 0), np.float32)
+
+    # 2. list centroids trained on a sample, lists assigned in chunks
+    nlist = min(nlist or max(1, int(np.sqrt(n_rows))), n_rows)
+    if nlist:
+        picked = np.sort(rng.choice(n_rows, min(n_rows, sample_size), replace=False))
+        centroids = train_centroids(
+            np.asarray(unsorted["vectors"][picked]),
+            max(1, min(nlist, len(picked))),
+            rng=rng,
+        )
+    else:
+        centroids = np.empty((0, dimension), np.float32)
+    labels = assign_lists(unsorted["vectors"], centroids)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.concatenate(
+        ([0], np.cumsum(np.bincount(labels, minlength=len(centroids))))
+    ).astype(np.int64)
+
+    # 3. rows written grouped by list
+    for name, source in unsorted.items():
+        target = np.lib.format.open_memmap(
+            build_dir / f"{name}.npy",
+            mode="w+",
+            dtype=source.dtype,
+            shape=(n_rows,) + source.shape[1:],
+        )
+        step = max(1, SCORES_BUDGET // max(1, dimension))
+        for start in range(0, n_rows, step):
+            target[start : start + step] = source[order[start : start + step]]
+        target.flush()
+        del target
+    del unsorted
+    np.save(build_dir / "centroids.npy", centroids.astype(np.float32))
+    np.save(build_dir / "offsets.npy", offsets)
+    with (build_dir / "speakers.json").open("w", encoding="utf-8") as file_content:
+        json.dump(list(speaker_codes), file_content, ensure_ascii=False)
+    with (build_dir / "meta.json").open("w", encoding="utf-8") as file_content:
+        json.dump(
+            {
+                "dimension": dimension,
+                "nlist": len(centroids),
+                "count": n_rows,
+                "last_id": last_id,
+            },
+            file_content,
+        )
+    noticed = time.time()
+    _write_manifest(build_dir, [], [(first, last, noticed) for first, last in gaps])
+    for name in ("vectors",) + ARRAYS:
+        (build_dir / f"{name}.raw").unlink()
+
+    # 4. the new generation replaces the current one; sentences deleted
+    # meanwhile (after their rows were read) stay deleted
+    with _locked(path):
+        current = path / "CURRENT"
+        if current.exists():
+            deleted = _load_deleted(path / current.read_text().strip())
+            deleted = deleted[
+                np.isin(deleted, np.load(build_dir / "sentence_ids.npy", mmap_mode="r"))
+            ]
+            if len(deleted):
+                np.save(build_dir / "deleted.npy", deleted)
+        os.rename(build_dir, path / generation)
+        _atomic_write_text(path / "CURRENT", generation)
+    for old in path.glob("gen-*"):
+        # processes which still map old files keep reading them until reload
+        if old.name != generation:
+            shutil.rmtree(old, ignore_errors=True)
+    logger.info("Built index %s: %s rows, %s lists", generation, n_rows, nlist)
+    return generation
+
+
+def build_index_from_db(
+    db: Session, path: typing.Union[str, Path], nlist: typing.Optional[int] = None
+) -> str:
+    """Builds index of every stored embedding."""
+    max_id = db.exec(select(func.max(Embeddings.id))).one() or 0
+    return build_index(
+        path, fetch_embeddings(db, up_to_id=max_id), last_id=max_id, nlist=nlist
+    )
+
+
+@contextlib.contextmanager
+def _locked(path: Path) -> typing.Iterator[None]:
+    """Serializes writers of the index (across processes)."""
+    with (path / "lock").open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_manifest(
+    directory: Path, deltas: typing.List[str], gaps: typing.List[Gap]
+) -> None:
+    _atomic_write_text(
+        directory / "deltas.json", json.dumps({"deltas": deltas, "gaps": gaps})
+    )
+
+
+def _load_deleted(directory: Path) -> np.ndarray:
+    deleted = directory / "deleted.npy"
+    return np.load(deleted) if deleted.exists() else np.empty(0, np.int64)
+
+
+def _empty_state(deleted: np.ndarray) -> _State:
+    return _State(
+        generation=None,
+        last_id=0,
+        dimension=0,
+        centroids=np.empty((0, 0), np.float32),
+        offsets=np.zeros(1, np.int64),
+        vectors=np.empty((0, 0), np.float32),
+        sentence_ids=np.empty(0, np.int64),
+        document_ids=np.empty(0, np.int64),
+        dates=np.empty(0, "datetime64[D]"),
+        speakers=np.empty(0, np.int32),
+        speaker_codes={},
+        deltas={},
+        gaps=[],
+        deleted=deleted,
+    )
+
+
+def _dimension(state: _State) -> typing.Optional[int]:
+    if state.dimension:
+        return state.dimension
+    for delta in state.deltas.values():
+        return delta.vectors.shape[1]
+    return None
+
+
+class AnnIndex:
+    """Inverted-file index of normalized sentence embeddings stored on disk.
+
+    New rows (id greater than the last indexed one, or within gaps of the
+    indexed ids) are appended as delta segments by refresh(); sentence ids of deleted documents are recorded in
+    deleted.npy of the generation and filtered out at search time. Every
+    process picks up changes made by other processes on its next refresh.
+    """
+
+    def __init__(
+        self,
+        path: typing.Union[str, Path],
+        nprobe: int = DEFAULT_NPROBE,
+        refresh_interval: float = 30,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.refresh_interval = refresh_interval
+        self.last_refresh: typing.Optional[float] = None
+        self._lock = threading.Lock()
+        self._version: typing.Optional[typing.Tuple[typing.Any, ...]] = None
+        self._state = _empty_state(np.empty(0, np.int64))
+        self.reload()
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state.sentence_ids) + sum(
+            len(delta.sentence_ids) for delta in state.deltas.values()
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return True
+
+    @property
+    def last_id(self) -> int:
+        state = self._state
+        return max([state.last_id, *(_delta_last_id(n) for n in state.deltas)])
+
+    def _read_version(self) -> typing.Tuple[typing.Any, ...]:
+        current = self.path / "CURRENT"
+        generation = current.read_text().strip() if current.exists() else None
+        if generation is None:
+            return (None, None, None)
+        directory = self.path / generation
+        deleted = directory / "deleted.npy"
+        return (
+            generation,
+            (directory / "deltas.json").read_text(encoding="utf-8"),
+            deleted.stat().st_mtime_ns if deleted.exists() else None,
+        )
+
+    def reload(self) -> None:
+        """Opens files written since the last call (by any process)."""
+        with self._lock:
+            for attempt in range(3):
+                version = self._read_version()
+                if version == self._version:
+                    return
+                try:
+                    self._state = self._open(version)
+                except FileNotFoundError:
+                    # replaced by another process while reading, read again
+                    if attempt == 2:
+                        raise
+                    continue
+                self._version = version
+                return
+
+    def _open(self, version: typing.Tuple[typing.Any, ...]) -> _State:
+        generation, manifest, _ = version
+        state = self._state
+        if generation is None:
+            return _empty_state(np.empty(0, np.int64))
+        deleted = _load_deleted(self.path / generation)
+        if generation != state.generation:
+            state = self._open_generation(generation, deleted)
+        else:
+            state = state._replace(deleted=deleted)
+        manifest = json.loads(manifest)
+        deltas = {
+            name: state.deltas.get(name)
+            or self._open_delta(self.path / generation / name)
+            for name in manifest["deltas"]
+        }
+        gaps = [(first, last, noticed) for first, last, noticed in manifest["gaps"]]
+        return state._replace(deltas=deltas, gaps=gaps)
+
+    def _open_generation(self, generation: str, deleted: np.ndarray) -> _State:
+        directory = self.path / generation
+        with (directory / "meta.json").open("r", encoding="utf-8") as file_content:
+            meta = json.load(file_content)
+        with (directory / "speakers.json").open("r", encoding="utf-8") as file_content:
+            speakers = json.load(file_content)
+        arrays = {
+            name: np.load(directory / f"{name}.npy", mmap_mode="r")
+            for name in ("vectors",) + ARRAYS
+        }
+        return _State(
+            generation=generation,
+            last_id=meta["last_id"],
+            dimension=meta["dimension"],
+            centroids=np.load(directory / "centroids.npy"),
+            offsets=np.load(directory / "offsets.npy"),
+            speaker_codes={speaker: code for code, speaker in enumerate(speakers)},
+            deltas={},
+            gaps=[],
+            deleted=deleted,
+            **arrays,
+        )
+
+    @staticmethod
+    def _open_delta(path: Path) -> _Delta:
+        return _Delta(
+            **{
+                field: np.load(path / f"{field}.npy", mmap_mode="r")
+                for field in _Delta._fields
+            }
+        )
+
+    def refresh(self, db: Session, force: bool = False) -> int:
+        """Indexes rows added since the last refresh; returns their number.
+
+        Unless forced, does nothing if the last refresh is more recent
+        than refresh_interval seconds. If the index has not been built yet
+        (python -m app.cli build-index), does nothing either.
+        """
+        if (
+            not force
+            and self.last_refresh is not None
+            and time.monotonic() - self.last_refresh < self.refresh_interval
+        ):
+            return 0
+        with _locked(self.path):
+            self.reload()
+            state = self._state
+            if state.generation is None:
+                logger.warning("Index %s is missing, build it first", self.path)
+                self.last_refresh = time.monotonic()
+                return 0
+            gaps = list(state.gaps)
+            pages = list(
+                fetch_added(db, self.last_id, gaps, time.time(), _dimension(state))
+            )
+            added = sum(len(page.sentence_ids) for page in pages)
+            if pages:
+                self._add_delta(
+                    max(self.last_id, *(page.last_id for page in pages)),
+                    _Delta(
+                        vectors=np.concatenate([page.vectors for page in pages]),
+                        sentence_ids=np.concatenate(
+                            [page.sentence_ids for page in pages]
+                        ),
+                        document_ids=np.concatenate(
+                            [page.document_ids for page in pages]
+                        ),
+                        dates=np.concatenate([page.dates for page in pages]),
+                        # None is stored as "" (never matches a speaker filter)
+                        speakers=np.array(
+                            [s or "" for page in pages for s in page.speakers], str
+                        ),
+                    ),
+                    gaps,
+                )
+            elif gaps != state.gaps:
+                _write_manifest(self.path / state.generation, list(state.deltas), gaps)
+        self.reload()
+        self.last_refresh = time.monotonic()
+        return added
+
+    def _add_delta(self, last_id: int, delta: _Delta, gaps: typing.List[Gap]) -> None:
+        """Writes a delta segment and lists it in the manifest (merging the
+        segments into one once there are more than MAX_DELTAS); the caller
+        holds the lock of the index."""
+        directory = self.path / self._state.generation  # type: ignore
+        # rows found within gaps may add a segment without a greater id
+        name = f"delta-{last_id:012d}-{time.time_ns()}"
+        _save_delta(directory / name, delta)
+        names = [*self._state.deltas, name]
+        if len(names) > MAX_DELTAS:
+            parts = [*self._state.deltas.values(), delta]
+            merged = _Delta(
+                *(np.concatenate([part[i] for part in parts]) for i in range(5))
+            )
+            name = f"delta-{last_id:012d}-{time.time_ns()}"
+            _save_delta(directory / name, merged)
+            names = [name]
+        _write_manifest(directory, names, gaps)
+        # processes which still map merged segments keep reading them
+        for path in directory.glob("delta-*"):
+            if path.name not in names:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _delete_sentences_of(self, document_ids: np.ndarray) -> None:
+        """Records sentence ids of the documents as deleted; the caller holds
+        the lock of the index."""
+        state = self._state
+        sentence_ids = [
+            np.asarray(part.sentence_ids)[
+                np.isin(np.asarray(part.document_ids), document_ids)
+            ]
+            for part in (state, *state.deltas.values())
+        ]
+        _atomic_save(
+            self.path / state.generation / "deleted.npy",  # type: ignore
+            np.union1d(state.deleted, np.concatenate(sentence_ids)).astype(np.int64),
+        )
+
+    def remove_documents(self, document_ids: typing.Iterable[int]) -> None:
+        """Excludes sentences of deleted documents from search results."""
+        document_ids = np.fromiter(document_ids, np.int64)
+        if len(document_ids) == 0:
+            return
+        with _locked(self.path):
+            self.reload()
+            if self._state.generation is None:
+                return
+            self._delete_sentences_of(document_ids)
+        self.reload()
+
+    def vector(self, sentence_id: int) -> typing.Optional[np.ndarray]:
+        """Returns stored (normalized) vector of a sentence."""
+        state = self._state
+        for part in (state, *state.deltas.values()):
+            positions = np.flatnonzero(np.asarray(part.sentence_ids) == sentence_id)
+            if len(positions) and not np.isin(
+                part.sentence_ids[positions[0]], state.deleted
+            ):
+                return np.asarray(part.vectors[positions[0]])
+        return None
+
+    def search(
+        self,
+        vector: typing.Union[np.ndarray, typing.Sequence[float]],
+        k: int = 10,
+        document_id: typing.Optional[int] = None,
+        date_from: typing.Optional[datetime.date] = None,
+        date_to: typing.Optional[datetime.date] = None,
+        speaker: typing.Optional[str] = None,
+        exclude_sentence_id: typing.Optional[int] = None,
+        nprobe: typing.Optional[int] = None,
+    ) -> typing.List[Match]:
+        """Returns (approximately) k most similar sentences."""
+        state = self._state
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if len(self) == 0 or norm == 0:
+            return []
+        dimension = _dimension(state)
+        if query.shape[0] != dimension:
+            raise ValueError(
+                f"Expected vector of size {dimension}, got {query.shape[0]}"
+            )
+        query = query / norm
+
+        def candidates(part, speakers) -> typing.Tuple[np.ndarray, ...]:
+            mask = ~np.isin(part.sentence_ids, state.deleted)
+            if document_id is not None:
+                mask &= part.document_ids == document_id
+            if date_from is not None:
+                mask &= part.dates >= np.datetime64(date_from, "D")
+            if date_to is not None:
+                mask &= part.dates <= np.datetime64(date_to, "D")
+            if speaker is not None:
+                mask &= speakers
+            if exclude_sentence_id is not None:
+                mask &= part.sentence_ids != exclude_sentence_id
+            rows = np.flatnonzero(mask)
+            scores = np.asarray(part.vectors[rows], dtype=np.float32) @ query
+            return scores, part.sentence_ids[rows], part.document_ids[rows]
+
+        found = []
+        if len(state.centroids):
+            nprobe = min(nprobe or self.nprobe, len(state.centroids))
+            probed = np.argpartition(-(state.centroids @ query), nprobe - 1)[:nprobe]
+            # lists are contiguous ranges of rows, read in storage order
+            ranges = [
+                (state.offsets[i], state.offsets[i + 1])
+                for i in np.sort(probed)
+                if state.offsets[i] < state.offsets[i + 1]
+            ]
+            if ranges:
+                part = _Delta(
+                    *(
+                        np.concatenate([array[start:end] for start, end in ranges])
+                        for array in (
+                            state.vectors,
+                            state.sentence_ids,
+                            state.document_ids,
+                            state.dates,
+                            state.speakers,
+                        )
+                    )
+                )
+                found.append(
+                    candidates(
+                        part, part.speakers == state.speaker_codes.get(speaker, -1)
+                    )
+                )
+        for delta in state.deltas.values():
+            found.append(candidates(delta, delta.speakers == speaker))
+        if not found:
+            return []
+
+        scores, sentence_ids, document_ids = (np.concatenate(x) for x in zip(*found))
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Match(
+                sentence_id=int(sentence_ids[row]),
+                document_id=int(document_ids[row]),
+                score=float(scores[row]),
+            )
+            for row in top
+        ]
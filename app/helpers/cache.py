@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""This module contains the cache of model predictions.
+
+There are two tiers: an in-process LRU (bounded by the number of entries)
+in front of the prediction_cache table shared by all processes. Entries are
+keyed by (model name, model version, sha256 of whitespace-normalized text),
+so a new model version never reads predictions of the previous one. Texts
+that another thread is computing are waited for rather than recomputed.
+"""
+import collections
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import typing
+from concurrent.futures import Future
+
+from sqlalchemy import and_, delete, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.future import Engine
+from sqlmodel import Session, SQLModel
+
+from app.core.config import Settings
+from app.models import CachedPrediction
+
+logger = logging.getLogger(__name__)
+
+T = typing.TypeVar("T", bound=SQLModel)
+Key = typing.Tuple[str, str, bytes]
+
+# last_used_at of rows read from the table (or from memory) is refreshed at
+# most this often
+TOUCH_INTERVAL = datetime.timedelta(hours=1)
+# rows inserted by a process between evictions from the table
+EVICT_EVERY = 1000
+
+
+class ModelKey(typing.NamedTuple):
+    name: str
+    version: str
+
+
+def normalize_text(value: str) -> str:
+    return " ".join(value.split())
+
+
+def text_hash(value: str) -> bytes:
+    return hashlib.sha256(normalize_text(value).encode("utf-8")).digest()
+
+
+class PredictionCache:
+    """Two-tier cache of predictions, safe to share between threads."""
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        engine: typing.Optional[Engine] = None,
+        max_rows: typing.Optional[int] = None,
+        max_age: typing.Optional[datetime.timedelta] = None,
+    ):
+        self.max_entries = max_entries
+        self.engine = engine
+        self.max_rows = max_rows
+        self.max_age = max_age
+        # key -> (value, size in bytes, last touch of its row), least recently
+        # used first
+        self._entries: typing.OrderedDict[
+            Key, typing.Tuple[typing.Dict[str, typing.Any], int, datetime.datetime]
+        ] = collections.OrderedDict()
+        self._in_flight: typing.Dict[Key, Future] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._inserted = 0
+        self.counters: typing.Counter[str] = collections.Counter()
+
+    def get_many(
+        self,
+        model: ModelKey,
+        texts: typing.Sequence[str],
+        schema: typing.Type[T],
+        compute: typing.Callable[[typing.List[str]], typing.Sequence[T]],
+    ) -> typing.List[T]:
+        """Returns predictions of the texts, computing missing ones at once."""
+        keys = [(model.name, model.version, text_hash(value)) for value in texts]
+        values: typing.Dict[Key, typing.Dict[str, typing.Any]] = {}
+        waiting: typing.Dict[Key, Future] = {}
+        owned: typing.Dict[Key, str] = {}
+        # memory hits whose rows were not touched within TOUCH_INTERVAL
+        stale: typing.List[Key] = []
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            for key, value in zip(keys, texts):
+                if key in values or key in waiting or key in owned:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    values[key] = entry[0]
+                    self.counters["memory_hits"] += 1
+                    if entry[2] < now - TOUCH_INTERVAL:
+                        self._entries[key] = (entry[0], entry[1], now)
+                        stale.append(key)
+                elif key in self._in_flight:
+                    waiting[key] = self._in_flight[key]
+                    self.counters["coalesced"] += 1
+                else:
+                    self._in_flight[key] = Future()
+                    owned[key] = value
+        if stale:
+            self._touch(model, stale, now)
+        if owned:
+            try:
+                loaded = self._load_or_compute(model, owned, compute)
+            except BaseException as error:
+                with self._lock:
+                    for key in owned:
+                        self._in_flight.pop(key).set_exception(error)
+                raise
+            with self._lock:
+                for key, value in loaded.items():
+                    self._remember(key, value)
+                    self._in_flight.pop(key).set_result(value)
+            values.update(loaded)
+        for key, future in waiting.items():
+            values[key] = future.result()
+        return [schema(**values[key]) for key in keys]
+
+    def _load_or_compute(
+        self,
+        model: ModelKey,
+        owned: typing.Dict[Key, str],
+        compute: typing.Callable[[typing.List[str]], typing.Sequence[SQLModel]],
+    ) -> typing.Dict[Key, typing.Dict[str, typing.Any]]:
+        values = self._read(model, list(owned))
+        missing = [key for key in owned if key not in values]
+        with self._lock:
+            self.counters["db_hits"] += len(values)
+            self.counters["misses"] += len(missing)
+        if missing:
+            predictions = compute([owned[key] for key in missing])
+            computed = {
+                key: json.loads(prediction.json())
+                for key, prediction in zip(missing, predictions)
+            }
+            self._write(model, computed)
+            values.update(computed)
+        return values
+
+    def _remember(self, key: Key, value: typing.Dict[str, typing.Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        size = len(key[2]) + len(json.dumps(value))
+        # rows are touched when read from (or written to) the table
+        self._entries[key] = (value, size, datetime.datetime.utcnow())
+        self._bytes += size
+        while len(self._entries) > self.max_entries:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _read(
+        self, model: ModelKey, keys: typing.List[Key]
+    ) -> typing.Dict[Key, typing.Dict[str, typing.Any]]:
+        if self.engine is None:
+            return {}
+        by_hash = {key[2]: key for key in keys}
+        table = CachedPrediction.__table__
+        same_model = and_(
+            table.c.model_name == model.name,
+            table.c.model_version == model.version,
+            table.c.text_hash.in_(list(by_hash)),
+        )
+        now = datetime.datetime.utcnow()
+        try:
+            with Session(self.engine) as session:
+                rows = session.execute(
+                    select(table.c.text_hash, table.c.value).where(same_model)
+                ).all()
+                if rows:
+                    session.execute(
+                        update(table)
+                        .where(same_model, table.c.last_used_at < now - TOUCH_INTERVAL)
+                        .values(last_used_at=now)
+                    )
+                    session.commit()
+        except SQLAlchemyError as error:
+            logger.warning("Failed to read cached predictions: %r", error)
+            return {}
+        return {by_hash[bytes(row.text_hash)]: row.value for row in rows}
+
+    def _touch(
+        self, model: ModelKey, keys: typing.List[Key], now: datetime.datetime
+    ) -> None:
+        """Refreshes last_used_at of rows served from memory (so that evict
+        does not take them for unused ones)."""
+        if self.engine is None:
+            return
+        table = CachedPrediction.__table__
+        try:
+            with Session(self.engine) as session:
+                session.execute(
+                    update(table)
+                    .where(
+                        table.c.model_name == model.name,
+                        table.c.model_version == model.version,
+                        table.c.text_hash.in_([key[2] for key in keys]),
+                        table.c.last_used_at < now - TOUCH_INTERVAL,
+                    )
+                    .values(last_used_at=now)
+                )
+                session.commit()
+        except SQLAlchemyError as error:
+            logger.warning("Failed to touch cached predictions: %r", error)
+
+    def _write(
+        self, model: ModelKey, values: typing.Dict[Key, typing.Dict[str, typing.Any]]
+    ) -> None:
+        if self.engine is None or not values:
+            return
+        now = datetime.datetime.utcnow()
+        rows = [
+            {
+                "model_name": model.name,
+                "model_version": model.version,
+                "text_hash": key[2],
+                "value": value,
+                "created_at": now,
+                "last_used_at": now,
+            }
+            for key, value in values.items()
+        ]
+        try:
+            with Session(self.engine) as session:
+                session.execute(
+                    insert(CachedPrediction.__table__).on_conflict_do_nothing(), rows
+                )
+                session.commit()
+                with self._lock:
+                    self._inserted += len(rows)
+                    due = self._inserted >= EVICT_EVERY
+                    if due:
+                        self._inserted = 0
+                if due:
+                    self.evict(session)
+        except SQLAlchemyError as error:
+            logger.warning("Failed to write cached predictions: %r", error)
+
+    def evict(self, session: Session) -> int:
+        """Deletes rows older than max_age and least recently used rows
+        beyond max_rows; returns the number of deleted rows."""
+        table = CachedPrediction.__table__
+        deleted = 0
+        if self.max_age is not None:
+            cutoff = datetime.datetime.utcnow() - self.max_age
+            deleted += session.execute(
+                delete(table).where(table.c.last_used_at < cutoff)
+            ).rowcount
+        if self.max_rows is not None:
+            # rows share last_used_at (stamped per batch), ties are broken by
+            # key so that exactly max_rows rows are kept
+            key = (table.c.model_name, table.c.model_version, table.c.text_hash)
+            evicted = (
+                select(*key)
+                .order_by(table.c.last_used_at.desc(), *(c.desc() for c in key))
+                .offset(self.max_rows)
+            )
+            deleted += session.execute(
+                delete(table).where(tuple_(*key).in_(evicted))
+            ).rowcount
+        session.commit()
+        return deleted
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            entries, memory_bytes = len(self._entries), self._bytes
+        hits = counters.get("memory_hits", 0) + counters.get("db_hits", 0)
+        lookups = hits + counters.get("misses", 0)
+        stats = {
+            "memory_entries": entries,
+            "memory_max_entries": self.max_entries,
+            "memory_bytes": memory_bytes,
+            "memory_hits": counters.get("memory_hits", 0),
+            "db_hits": counters.get("db_hits", 0),
+            "misses": counters.get("misses", 0),
+            "coalesced": counters.get("coalesced", 0),
+            "hit_rate": hits / lookups if lookups else None,
+            "db_rows": None,
+            "db_bytes": None,
+        }
+        if self.engine is not None:
+            try:
+                with self.engine.connect() as connection:
+                    # planner's estimate, counting rows would scan the table
+                    row = connection.execute(
+                        text(
+                            "SELECT reltuples::bigint AS rows, "
+                            "pg_total_relation_size(oid) AS bytes "
+                            "FROM pg_class WHERE relname = 'prediction_cache'"
+                        )
+                    ).first()
+                if row is not None:
+                    stats.update(db_rows=max(row.rows, 0), db_bytes=row.bytes)
+            except SQLAlchemyError as error:
+                logger.warning("Failed to read prediction_cache size: %r", error)
+        return stats
+
+
+def create_prediction_cache(
+    settings: Settings, engine: typing.Optional[Engine] = None
+) -> typing.Optional[PredictionCache]:
+    """Creates the cache configured by settings (None if disabled)."""
+    if not settings.PREDICTION_CACHE_ENABLED:
+        return None
+    max_age = settings.PREDICTION_CACHE_MAX_AGE_DAYS
+    return PredictionCache(
+        max_entries=settings.PREDICTION_CACHE_SIZE,
+        engine=engine if settings.PREDICTION_CACHE_PERSIST else None,
+        max_rows=settings.PREDICTION_CACHE_MAX_ROWS,
+        max_age=datetime.timedelta(days=max_age) if max_age is not None else None,
+    )
+
+
+_cache: typing.Optional[PredictionCache] = None
+
+
+def set_prediction_cache(cache: typing.Optional[PredictionCache]) -> None:
+    global _cache
+    _cache = cache
+
+
+def get_prediction_cache() -> typing.Optional[PredictionCache]:
+    return _cache
+
+
+def cached(
+    model: ModelKey,
+    texts: typing.Sequence[str],
+    schema: typing.Type[T],
+    compute: typing.Callable[[typing.List[str]], typing.Sequence[T]],
+) -> typing.List[T]:
+    """Returns predictions through the cache (if one is set)."""
+    if _cache is None or not texts:
+        return list(compute(list(texts)))
+    return _cache.get_many(model, texts, schema, compute)
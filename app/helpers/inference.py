@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""This module contains the model server and its client.
+
+The model server (python -m app.cli serve-models) owns the models, API
+workers send it texts over a local (unix) socket. Requests that arrive
+concurrently are collected into micro-batches - up to max_batch_size texts,
+waiting at most max_wait seconds after the first one - so every model runs
+one batched forward pass for all of them.
+
+Without a configured server (see set_inference_client) operations run in
+the calling process, as before. Either way predictions go through the
+prediction cache of the process running them (see app.helpers.cache).
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Connection, Listener
+
+from app.helpers.cache import ModelKey, cached, get_prediction_cache
+from app.helpers.registry import get_classifier, get_nlp, get_sentiment, models
+from app.schemas import Embeddings, RedLines, Sentiment
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT = 0.002
+DEFAULT_TIMEOUT = 60.0
+
+
+def embed_many(texts: typing.List[str]) -> typing.List[Embeddings]:
+    nlp = get_nlp()
+    model = ModelKey(
+        f"embed/{nlp.meta['lang']}_{nlp.meta['name']}", nlp.meta["version"]
+    )
+
+    def embed(misses: typing.List[str]) -> typing.List[Embeddings]:
+        return [
+            Embeddings(
+                model_language=nlp.meta["lang"],
+                model_name=nlp.meta["name"],
+                vector=doc.vector.tolist(),
+            )
+            for doc in nlp.pipe(misses)
+        ]
+
+    return cached(model, texts, Embeddings, embed)
+
+
+def _red_lines(texts: typing.List[str], **options: typing.Any) -> typing.List:
+    classifier = get_classifier()
+    return cached(
+        ModelKey(*classifier.model_key),
+        texts,
+        RedLines,
+        lambda misses: classifier.store_many(misses, **options),
+    )
+
+
+def _sentiment(texts: typing.List[str], **options: typing.Any) -> typing.List:
+    scorer = get_sentiment()
+    return cached(
+        ModelKey(*scorer.model_key),
+        texts,
+        Sentiment,
+        lambda misses: scorer.predict_batch(misses, **options),
+    )
+
+
+# operation name -> batched function (one result per text, in input order)
+OPERATIONS: typing.Dict[str, typing.Callable[..., typing.List[typing.Any]]] = {
+    "embed": embed_many,
+    "red_lines": _red_lines,
+    "sentiment": _sentiment,
+}
+# statistics of the server's prediction cache (answered without batching)
+CACHE_STATS = "cache_stats"
+# models used by the operations (loaded by the server before it listens)
+OPERATION_MODELS = {
+    "embed": "nlp",
+    "red_lines": "red_lines",
+    "sentiment": "sentiment",
+}
+
+
+class _Peer:
+    """Connection of a client; responses are sent by batching threads."""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self._lock = threading.Lock()
+
+    def send(self, request_id: int, ok: bool, result: typing.Any) -> None:
+        with self._lock:
+            try:
+                self._send((request_id, ok, result))
+            except Exception as error:
+                # e.g. a result that cannot be pickled; nothing was sent
+                logger.exception("Failed to send response %s", request_id)
+                self._send((request_id, False, _describe(error)))
+
+    def send_error(self, request_id: int, error: Exception) -> None:
+        """Sends the error as a message (exceptions may not be picklable)."""
+        self.send(request_id, False, _describe(error))
+
+    def _send(self, message: typing.Any) -> None:
+        try:
+            self.connection.send(message)
+        except (OSError, EOFError):
+            # the client went away, nobody is waiting for the response
+            pass
+
+
+def _describe(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+class _Request(typing.NamedTuple):
+    peer: _Peer
+    request_id: int
+    texts: typing.List[str]
+
+
+class ModelServer:
+    """Serves OPERATIONS over a unix socket, batching concurrent requests."""
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queues: typing.Dict[str, "queue.Queue[_Request]"] = {
+            operation: queue.Queue() for operation in OPERATIONS
+        }
+
+    def serve_forever(self) -> None:
+        models.warm_up(set(OPERATION_MODELS.values()))
+        for operation in self._queues:
+            threading.Thread(
+                target=self._run_batches,
+                args=(operation,),
+                name=f"batches-{operation}",
+                daemon=True,
+            ).start()
+        # a stale socket file is left behind if the server was killed
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, family="AF_UNIX", authkey=self.authkey) as listener:
+            logger.info("Model server listening at %s", self.address)
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError) as error:
+                    logger.warning("Rejected connection: %r", error)
+                    continue
+                threading.Thread(
+                    target=self._receive, args=(_Peer(connection),), daemon=True
+                ).start()
+
+    def _receive(self, peer: _Peer) -> None:
+        while True:
+            try:
+                request_id, operation, texts = peer.connection.recv()
+            except (OSError, EOFError):
+                break
+            except Exception:
+                # the id of a malformed request is unknown; closing the
+                # connection fails the client's pending requests at once
+                logger.exception("Failed to receive request, closing connection")
+                break
+            if operation == CACHE_STATS:
+                peer.send(request_id, True, cache_stats())
+                continue
+            if operation not in self._queues:
+                error = ValueError(f"Unknown operation {operation!r}")
+                peer.send_error(request_id, error)
+                continue
+            self._queues[operation].put(_Request(peer, request_id, texts))
+        peer.connection.close()
+
+    def _next_batch(self, pending: "queue.Queue[_Request]") -> typing.List[_Request]:
+        """Blocks for a request, then collects more until the batch is full
+        or max_wait has passed (a single request may exceed the batch size)."""
+        batch = [pending.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                request = pending.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run_batches(self, operation: str) -> None:
+        pending = self._queues[operation]
+        run = OPERATIONS[operation]
+        while True:
+            batch = self._next_batch(pending)
+            texts = [text for request in batch for text in request.texts]
+            try:
+                results = run(texts)
+            except Exception as generic_exception:
+                logger.exception("Failed to run %s", operation)
+                for request in batch:
+                    request.peer.send_error(request.request_id, generic_exception)
+                continue
+            start = 0
+            for request in batch:
+                end = start + len(request.texts)
+                request.peer.send(request.request_id, True, results[start:end])
+                start = end
+
+
+class InferenceClient:
+    """Client of the model server, shared by the threads of a process.
+
+    Requests are pipelined over a single connection and matched with
+    responses by their id; a lost connection is re-established on the
+    next request. Errors of the server are raised as RuntimeError.
+    """
+
+    def __init__(self, address: str, authkey: bytes, timeout: float = DEFAULT_TIMEOUT):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._connection: typing.Optional[Connection] = None
+        self._pending: typing.Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def run(self, operation: str, texts: typing.Sequence[str]) -> typing.List:
+        future: Future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            try:
+                connection = self._connect()
+                pending = self._pending
+                pending[request_id] = future
+                connection.send((request_id, operation, list(texts)))
+            except (OSError, EOFError) as error:
+                self._pending.pop(request_id, None)
+                self._connection = None
+                raise ConnectionError("Model server is unavailable") from error
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            pending.pop(request_id, None)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self) -> Connection:
+        if self._connection is None:
+            connection = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            # requests in flight over this connection
+            self._pending = {}
+            threading.Thread(
+                target=self._receive, args=(connection, self._pending), daemon=True
+            ).start()
+            self._connection = connection
+        return self._connection
+
+    def _receive(
+        self, connection: Connection, pending: typing.Dict[int, Future]
+    ) -> None:
+        while True:
+            try:
+                request_id, ok, result = connection.recv()
+            except (OSError, EOFError):
+                break
+            except Exception:
+                # a response that cannot be read, its request times out
+                logger.exception("Failed to receive response")
+                continue
+            future = pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+        # requests in flight are lost with the connection
+        with self._lock:
+            if self._connection is connection:
+                self._connection = None
+        for request_id in list(pending):
+            future = pending.pop(request_id, None)
+            if future is not None:
+                future.set_exception(ConnectionError("Lost connection to model server"))
+
+
+_client: typing.Optional[InferenceClient] = None
+
+
+def set_inference_client(client: typing.Optional[InferenceClient]) -> None:
+    """Sends operations to the model server (or runs them in process if None)."""
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = client
+
+
+def cache_stats() -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """Statistics of the cache used by infer (None if caching is disabled)."""
+    if _client is not None:
+        return _client.run(CACHE_STATS, [])
+    cache = get_prediction_cache()
+    return cache.stats() if cache is not None else None
+
+
+def infer(
+    operation: str, texts: typing.Sequence[str], **options: typing.Any
+) -> typing.List:
+    """Runs the operation over the texts; returns one result per text.
+
+    Options (e.g. batch_size) apply to in-process runs only, the model
+    server batches requests on its own.
+    """
+    if _client is not None:
+        return _client.run(operation, texts)
+    return OPERATIONS[operation](list(texts), **options)
@@ -9,7 +9,9 @@ from spacy.matcher import Matcher
 from spacy.symbols import VERB, nsubj, nsubjpass  # type: ignore
 from spacy.tokens import Span
 
-from app.helpers.treebank import is_vbg, is_vbn
+from app.helpers.registry import get_nlp
+from app.helpers.transform import CleanedText
+from app.helpers.treebank import VBG, VBN, verb_forms
 
 DEFAULT_PATTERNS = Path(__file__).resolve().parent / "assets" / "default_patterns.json"
 
@@ -125,24 +127,69 @@ class ML:
         for sentence, _ in self.nlp.pipe(
             sentences, as_tuples=True, batch_size=batch_size
         ):
-            for possible_subject in sentence:
-                if (
-                    possible_subject.dep in [nsubj, nsubjpass]
-                    and possible_subject.head.pos == VERB
-                ):
-                    subtree = sentence[
-                        possible_subject.left_edge.i : possible_subject.right_edge.i + 1
-                    ]
-                    yield from self.match(
-                        subtree,
-                        possible_subject=possible_subject,
-                        exclusive_search=exclusive_search,
-                    )
-                    yield from self.named_entities(subtree)
+            yield from self.yield_sentence_key_phrases(
+                sentence[:], exclusive_search=exclusive_search
+            )
+
+    def yield_sentence_key_phrases(
+        self,
+        sentence: Span,
+        exclusive_search: bool = True,
+        cleaned: typing.Optional[CleanedText] = None,
+    ) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        """Yields key noun phrases found in an already parsed sentence.
+        Parameters
+        ----------
+        sentence: spacy.tokens.Span
+            sentence span, e.g. one of doc.sents of a paragraph parse;
+            span locations are reported relative to the sentence start
+        exclusive_search: bool
+            see yield_key_phrases
+        cleaned: CleanedText
+            the sentence text as stored (see Transformer.clean_text); if given,
+            span locations index it instead, and phrases overlapping the parts
+            cleaning removes (speaker prefix, "<…>") are skipped
+        """
+        phrases = self._sentence_key_phrases(sentence, exclusive_search)
+        if cleaned is None:
+            yield from phrases
+            return
+        for phrase in phrases:
+            location = cleaned.locate(*phrase["span_location"])
+            if location is not None:
+                yield {**phrase, "span_location": location}
+
+    def _sentence_key_phrases(
+        self, sentence: Span, exclusive_search: bool
+    ) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        doc = sentence.doc
+        offset = sentence.start_char
+        for possible_subject in sentence:
+            if (
+                possible_subject.dep in [nsubj, nsubjpass]
+                and possible_subject.head.pos == VERB
+            ):
+                # token indices are doc-level, hence slicing the doc
+                subtree = doc[
+                    possible_subject.left_edge.i : possible_subject.right_edge.i + 1
+                ]
+                yield from self.match(
+                    subtree,
+                    possible_subject=possible_subject,
+                    exclusive_search=exclusive_search,
+                    offset=offset,
+                )
+                yield from self.named_entities(subtree, offset=offset)
 
     def match(
-        self, subtree: Span, possible_subject, exclusive_search: bool = True
+        self,
+        subtree: Span,
+        possible_subject,
+        exclusive_search: bool = True,
+        offset: int = 0,
     ) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        # verb-related tags of the whole doc, computed once per doc
+        forms = verb_forms(subtree.doc)
         for match_id, start, end in self.matcher(subtree):
             span = subtree[start:end]
             pos_label = self.nlp.vocab[match_id].text
@@ -152,8 +199,10 @@ class ML:
                     continue
 
                 # VERB-based phrases shoulb be of specific finegrained pos
+                # (plain ints are faster than numpy ops on a few tokens)
                 if "VERB" in pos_label and not any(
-                    is_vbg(token) or is_vbn(token) for token in span
+                    flags & (VBG | VBN)
+                    for flags in forms[span.start : span.end].tobytes()
                 ):
                     continue
                 yield {
@@ -163,11 +212,14 @@ class ML:
                     "match_processed": " ".join(
                         t.lemma_.lower() for t in span if not t.is_punct
                     ),
-                    "span_location": [span.start_char, span.end_char],
+                    "span_location": [
+                        span.start_char - offset,
+                        span.end_char - offset,
+                    ],
                 }
 
     def named_entities(
-        self, subtree: Span
+        self, subtree: Span, offset: int = 0
     ) -> typing.Iterator[typing.Dict[str, typing.Any]]:
         for en in subtree.ents:
             yield {
@@ -177,7 +229,7 @@ class ML:
                 "match_processed": " ".join(
                     t.lemma_.lower() for t in en if not t.is_punct
                 ),
-                "span_location": [en.start_char, en.end_char],
+                "span_location": [en.start_char - offset, en.end_char - offset],
             }
 
 
@@ -185,9 +237,6 @@ def create_nlp(model: str = "ru_core_news_sm") -> spacy.language.Language:
     return spacy.load(model)
 
 
-nlp = create_nlp()
-
-
 def create_pipeline(matcher: typing.Optional[Matcher] = None) -> ML:
-    """Initializes ML pipeline."""
-    return ML(nlp, matcher=matcher)
+    """Initializes ML pipeline (with the registry's spaCy model)."""
+    return ML(get_nlp(), matcher=matcher)
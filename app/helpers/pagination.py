@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""This module contains opaque tokens of keyset pagination.
+
+A token encodes sort key of the last row of a page; the following page
+starts right after it (WHERE (key) > (token)) instead of skipping rows
+with OFFSET.
+"""
+import base64
+import json
+import typing
+
+
+def encode_token(values: typing.Sequence[typing.Any]) -> str:
+    """Encodes sort key (dates are stored as ISO strings) into a token."""
+    payload = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_token(
+    token: str, types: typing.Sequence[typing.Callable[[typing.Any], typing.Any]]
+) -> typing.Tuple[typing.Any, ...]:
+    """Decodes sort key, converting its values with the given types.
+
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(token)
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError) as error:
+        raise ValueError("Invalid pagination token") from error
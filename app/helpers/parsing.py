@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""This module contains the HTML backends of Transformer.
+
+A backend parses an exported page and returns its metadata, themes and
+paragraphs. "soup" (BeautifulSoup with html.parser) is the reference; "lxml"
+walks a libxml2 tree with compiled XPath expressions and reproduces the
+reference's texts, including get_text's rules (comments, scripts, styles,
+templates and ruby annotations are skipped).
+
+libxml2 builds some markup differently from html.parser: it closes <p>,
+<li> and the like implicitly, recovers from misnested tags, normalizes
+carriage returns and resolves some entities its own way. The lxml backend
+detects such pages after parsing and hands them over to BeautifulSoup, so
+both backends return the same output for every page
+(scripts/check_html_parity.py compares them over a corpus).
+"""
+import collections
+import copy
+import html.entities
+import logging
+import re
+import typing
+
+import lxml.etree
+import lxml.html
+from bs4 import BeautifulSoup, UnicodeDammit  # type: ignore
+from bs4.element import Tag  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "lxml"
+
+
+class InvalidHTML(ValueError):
+    pass
+
+
+class Metadata(typing.NamedTuple):
+    document_id: int
+    title: str
+    date: str
+    url: str
+
+
+class Paragraph(typing.NamedTuple):
+    # text of the paragraph (parsed by the pipeline)
+    text: str
+    # stripped text without tooltips (used to detect the speaker)
+    cleaned: str
+
+
+class Page:
+    """Parsed export."""
+
+    backend: str
+
+    def metadata(self) -> Metadata:
+        raise NotImplementedError
+
+    def themes(self) -> typing.List[typing.Dict[str, str]]:
+        raise NotImplementedError
+
+    def paragraphs(self) -> typing.List[Paragraph]:
+        raise NotImplementedError
+
+
+def clean_html(tag: Tag) -> str:
+    tag_copy = copy.copy(tag)
+    for tooltip in tag_copy.find_all("span", class_="tooltip__text"):
+        tooltip.decompose()
+    for unwanted in tag_copy.find_all(["a"]):
+        unwanted.unwrap()
+    return tag_copy.get_text().strip()
+
+
+class SoupPage(Page):
+    backend = "soup"
+
+    def __init__(self, html_contents: typing.Union[bytes, str]):
+        self.soup = BeautifulSoup(html_contents, "html.parser")
+
+    def metadata(self) -> Metadata:
+        meta = self.soup.select_one("div.read__top")
+        if meta is None:
+            raise InvalidHTML("The top part of the page is missing. Inspect the page.")
+
+        url = self.soup.select_one("#material_link")
+        if url is None:
+            raise InvalidHTML("#material_link is not present. Inspect the page first.")
+
+        return Metadata(
+            document_id=int(url.text.split("/")[-1]),
+            title=meta.select_one("h1").text.replace("\xa0", " "),  # type: ignore
+            date=meta.select_one("div.read__meta > time")["datetime"],  # type: ignore
+            url=url.text,
+        )
+
+    def themes(self) -> typing.List[typing.Dict[str, str]]:
+        data = []
+        tags_block = self.soup.select_one(
+            "div.read__bottommeta.hidden-copy > div > div.read__tags.masha-ignore"
+        )
+        if tags_block is None:
+            raise InvalidHTML("Tags block is missing.")
+        for tag in tags_block.find_all(class_="read__tagscol"):
+            title = tag.h3.text.strip()
+            for li in tag.select("li"):
+                item = li.text.strip()
+                data.append({"category": title, "theme": item.strip()})
+        return data
+
+    def paragraphs(self) -> typing.List[Paragraph]:
+        return [
+            Paragraph(text=paragraph.text, cleaned=clean_html(paragraph))
+            for paragraph in self.soup.select(
+                "div.entry-content.e-content.read__internal_content > p"
+            )
+        ]
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _with_classes(tag: str, *names: str) -> str:
+    return f"{tag}[{' and '.join(_has_class(name) for name in names)}]"
+
+
+XPATH_TOP = lxml.etree.XPath(f"//{_with_classes('div', 'read__top')}")
+XPATH_LINK = lxml.etree.XPath("//*[@id = 'material_link']")
+XPATH_TIME = lxml.etree.XPath(f".//{_with_classes('div', 'read__meta')}/time")
+XPATH_TAGS = lxml.etree.XPath(
+    f"//{_with_classes('div', 'read__bottommeta', 'hidden-copy')}/div"
+    f"/{_with_classes('div', 'read__tags', 'masha-ignore')}"
+)
+XPATH_TAGSCOL = lxml.etree.XPath(f".//*[{_has_class('read__tagscol')}]")
+XPATH_PARAGRAPHS = lxml.etree.XPath(
+    f"//{_with_classes('div', 'entry-content', 'e-content', 'read__internal_content')}"
+    "/p"
+)
+
+# elements whose strings get_text skips (Script, Stylesheet, TemplateString,
+# RubyTextString and RubyParenthesisString)
+SKIPPED_TEXT = frozenset(["script", "style", "template", "rt", "rp"])
+# void elements (never closed) and elements libxml2 adds on its own
+UNCLOSED = frozenset(
+    [
+        "area",
+        "base",
+        "basefont",
+        "bgsound",
+        "br",
+        "col",
+        "command",
+        "embed",
+        "frame",
+        "hr",
+        "image",
+        "img",
+        "input",
+        "isindex",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "nextid",
+        "param",
+        "source",
+        "spacer",
+        "track",
+        "wbr",
+        "html",
+        "head",
+        "body",
+    ]
+)
+RE_END_TAG = re.compile(r"</([a-zA-Z][^\s/>]*)|<([a-zA-Z][^\s/>]*)[^<>]*/>")
+RE_ENTITY = re.compile(r"&([a-zA-Z][a-zA-Z0-9]*)(;?)")
+# entities resolved without a trailing semicolon by libxml2
+LEGACY_ENTITIES = frozenset(
+    name for name in html.entities.html5 if not name.endswith(";")
+)
+
+
+def _is_tooltip(element: lxml.etree._Element) -> bool:
+    return (
+        element.tag == "span"
+        and "tooltip__text" in (element.get("class") or "").split()
+    )
+
+
+def _collect(
+    element: lxml.etree._Element,
+    text: typing.Optional[typing.List[str]],
+    cleaned: typing.Optional[typing.List[str]],
+) -> None:
+    """Appends strings of the element to text, as get_text does, and to
+    cleaned, as clean_html does (its copy keeps every string, comments and
+    scripts included, but those of tooltips)."""
+    if text is None and cleaned is None:
+        return
+    if element.text:
+        if text is not None:
+            text.append(element.text)
+        if cleaned is not None:
+            cleaned.append(element.text)
+    for child in element:
+        # comments and processing instructions have non-string tags
+        if isinstance(child.tag, str):
+            _collect(
+                child,
+                text if child.tag not in SKIPPED_TEXT else None,
+                cleaned if not _is_tooltip(child) else None,
+            )
+        elif child.text and cleaned is not None:
+            cleaned.append(child.text)
+        if child.tail:
+            if text is not None:
+                text.append(child.tail)
+            if cleaned is not None:
+                cleaned.append(child.tail)
+
+
+def _text(element: lxml.etree._Element) -> str:
+    text: typing.List[str] = []
+    _collect(element, text, None)
+    return "".join(text)
+
+
+def _entity_is_parsed_alike(name: str, semicolon: str) -> bool:
+    if semicolon:
+        return name + ";" in html.entities.html5
+    # html.parser resolves whole names only, libxml2 legacy prefixes only
+    return name in LEGACY_ENTITIES or (
+        name + ";" not in html.entities.html5
+        and not any(name[:end] in LEGACY_ENTITIES for end in range(2, len(name)))
+    )
+
+
+class LxmlPage(Page):
+    backend = "lxml"
+
+    def __init__(self, html_contents: typing.Union[bytes, str]):
+        # decoded the way BeautifulSoup decodes it
+        self.markup = (
+            UnicodeDammit(html_contents, is_html=True).unicode_markup
+            if isinstance(html_contents, bytes)
+            else html_contents
+        )
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+        self.root = lxml.html.document_fromstring(
+            self.markup.encode("utf-8"), parser=parser
+        )
+        self.errors = [error.message for error in parser.error_log]
+
+    def diverges(self) -> typing.Optional[str]:
+        """Returns the reason html.parser would build a different tree
+        (None if it would build the same one)."""
+        markup = self.markup
+        if "\r" in markup:
+            return "carriage returns"
+        if "<![CDATA[" in markup:
+            return "CDATA sections"
+        if self.errors:
+            return f"parser errors ({self.errors[0].strip()})"
+        if "&" in markup:
+            for name, semicolon in dict.fromkeys(RE_ENTITY.findall(markup)):
+                if not _entity_is_parsed_alike(name, semicolon):
+                    return f"entity &{name}{semicolon}"
+        closed: typing.Counter[str] = collections.Counter()
+        for end, self_closing in RE_END_TAG.findall(markup):
+            closed[(end or self_closing).lower()] += 1
+        for tag, count in collections.Counter(
+            element.tag for element in self.root.iter(tag=lxml.etree.Element)
+        ).items():
+            if tag not in UNCLOSED and closed[tag] != count:
+                return f"implicitly closed <{tag}>"
+        return None
+
+    def metadata(self) -> Metadata:
+        meta = XPATH_TOP(self.root)
+        if not meta:
+            raise InvalidHTML("The top part of the page is missing. Inspect the page.")
+
+        url = XPATH_LINK(self.root)
+        if not url:
+            raise InvalidHTML("#material_link is not present. Inspect the page first.")
+
+        url_text = _text(url[0])
+        return Metadata(
+            document_id=int(url_text.split("/")[-1]),
+            title=_text(meta[0].find(".//h1")).replace("\xa0", " "),
+            date=XPATH_TIME(meta[0])[0].attrib["datetime"],
+            url=url_text,
+        )
+
+    def themes(self) -> typing.List[typing.Dict[str, str]]:
+        data = []
+        tags_block = XPATH_TAGS(self.root)
+        if not tags_block:
+            raise InvalidHTML("Tags block is missing.")
+        for tag in XPATH_TAGSCOL(tags_block[0]):
+            title = _text(tag.find(".//h3")).strip()
+            for li in tag.iterdescendants("li"):
+                item = _text(li).strip()
+                data.append({"category": title, "theme": item.strip()})
+        return data
+
+    def paragraphs(self) -> typing.List[Paragraph]:
+        paragraphs = []
+        for paragraph in XPATH_PARAGRAPHS(self.root):
+            text: typing.List[str] = []
+            cleaned: typing.List[str] = []
+            _collect(paragraph, text, cleaned)
+            paragraphs.append(Paragraph("".join(text), "".join(cleaned).strip()))
+        return paragraphs
+
+
+BACKENDS: typing.Dict[str, typing.Type[Page]] = {
+    "lxml": LxmlPage,
+    "soup": SoupPage,
+}
+
+
+def parse_page(
+    html_contents: typing.Union[bytes, str], backend: str = DEFAULT_BACKEND
+) -> Page:
+    """Parses an export with the backend ("lxml" falls back to "soup" for
+    pages libxml2 would parse differently)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML backend {backend!r}")
+    if backend == "soup":
+        return SoupPage(html_contents)
+    page = LxmlPage(html_contents)
+    reason = page.diverges()
+    if reason is None:
+        return page
+    logger.debug("Parsing the page with BeautifulSoup: %s", reason)
+    return SoupPage(page.markup)
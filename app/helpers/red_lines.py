@@ -9,6 +9,7 @@ from app.schemas import RedLines
 
 Prediction = typing.Dict[str, float]
 DEFAULT_MODEL = Path(__file__).resolve().parent / "assets" / "red-lines"
+DEFAULT_BATCH_SIZE = 64
 
 
 class RedLinesClassifier:
@@ -29,6 +30,11 @@ class RedLinesClassifier:
             self._f_score = None
             self._model_type = None
 
+    @property
+    def model_key(self) -> typing.Tuple[str, str]:
+        """Name & version identifying predictions of the model."""
+        return f"red_lines/{self._lang}_{self._name}", self._version
+
     @classmethod
     def load(
         cls, model: typing.Union[spacy.language.Language, None] = None
@@ -41,14 +47,43 @@ class RedLinesClassifier:
         """Given a text, return the predicted categories using the spaCy model."""
         return self.nlp(text).cats
 
+    def predict_many(
+        self,
+        texts: typing.Iterable[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_process: int = 1,
+    ) -> typing.List[Prediction]:
+        """Given texts, return the predicted categories in input order;
+        texts are buffered and classified in batches using nlp.pipe."""
+        return [
+            doc.cats
+            for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        ]
+
     def store(self, text: str) -> RedLines:
         """Given a text, return red line prediction with model's metadata."""
-        prediction = self.predict(text)["threat"]
+        return self._as_red_lines(self.predict(text))
+
+    def store_many(
+        self,
+        texts: typing.Iterable[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_process: int = 1,
+    ) -> typing.List[RedLines]:
+        """Given texts, return red line predictions with model's metadata."""
+        return [
+            self._as_red_lines(prediction)
+            for prediction in self.predict_many(
+                texts, batch_size=batch_size, n_process=n_process
+            )
+        ]
+
+    def _as_red_lines(self, prediction: Prediction) -> RedLines:
         return RedLines(
             model_language=self._lang,
             model_name=self._name,
             model_type=self._model_type,
             model_version=self._version,
             model_performance=self._f_score,
-            prediction=prediction,
+            prediction=prediction["threat"],
         )
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""This module contains the registry of (lazily loaded) models.
+
+Importing the application does not load any model: each one is loaded once
+per process on first use or during an explicit warm-up phase, so that routes
+which do not need NLP (and tooling such as alembic) start without them.
+"""
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    import spacy
+
+    from app.helpers.ml import ML
+    from app.helpers.red_lines import RedLinesClassifier
+    from app.helpers.sentiment import SentimentScorer
+
+Loader = typing.Callable[[], typing.Any]
+
+
+class ModelStatus(typing.NamedTuple):
+    loaded: bool
+    load_seconds: typing.Optional[float]
+
+
+class ModelRegistry:
+    """Loads registered models on first access, once per process."""
+
+    def __init__(self) -> None:
+        self._loaders: typing.Dict[str, Loader] = {}
+        self._models: typing.Dict[str, typing.Any] = {}
+        self._load_seconds: typing.Dict[str, float] = {}
+        self._locks: typing.Dict[str, threading.Lock] = {}
+        # models that must be loaded before the process reports readiness
+        self._required: typing.Set[str] = set()
+
+    def register(self, name: str, loader: Loader) -> None:
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    @property
+    def names(self) -> typing.List[str]:
+        return list(self._loaders)
+
+    def get(self, name: str) -> typing.Any:
+        """Returns the model, loading it if necessary."""
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model {name!r}, expected one of {self.names}")
+        with self._locks[name]:
+            # another thread might have loaded it while we waited
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self._load_seconds[name] = time.perf_counter() - start
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def status(self) -> typing.Dict[str, ModelStatus]:
+        return {
+            name: ModelStatus(self.is_loaded(name), self._load_seconds.get(name))
+            for name in self._loaders
+        }
+
+    @property
+    def ready(self) -> bool:
+        """Whether every model requested by warm_up has been loaded."""
+        return all(self.is_loaded(name) for name in self._required)
+
+    def warm_up(
+        self, names: typing.Optional[typing.Iterable[str]] = None
+    ) -> typing.Dict[str, ModelStatus]:
+        """Loads the models (all registered ones by default)."""
+        names = list(names) if names is not None else self.names
+        self._required.update(names)
+        for name in names:
+            self.get(name)
+        return self.status()
+
+    def warm_up_in_background(
+        self, names: typing.Optional[typing.Iterable[str]] = None
+    ) -> threading.Thread:
+        """Loads the models in a daemon thread; see ready."""
+        names = list(names) if names is not None else self.names
+        self._required.update(names)
+        thread = threading.Thread(
+            target=self.warm_up, args=(names,), name="model-warm-up", daemon=True
+        )
+        thread.start()
+        return thread
+
+
+def _load_nlp() -> "spacy.language.Language":
+    from app.helpers.ml import create_nlp
+
+    return create_nlp()
+
+
+def _load_key_phrases() -> "ML":
+    from app.helpers.ml import ML
+
+    return ML(get_nlp())
+
+
+def _load_red_lines() -> "RedLinesClassifier":
+    from app.helpers.red_lines import RedLinesClassifier
+
+    return RedLinesClassifier()
+
+
+def _load_sentiment() -> "SentimentScorer":
+    from app.helpers.sentiment import SentimentScorer
+
+    return SentimentScorer()
+
+
+models = ModelRegistry()
+models.register("nlp", _load_nlp)
+models.register("key_phrases", _load_key_phrases)
+models.register("red_lines", _load_red_lines)
+models.register("sentiment", _load_sentiment)
+
+
+def get_nlp() -> "spacy.language.Language":
+    return models.get("nlp")
+
+
+def get_key_phrase_matcher() -> "ML":
+    return models.get("key_phrases")
+
+
+def get_classifier() -> "RedLinesClassifier":
+    return models.get("red_lines")
+
+
+def get_sentiment() -> "SentimentScorer":
+    return models.get("sentiment")
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""This module contains in-memory similarity search over sentence embeddings."""
+import datetime
+import logging
+import threading
+import time
+import typing
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.future import Engine
+from sqlmodel import Session, select
+
+from app.helpers.vectors import unpack_vectors
+from app.models import Embeddings, Metadata, Sentences
+
+if typing.TYPE_CHECKING:
+    from app.helpers.ann import AnnIndex
+
+logger = logging.getLogger(__name__)
+
+# rows fetched from the database at a time
+FETCH_SIZE = 10_000
+# document id of rows removed from an index
+DELETED = -1
+# ids skipped by a refresh may belong to transactions which commit later;
+# gaps are checked again on every refresh, for GAP_TIMEOUT seconds (the
+# most recent MAX_GAPS of them)
+GAP_TIMEOUT = 3600.0
+MAX_GAPS = 100
+
+Gap = typing.Tuple[int, int, float]
+
+
+class Match(typing.NamedTuple):
+    sentence_id: int
+    document_id: int
+    score: float
+
+
+class EmbeddingRows(typing.NamedTuple):
+    """Page of embeddings (normalized) with metadata of their sentences."""
+
+    last_id: int
+    ids: np.ndarray
+    vectors: np.ndarray
+    sentence_ids: np.ndarray
+    document_ids: np.ndarray
+    dates: np.ndarray
+    speakers: typing.List[typing.Optional[str]]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scales rows of a float32 matrix to unit length (in place)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+    return vectors
+
+
+def latest_dimension(db: Session) -> typing.Optional[int]:
+    """Returns dimension of the most recently stored embedding."""
+    return db.exec(
+        select(Embeddings.dimension)
+        .where(Embeddings.dimension > 0)
+        .order_by(Embeddings.id.desc())
+        .limit(1)
+    ).first()
+
+
+def fetch_embeddings(
+    db: Session,
+    after_id: int = 0,
+    up_to_id: typing.Optional[int] = None,
+    fetch_size: int = FETCH_SIZE,
+    dimension: typing.Optional[int] = None,
+    ranges: typing.Optional[typing.Sequence[typing.Tuple[int, int]]] = None,
+) -> typing.Iterator[EmbeddingRows]:
+    """Yields pages of embeddings with id > after_id (in id order).
+
+    Only embeddings of the given dimension are read (by default, the one of
+    the most recent embedding, i.e. of the current model); empty vectors and
+    vectors of other models are skipped. If ranges are given, only ids within
+    one of the (first, last) ranges are read.
+    """
+    if dimension is None:
+        dimension = latest_dimension(db)
+        if dimension is None:
+            return
+    while True:
+        query = (
+            select(
+                Embeddings.id,
+                Embeddings.sentence_id,
+                Sentences.document_id,
+                Metadata.date,
+                Sentences.speaker,
+                Embeddings.vector,
+            )
+            .join(Sentences, Sentences.id == Embeddings.sentence_id)
+            .join(Metadata, Metadata.id == Sentences.document_id)
+            .where(Embeddings.id > after_id, Embeddings.dimension == dimension)
+        )
+        if up_to_id is not None:
+            query = query.where(Embeddings.id <= up_to_id)
+        if ranges is not None:
+            query = query.where(
+                or_(*(Embeddings.id.between(first, last) for first, last in ranges))
+            )
+        rows = db.exec(query.order_by(Embeddings.id).limit(fetch_size)).all()
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        yield EmbeddingRows(
+            last_id=after_id,
+            ids=np.fromiter((row[0] for row in rows), np.int64, len(rows)),
+            vectors=normalize(
+                unpack_vectors([row[5] for row in rows], dimension).copy()
+            ),
+            sentence_ids=np.fromiter((row[1] for row in rows), np.int64, len(rows)),
+            document_ids=np.fromiter((row[2] for row in rows), np.int64, len(rows)),
+            dates=np.array([row[3] for row in rows], dtype="datetime64[D]"),
+            speakers=[row[4] for row in rows],
+        )
+
+
+def missing_ranges(
+    after_id: int, ids: np.ndarray
+) -> typing.List[typing.Tuple[int, int]]:
+    """Returns (first, last) ranges of ids between after_id & ids[-1] which
+    are not in ids (sorted)."""
+    bounds = np.concatenate([[after_id], ids])
+    first, last = bounds[:-1] + 1, bounds[1:] - 1
+    gaps = first <= last
+    return list(zip(first[gaps].tolist(), last[gaps].tolist()))
+
+
+def fetch_added(
+    db: Session,
+    last_id: int,
+    gaps: typing.List[Gap],
+    now: float,
+    dimension: typing.Optional[int] = None,
+) -> typing.Iterator[EmbeddingRows]:
+    """Yields pages of embeddings committed since ids up to last_id were read.
+
+    Those are rows within gaps - (first id, last id, time noticed) ranges of
+    ids missing from earlier reads, possibly of transactions which commit
+    later - and rows with id > last_id. Once the pages are consumed, gaps is
+    updated in place: found ids are removed, new gaps added (noticed at now)
+    and gaps older than GAP_TIMEOUT dropped.
+    """
+    pending = [gap for gap in gaps if now - gap[2] < GAP_TIMEOUT]
+    if pending:
+        found = []
+        for rows in fetch_embeddings(
+            db,
+            after_id=pending[0][0] - 1,
+            up_to_id=last_id,
+            dimension=dimension,
+            ranges=[(first, last) for first, last, _ in pending],
+        ):
+            found.append(rows.ids)
+            yield rows
+        if found:
+            ids = np.concatenate(found)
+            pending = [
+                (first, last, noticed)
+                for gap_first, gap_last, noticed in pending
+                for first, last in missing_ranges(
+                    gap_first - 1,
+                    np.append(
+                        ids[(ids >= gap_first) & (ids <= gap_last)], gap_last + 1
+                    ),
+                )
+            ]
+    for rows in fetch_embeddings(db, after_id=last_id, dimension=dimension):
+        pending.extend(
+            (first, last, now) for first, last in missing_ranges(last_id, rows.ids)
+        )
+        last_id = rows.last_id
+        yield rows
+    gaps[:] = pending[-MAX_GAPS:]
+
+
+class _Snapshot(typing.NamedTuple):
+    matrix: np.ndarray
+    sentence_ids: np.ndarray
+    document_ids: np.ndarray
+    dates: np.ndarray
+    speakers: np.ndarray
+
+
+class EmbeddingIndex:
+    """Normalized float32 matrix of sentence embeddings with their metadata.
+
+    Rows are loaded from the embeddings table and appended incrementally
+    (rows with id greater than the last loaded one, and rows within gaps of
+    the loaded ids, committed after greater ids by concurrent transactions),
+    so refreshing after uploads is cheap. Search is exact cosine similarity;
+    top-k is selected with argpartition. The dimension is the one of the
+    first loaded rows (see fetch_embeddings), rows of other dimensions are
+    skipped.
+    """
+
+    def __init__(self, refresh_interval: float = 30):
+        self.refresh_interval = refresh_interval
+        self.last_id = 0
+        self.dimension: typing.Optional[int] = None
+        self.last_refresh: typing.Optional[float] = None
+        self._size = 0
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._sentence_ids = np.empty(0, dtype=np.int64)
+        self._document_ids = np.empty(0, dtype=np.int64)
+        self._dates = np.empty(0, dtype="datetime64[D]")
+        # speakers are stored as codes of self._speakers
+        self._speaker_codes = np.empty(0, dtype=np.int32)
+        self._speakers: typing.Dict[typing.Optional[str], int] = {}
+        # (first id, last id, time noticed) of ids not loaded yet
+        self._gaps: typing.List[Gap] = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def loaded(self) -> bool:
+        return self.last_refresh is not None
+
+    def refresh(self, db: Session, force: bool = False) -> int:
+        """Appends rows added since the last refresh; returns their number.
+
+        Unless forced, does nothing if the last refresh is more recent
+        than refresh_interval seconds or if another refresh is in progress
+        (searches use rows loaded so far).
+        """
+        if (
+            not force
+            and self.last_refresh is not None
+            and time.monotonic() - self.last_refresh < self.refresh_interval
+        ):
+            return 0
+        if not self._refresh_lock.acquire(blocking=force):
+            return 0
+        try:
+            added = 0
+            for rows in fetch_added(
+                db, self.last_id, self._gaps, time.monotonic(), self.dimension
+            ):
+                self._append(rows)
+                self.last_id = max(self.last_id, rows.last_id)
+                self.dimension = rows.vectors.shape[1]
+                added += len(rows.ids)
+            self.last_refresh = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+        return added
+
+    def _append(self, rows: EmbeddingRows) -> None:
+        with self._lock:
+            self._extend(rows)
+
+    def _extend(self, rows: EmbeddingRows) -> None:
+        codes = np.fromiter(
+            (
+                self._speakers.setdefault(speaker, len(self._speakers))
+                for speaker in rows.speakers
+            ),
+            dtype=np.int32,
+            count=len(rows.speakers),
+        )
+        new = (
+            rows.vectors,
+            rows.sentence_ids,
+            rows.document_ids,
+            rows.dates,
+            codes,
+        )
+        size = self._size + len(codes)
+        if self._size == 0 or size > len(self._sentence_ids):
+            self._grow(max(size, 2 * len(self._sentence_ids)), rows.vectors.shape[1])
+        for attribute, values in zip(
+            ("_matrix", "_sentence_ids", "_document_ids", "_dates", "_speaker_codes"),
+            new,
+        ):
+            getattr(self, attribute)[self._size : size] = values
+        self._size = size
+
+    def remove_documents(self, document_ids: typing.Iterable[int]) -> None:
+        """Excludes sentences of deleted documents from search results."""
+        with self._lock:
+            removed = np.isin(
+                self._document_ids[: self._size], np.fromiter(document_ids, np.int64)
+            )
+            # rows are kept (so that positions do not shift) but never match
+            self._document_ids[: self._size][removed] = DELETED
+
+    def _grow(self, capacity: int, dimension: int) -> None:
+        """Reallocates buffers; searches in progress keep the old ones."""
+        matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        if self._size:
+            matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+        for attribute in ("_sentence_ids", "_document_ids", "_dates", "_speaker_codes"):
+            old = getattr(self, attribute)
+            buffer = np.zeros(capacity, dtype=old.dtype)
+            buffer[: self._size] = old[: self._size]
+            setattr(self, attribute, buffer)
+
+    def _snapshot(self) -> _Snapshot:
+        with self._lock:
+            size = self._size
+            return _Snapshot(
+                self._matrix[:size],
+                self._sentence_ids[:size],
+                self._document_ids[:size],
+                self._dates[:size],
+                self._speaker_codes[:size],
+            )
+
+    def vector(self, sentence_id: int) -> typing.Optional[np.ndarray]:
+        """Returns stored (normalized) vector of a sentence."""
+        snapshot = self._snapshot()
+        positions = np.flatnonzero(
+            (snapshot.sentence_ids == sentence_id) & (snapshot.document_ids != DELETED)
+        )
+        if len(positions) == 0:
+            return None
+        return snapshot.matrix[positions[0]]
+
+    def search(
+        self,
+        vector: typing.Union[np.ndarray, typing.Sequence[float]],
+        k: int = 10,
+        document_id: typing.Optional[int] = None,
+        date_from: typing.Optional[datetime.date] = None,
+        date_to: typing.Optional[datetime.date] = None,
+        speaker: typing.Optional[str] = None,
+        exclude_sentence_id: typing.Optional[int] = None,
+    ) -> typing.List[Match]:
+        """Returns k most similar sentences (by cosine similarity)."""
+        snapshot = self._snapshot()
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if len(snapshot.matrix) == 0 or norm == 0:
+            return []
+        if query.shape[0] != snapshot.matrix.shape[1]:
+            raise ValueError(
+                f"Expected vector of size {snapshot.matrix.shape[1]}, "
+                f"got {query.shape[0]}"
+            )
+
+        mask = snapshot.document_ids != DELETED
+        if document_id is not None:
+            mask &= snapshot.document_ids == document_id
+        if date_from is not None:
+            mask &= snapshot.dates >= np.datetime64(date_from, "D")
+        if date_to is not None:
+            mask &= snapshot.dates <= np.datetime64(date_to, "D")
+        if speaker is not None:
+            mask &= snapshot.speakers == self._speakers.get(speaker, -1)
+        if exclude_sentence_id is not None:
+            mask &= snapshot.sentence_ids != exclude_sentence_id
+        candidates = None if mask.all() else np.flatnonzero(mask)
+
+        if candidates is None:
+            scores = snapshot.matrix @ (query / norm)
+        else:
+            scores = snapshot.matrix[candidates] @ (query / norm)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+        return [
+            Match(
+                sentence_id=int(snapshot.sentence_ids[row]),
+                document_id=int(snapshot.document_ids[row]),
+                score=float(score),
+            )
+            for row, score in zip(rows, scores[top])
+        ]
+
+
+index = EmbeddingIndex()
+# disk-persisted approximate index, used instead of `index` when configured
+_ann_index: typing.Optional["AnnIndex"] = None
+
+
+def set_ann_index(ann_index: typing.Optional["AnnIndex"]) -> None:
+    global _ann_index
+    _ann_index = ann_index
+
+
+def get_index() -> typing.Union[EmbeddingIndex, "AnnIndex"]:
+    """Returns index used by similarity search endpoints."""
+    return _ann_index if _ann_index is not None else index
+
+
+def refresh_if_loaded(db: Session) -> None:
+    """Appends newly written rows to the indexes (if they are in use)."""
+    for search_index in (index, _ann_index):
+        if search_index is not None and search_index.loaded:
+            search_index.refresh(db, force=True)
+
+
+def refresh_in_background(engine: Engine) -> threading.Thread:
+    """Loads the index used by search endpoints and refreshes it every
+    refresh_interval seconds in a daemon thread, so that searches do not
+    wait for the database."""
+
+    def refresh() -> None:
+        while True:
+            search_index = get_index()
+            try:
+                with Session(engine) as db:
+                    search_index.refresh(db, force=True)
+            except Exception:
+                logger.exception("Refreshing similarity index failed")
+            time.sleep(search_index.refresh_interval)
+
+    thread = threading.Thread(target=refresh, name="search-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def remove_documents(document_ids: typing.Iterable[int]) -> None:
+    """Removes sentences of deleted documents from the indexes."""
+    document_ids = list(document_ids)
+    for search_index in (index, _ann_index):
+        if search_index is not None:
+            search_index.remove_documents(document_ids)
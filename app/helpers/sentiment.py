@@ -14,6 +14,7 @@ from app.schemas import Sentiment
 Prediction = typing.List[float]
 DEFAULT_TOKENIZER = "sismetanin/xlm_roberta_large-ru-sentiment-rusentiment"
 DEFAULT_MODEL = "sismetanin/xlm_roberta_large-ru-sentiment-rusentiment"
+DEFAULT_BATCH_SIZE = 32
 DEFAULT_SENTIMENT_LABELS = {
     0: "negative",
     1: "neutral",
@@ -31,30 +32,72 @@ class SentimentScorer:
         tokenizer: str = DEFAULT_TOKENIZER,
         model: str = DEFAULT_MODEL,
         sentiment_labels: typing.Dict[int, str] = DEFAULT_SENTIMENT_LABELS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
     ) -> None:
         self._tokenizer_name = tokenizer
         self._model_name = model
         self._sentiment_labels = sentiment_labels
+        self.batch_size = batch_size
         self.tokenizer = AutoTokenizer.from_pretrained(self._tokenizer_name)
         self.model = AutoModelForSequenceClassification.from_pretrained(
             self._model_name
         )
 
+    @property
+    def model_key(self) -> typing.Tuple[str, str]:
+        """Name & version (hub revision) identifying predictions of the model."""
+        revision = getattr(self.model.config, "_commit_hash", None) or "unknown"
+        return f"sentiment/{self._model_name}", revision
+
     def get_sentiment_scores(self, text: str) -> Prediction:
         inputs = self.tokenizer(
             text, return_tensors="pt", truncation=True, padding=True
         )
-        outputs = self.model(**inputs)
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
         scores = torch.softmax(outputs.logits, dim=1).tolist()[0]
         return scores
 
     def predict(self, text: str) -> Sentiment:
         scores = self.get_sentiment_scores(text)
         best_score_idx = argmax(scores)
-        best_score_explained = self._sentiment_labels[int(best_score_idx)]
+        return self._as_sentiment(max(scores), int(best_score_idx))
+
+    def predict_batch(
+        self, texts: typing.Sequence[str], batch_size: typing.Optional[int] = None
+    ) -> typing.List[Sentiment]:
+        """Scores texts in padded batches and returns predictions in input order.
+
+        Texts are tokenized once and sorted by token length, so that each batch
+        is padded only up to its own longest text.
+        """
+        if not texts:
+            return []
+        batch_size = batch_size or self.batch_size
+        encodings = self.tokenizer(list(texts), truncation=True)
+        order = sorted(
+            range(len(texts)), key=lambda idx: len(encodings["input_ids"][idx])
+        )
+        predictions: typing.List[typing.Optional[Sentiment]] = [None] * len(texts)
+        with torch.inference_mode():
+            for start in range(0, len(order), batch_size):
+                batch = order[start : start + batch_size]
+                inputs = self.tokenizer.pad(
+                    {key: [encodings[key][idx] for idx in batch] for key in encodings},
+                    return_tensors="pt",
+                )
+                logits = self.model(**inputs).logits
+                best = torch.softmax(logits, dim=1).max(dim=1)
+                for idx, score, label_idx in zip(
+                    batch, best.values.tolist(), best.indices.tolist()
+                ):
+                    predictions[idx] = self._as_sentiment(score, label_idx)
+        return predictions  # type: ignore
+
+    def _as_sentiment(self, score: float, label_idx: int) -> Sentiment:
         return Sentiment(
-            prediction=max(scores),
-            prediction_label=best_score_explained,
+            prediction=score,
+            prediction_label=self._sentiment_labels[label_idx],
             tokenizer_name=self._tokenizer_name,
             model_name=self._model_name,
         )
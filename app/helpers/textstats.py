@@ -1,27 +1,343 @@
 # -*- coding: utf-8 -*-
+"""This module contains text statistics of sentences.
+
+The metrics are those of ruts (BasicStats, ReadabilityStats, DiversityStats
+and MorphStats), computed for all sentences of a document at once: every
+sentence is tokenized once, syllables and letters are counted over the
+code points of the whole batch, counts and diversity metrics are NumPy
+array operations and word forms are parsed by a single, shared pymorphy2
+analyzer through a cache. Results match ruts to floating-point rounding
+(tests/test_textstats.py compares them).
+"""
+import collections
+import functools
+import logging
+import string
 import typing
 
-import ruts  # type: ignore
+import numpy as np
 
 from app.schemas import TextStatisticsJSON
 
+logger = logging.getLogger(__name__)
 
-def calculate_stats(sentence: str) -> typing.Optional[TextStatisticsJSON]:
+# ruts.constants (importing ruts pulls in nltk & scipy, seconds of startup)
+RU_VOWELS = "аеиуояёэюы"
+RU_LETTERS = "бвгджзкпстфхцчшщлмнрйьъ" + RU_VOWELS
+RU_VOWELS += RU_VOWELS.upper()
+RU_LETTERS += RU_LETTERS.upper()
+PUNCTUATIONS = string.punctuation + "—«»“”..."
+COMPLEX_SYL_FACTOR = 4
+MORPHOLOGY = (
+    "pos",
+    "animacy",
+    "aspect",
+    "case",
+    "gender",
+    "involvement",
+    "mood",
+    "number",
+    "person",
+    "tense",
+    "transitivity",
+    "voice",
+)
+# DiversityStats parameters
+WINDOW_LEN = 50
+MTLD_MIN_LEN = 10
+MTLD_THRESHOLD = 0.72
+HDD_SAMPLE_SIZE = 42
+HDD_MIN_WORDS = 50
+# distinct word forms whose morphology is kept
+MORPH_CACHE_SIZE = 100_000
+# rows of the factor matrix (see _factor_lengths) computed at once
+FACTOR_ROWS = 256
+
+
+def _code_table(characters: str) -> np.ndarray:
+    table = np.zeros(max(map(ord, characters)) + 2, dtype=bool)
+    table[[ord(character) for character in characters]] = True
+    return table
+
+
+VOWELS_TABLE = _code_table(RU_VOWELS)
+LETTERS_TABLE = _code_table(RU_LETTERS)
+
+
+def _count_codes(text: str, table: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Counts characters of table in the segments of text beginning at starts."""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    matches = table[np.minimum(codes, len(table) - 1)]
+    return np.add.reduceat(matches.astype(np.int64), starts)
+
+
+@functools.lru_cache()
+def _morph_analyzer() -> typing.Any:
+    import pymorphy2  # type: ignore
+
+    return pymorphy2.MorphAnalyzer()
+
+
+@functools.lru_cache(maxsize=MORPH_CACHE_SIZE)
+def _morph_tag(word: str) -> typing.Tuple[typing.Optional[str], ...]:
+    tag = _morph_analyzer().parse(word)[0].tag
+    # the part of speech is the only upper-case grammeme attribute of tags;
+    # grammemes are str subclasses, slow to hash
+    grammemes = (getattr(tag, "POS" if name == "pos" else name) for name in MORPHOLOGY)
+    return tuple(str(value) if value is not None else None for value in grammemes)
+
+
+def _words(sentence: str) -> typing.List[str]:
+    # WordsExtractor: razdel tokens but punctuation (a substring test)
+    from razdel import tokenize  # type: ignore
+
+    return [
+        token.text for token in tokenize(sentence) if token.text not in PUNCTUATIONS
+    ]
+
+
+def _count_sents(sentence: str) -> int:
+    from razdel import sentenize  # type: ignore
+
+    return sum(1 for _ in sentenize(sentence))
+
+
+def _safe_divide(num: np.ndarray, den: np.ndarray, default: float = 0.0) -> np.ndarray:
+    num, den = np.broadcast_arrays(
+        np.asarray(num, dtype=float), np.asarray(den, dtype=float)
+    )
+    out = np.full(num.shape, default, dtype=float)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def _previous(ids: np.ndarray) -> np.ndarray:
+    """Returns the position of the previous occurrence of every id (-1 if none)."""
+    order = np.argsort(ids, kind="stable")
+    repeated = ids[order][1:] == ids[order][:-1]
+    previous = np.full(len(ids), -1)
+    previous[order[1:][repeated]] = order[:-1][repeated]
+    return previous
+
+
+Factors = typing.Tuple[np.ndarray, np.ndarray]
+
+
+def _factor_lengths(ids: np.ndarray) -> Factors:
+    """Returns, for every start position, the length of the shortest span of
+    at least MTLD_MIN_LEN words whose TTR falls below MTLD_THRESHOLD (0 if
+    there is none) and the number of distinct words from it to the end."""
+    n_words = len(ids)
+    previous = _previous(ids)
+    positions = np.arange(n_words)
+    lengths = np.zeros(n_words, dtype=np.int64)
+    remaining = np.zeros(n_words, dtype=np.int64)
+    for first in range(0, n_words, FACTOR_ROWS):
+        starts = positions[first : first + FACTOR_ROWS, None]
+        # a word is new to the span from start if it did not occur since
+        new = (positions >= starts) & (previous < starts)
+        distinct = np.cumsum(new, axis=1)
+        span = positions - starts + 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ends = (span >= MTLD_MIN_LEN) & (distinct / span < MTLD_THRESHOLD)
+        found = ends.any(axis=1)
+        lengths[first : first + FACTOR_ROWS] = np.where(
+            found, ends.argmax(axis=1) - starts[:, 0] + 1, 0
+        )
+        remaining[first : first + FACTOR_ROWS] = distinct[:, -1]
+    return lengths, remaining
+
+
+def _mtld(factors: Factors) -> float:
+    lengths, remaining = factors
+    n_words = len(lengths)
+    factor = 0.0
+    factor_len = 0
+    start = 0
+    while True:
+        length = lengths[start]
+        # the last word always closes a partial factor
+        if length == 0 or start + length >= n_words:
+            ttr = remaining[start] / (n_words - start)
+            factor += (1 - ttr) / (1 - MTLD_THRESHOLD)
+            factor_len += n_words - start
+            break
+        factor += 1
+        factor_len += length
+        start += length
+    return factor_len / factor if factor else 0.0
+
+
+def _mamtld(factors: Factors) -> float:
+    lengths, _ = factors
+    factor = np.count_nonzero(lengths)
+    return int(lengths.sum()) / factor if factor else 1.0
+
+
+def _moving_ttr(ids: np.ndarray, ttr: float) -> typing.Tuple[float, float]:
+    """Returns MATTR and MSTTR (TTR of texts shorter than a window)."""
+    n_words = len(ids)
+    if n_words < WINDOW_LEN + 1:
+        return ttr, ttr
+    previous = _previous(ids)
+    windows = np.lib.stride_tricks.sliding_window_view(previous, WINDOW_LEN)
+    starts = np.arange(len(windows))
+    mattr = np.mean((windows < starts[:, None]).sum(axis=1) / float(WINDOW_LEN))
+    n_segments = n_words // WINDOW_LEN
+    segments = windows[::WINDOW_LEN][:n_segments]
+    segment_starts = starts[::WINDOW_LEN][:n_segments]
+    msttr = np.mean((segments < segment_starts[:, None]).sum(axis=1) / WINDOW_LEN)
+    return float(mattr), float(msttr)
+
+
+def _hdd(frequencies: np.ndarray, n_words: int) -> float:
+    if n_words < HDD_MIN_WORDS:
+        return -1.0
+    from scipy.special import comb  # type: ignore
+
+    misses = comb(n_words - frequencies, HDD_SAMPLE_SIZE) / comb(
+        n_words, HDD_SAMPLE_SIZE
+    )
+    return float(np.sum((1.0 - misses) * (1 / HDD_SAMPLE_SIZE)))
+
+
+def _morphology(words: typing.List[str]) -> typing.Dict[str, typing.Dict]:
+    tags = [_morph_tag(word) for word in words]
+    return {
+        name: dict(collections.Counter(values))
+        for name, values in zip(MORPHOLOGY, zip(*tags))
+    }
+
+
+def calculate_stats_many(
+    sentences: typing.Sequence[str],
+) -> typing.List[typing.Optional[TextStatisticsJSON]]:
+    """Returns statistics of every sentence (None if it has no words)."""
+    results: typing.List[typing.Optional[TextStatisticsJSON]] = [None] * len(sentences)
+    tokenized = [_words(sentence) for sentence in sentences]
+    indices = [idx for idx, words in enumerate(tokenized) if words]
+    if not indices:
+        return results
+    texts = [sentences[idx] for idx in indices]
+    words_per_text = [tokenized[idx] for idx in indices]
     try:
-        basic_stats = {
-            k: v
-            for k, v in ruts.BasicStats(sentence).get_stats().items()
-            if k not in ["n_spaces", "n_sents", "c_syllables", "c_letters"]
-        }
-        readability = ruts.ReadabilityStats(sentence).get_stats()
-        diversity = ruts.DiversityStats(sentence).get_stats()
-        di = {
-            **basic_stats,
-            **readability,
-            **diversity,
-        }
-        di.update(morphology=ruts.MorphStats(sentence).get_stats())
-        data = TextStatisticsJSON(**di)
-    except (AttributeError, ValueError):
-        data = None
-    return data
+        morphology = [_morphology(words) for words in words_per_text]
+    except AttributeError as error:
+        logger.warning("Failed to analyze morphology: %r", error)
+        return results
+
+    words = [word for text_words in words_per_text for word in text_words]
+    n_words = np.array([len(text_words) for text_words in words_per_text])
+    owner = np.repeat(np.arange(len(texts)), n_words)
+    word_lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+    syllables = _count_codes(
+        "".join(words), VOWELS_TABLE, np.cumsum(word_lengths) - word_lengths
+    )
+    text_lengths = np.array([len(text) for text in texts])
+    n_letters = _count_codes(
+        "".join(texts), LETTERS_TABLE, np.cumsum(text_lengths) - text_lengths
+    )
+    n_chars = text_lengths - np.array([text.count("\n") for text in texts])
+    n_sents = np.array([_count_sents(text) for text in texts])
+
+    def per_text(values: np.ndarray) -> np.ndarray:
+        return np.bincount(owner, weights=values, minlength=len(texts)).astype(np.int64)
+
+    n_syllables = per_text(syllables)
+    n_long_words = per_text(word_lengths >= 6)
+    n_complex_words = per_text(syllables >= COMPLEX_SYL_FACTOR)
+    n_simple_words = per_text((syllables > 0) & (syllables < COMPLEX_SYL_FACTOR))
+    n_monosyllable_words = per_text(syllables == 1)
+    n_polysyllable_words = n_words - n_monosyllable_words - per_text(syllables == 0)
+
+    # lowercased words (DiversityStats) as ids of the batch's vocabulary
+    vocabulary: typing.Dict[str, int] = {}
+    ids = np.array(
+        [vocabulary.setdefault(word.lower(), len(vocabulary)) for word in words]
+    )
+    pairs, frequencies = np.unique(owner * len(vocabulary) + ids, return_counts=True)
+    pair_owner = pairs // len(vocabulary)
+    n_lexemes = np.bincount(pair_owner, minlength=len(texts))
+    n_hapaxes = np.bincount(pair_owner, weights=frequencies == 1, minlength=len(texts))
+    same_pairs = np.bincount(
+        pair_owner, weights=frequencies * (frequencies - 1), minlength=len(texts)
+    )
+
+    # ReadabilityStats
+    flesch_kincaid_grade = (
+        (0.49 * n_words / n_sents) + (7.3 * n_syllables / n_words) - 16.59
+    )
+    flesch_reading_easy = (
+        206.835 - (1.3 * n_words / n_sents) - (60.1 * n_syllables / n_words)
+    )
+    coleman_liau_index = (
+        (0.055 * n_letters / n_words * 100) - (0.35 * n_sents / n_words * 100) - 20.33
+    )
+    smog_index = (1.1 * np.sqrt(64.6 * n_complex_words / n_sents)) + 0.05
+    automated_readability_index = (
+        (6.26 * n_letters / n_words) + (0.2805 * n_words / n_sents) - 31.04
+    )
+    lix = (n_words / n_sents) + (100 * n_long_words / n_words)
+
+    # DiversityStats
+    log_words, log_lexemes = np.log10(n_words), np.log10(n_lexemes)
+    ttr = n_lexemes / n_words
+    rttr = n_lexemes / np.sqrt(n_words)
+    cttr = n_lexemes / np.sqrt(2 * n_words)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sttr = np.where(
+            (n_words == 1) | (n_lexemes == 1),
+            0.0,
+            _safe_divide(np.log10(log_lexemes), np.log10(log_words)),
+        )
+    mttr = _safe_divide(log_words - log_lexemes, log_words**2)
+    dttr = _safe_divide(log_words**2, log_words - log_lexemes)
+    simpson_index = _safe_divide(n_words * (n_words - 1), same_pairs)
+    hapax_index = _safe_divide(100 * log_words, 1 - _safe_divide(n_hapaxes, n_lexemes))
+
+    first_word = np.cumsum(n_words) - n_words
+    first_pair = np.cumsum(n_lexemes) - n_lexemes
+    for position, idx in enumerate(indices):
+        text_ids = ids[first_word[position] : first_word[position] + n_words[position]]
+        forward, backward = _factor_lengths(text_ids), _factor_lengths(text_ids[::-1])
+        mattr, msttr = _moving_ttr(text_ids, ttr[position])
+        text_frequencies = frequencies[
+            first_pair[position] : first_pair[position] + n_lexemes[position]
+        ]
+        results[idx] = TextStatisticsJSON(
+            n_chars=n_chars[position],
+            n_letters=n_letters[position],
+            n_words=n_words[position],
+            n_long_words=n_long_words[position],
+            n_complex_words=n_complex_words[position],
+            n_simple_words=n_simple_words[position],
+            n_unique_words=n_lexemes[position],
+            n_syllables=n_syllables[position],
+            n_monosyllable_words=n_monosyllable_words[position],
+            n_polysyllable_words=n_polysyllable_words[position],
+            automated_readability_index=automated_readability_index[position],
+            coleman_liau_index=coleman_liau_index[position],
+            flesch_kincaid_grade=flesch_kincaid_grade[position],
+            flesch_reading_easy=flesch_reading_easy[position],
+            lix=lix[position],
+            smog_index=smog_index[position],
+            ttr=ttr[position],
+            rttr=rttr[position],
+            cttr=cttr[position],
+            sttr=sttr[position],
+            mttr=mttr[position],
+            dttr=dttr[position],
+            mattr=mattr,
+            msttr=msttr,
+            mtld=(_mtld(forward) + _mtld(backward)) / 2,
+            mamtld=(_mamtld(forward) + _mamtld(backward)) / 2,
+            hdd=_hdd(text_frequencies, int(n_words[position])),
+            simpson_index=simpson_index[position],
+            hapax_index=hapax_index[position],
+            morphology=morphology[position],
+        )
+    return results
+
+
+def calculate_stats(sentence: str) -> typing.Optional[TextStatisticsJSON]:
+    return calculate_stats_many([sentence])[0]
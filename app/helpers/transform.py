@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
 import re
-import copy
 import typing
 
 import spacy
-from bs4 import BeautifulSoup  # type: ignore
 from bs4.element import Tag  # type: ignore
+from spacy.tokens import Span, Token
 
-from app.helpers.ml import nlp
+from app.helpers import parsing
+from app.helpers.parsing import DEFAULT_BACKEND, InvalidHTML, parse_page
+from app.helpers.registry import get_nlp
 from app.schemas import Document, Sentence, Theme
 
 RE_SPEAKER = re.compile(
@@ -22,8 +23,69 @@ RE_SPEAKER = re.compile(
 )
 
 
-class InvalidHTML(ValueError):
-    pass
+# characters replaced by a space each, see Transformer.clean_text
+RE_BLANKS = re.compile(r"[\*\xa0\n]")
+# speaker prefixes ("В.Путин: ") and omissions ("<…>"), each replaced by a space
+RE_SPEAKER_PREFIX = re.compile(r"^\w+\.\w+\:\s+")
+RE_OMISSION = re.compile(r"<…>")
+
+
+class CleanedText(typing.NamedTuple):
+    """Sentence text as stored, with character offsets of the raw text
+    (as parsed by spaCy) mapped onto it."""
+
+    text: str
+    # offsets[i] is the position in text of the i-th raw character
+    # (len(raw) + 1 items, the last one being the end)
+    offsets: typing.List[int]
+    # whether the i-th raw character made it into text (as is, or as a space
+    # if it was whitespace to begin with)
+    kept: typing.List[bool]
+
+    @classmethod
+    def from_text(cls, raw: str) -> "CleanedText":
+        blanked = RE_BLANKS.sub(" ", raw)
+        # removed spans, each replaced by a single space
+        removed = [m.span() for m in RE_SPEAKER_PREFIX.finditer(blanked)]
+        removed.extend(m.span() for m in RE_OMISSION.finditer(blanked))
+        removed.sort()
+        chars: typing.List[str] = []
+        positions: typing.List[int] = []
+        kept: typing.List[bool] = []
+        index = 0
+        for start, end in removed + [(len(raw), len(raw))]:
+            for position in range(index, start):
+                positions.append(len(chars))
+                kept.append(
+                    blanked[position] == raw[position] or raw[position].isspace()
+                )
+                chars.append(blanked[position])
+            if start < end:
+                positions.extend([len(chars)] * (end - start))
+                kept.extend(raw[position].isspace() for position in range(start, end))
+                chars.append(" ")
+            index = end
+        positions.append(len(chars))
+        text = "".join(chars)
+        stripped = text.strip()
+        leading = len(text) - len(text.lstrip())
+        offsets = [min(max(p - leading, 0), len(stripped)) for p in positions]
+        return cls(text=stripped, offsets=offsets, kept=kept)
+
+    def locate(self, start: int, end: int) -> typing.Optional[typing.List[int]]:
+        """Maps a span of the raw text onto the stored one;
+        None if any of its characters were removed."""
+        if not all(self.kept[start:end]):
+            return None
+        return [self.offsets[start], self.offsets[end]]
+
+
+def lemmatize(tokens: typing.Iterable[Token]) -> str:
+    """Returns lowercased lemmas of alphabetic non-stop-word tokens.
+
+    Used for stored sentences and full-text search queries alike.
+    """
+    return " ".join(t.lemma_.lower() for t in tokens if t.is_alpha and not t.is_stop)
 
 
 class Transformer:
@@ -31,10 +93,12 @@ class Transformer:
         self,
         html_contents: bytes,
         nlp_model: typing.Optional[spacy.language.Language] = None,
+        backend: str = DEFAULT_BACKEND,
     ):
-        self.nlp = nlp_model if nlp_model is not None else nlp
+        self.nlp = nlp_model if nlp_model is not None else get_nlp()
         self.html_contents = html_contents
-        self.soup = BeautifulSoup(html_contents, "html.parser")
+        # see app.helpers.parsing for the available backends
+        self.page = parse_page(html_contents, backend)
         self.document_id: typing.Optional[int] = None
         self.title = None
         self.date = None
@@ -43,6 +107,10 @@ class Transformer:
         self.sentences: typing.Optional[
             typing.List[typing.Dict[str, typing.Any]]
         ] = None
+        # sentence spans of the paragraph parses and their cleaned texts,
+        # aligned with self.sentences
+        self.spans: typing.Optional[typing.List[Span]] = None
+        self.cleaned: typing.Optional[typing.List[CleanedText]] = None
         # always running metadata first
         self._extract_metadata()
 
@@ -53,7 +121,7 @@ class Transformer:
             except InvalidHTML:
                 self.themes = None
         if self.sentences is None:
-            self.sentences = self._extract_sentences()
+            self.sentences, self.spans, self.cleaned = self._extract_sentences()
         return Document(
             id=self.document_id,
             title=self.title,
@@ -68,43 +136,30 @@ class Transformer:
         )
 
     def _extract_themes(self) -> typing.List[typing.Dict[str, str]]:
-        data = []
-        tags_block = self.soup.select_one(
-            "div.read__bottommeta.hidden-copy > div > div.read__tags.masha-ignore"
-        )
-        if tags_block is None:
-            raise InvalidHTML("Tags block is missing.")
-        for tag in tags_block.find_all(class_="read__tagscol"):
-            title = tag.h3.text.strip()
-            for li in tag.select("li"):
-                item = li.text.strip()
-                data.append({"category": title, "theme": item.strip()})
-        return data
+        return self.page.themes()
 
     def _extract_metadata(self) -> None:
-        meta = self.soup.select_one("div.read__top")
-        if meta is None:
-            raise InvalidHTML("The top part of the page is missing. Inspect the page.")
-
-        url = self.soup.select_one("#material_link")
-        if url is None:
-            raise InvalidHTML("#material_link is not present. Inspect the page first.")
-
-        self.document_id = int(url.text.split("/")[-1])
-        self.title = meta.select_one("h1").text.replace("\xa0", " ")  # type: ignore
-        self.date = meta.select_one("div.read__meta > time")["datetime"]  # type: ignore
-        self.url = url.text
+        metadata = self.page.metadata()
+        self.document_id = metadata.document_id
+        self.title = metadata.title
+        self.date = metadata.date
+        self.url = metadata.url
         return None
 
-    def _extract_sentences(self) -> typing.List[typing.Dict[str, typing.Any]]:
+    def _extract_sentences(
+        self,
+    ) -> typing.Tuple[
+        typing.List[typing.Dict[str, typing.Any]],
+        typing.List[Span],
+        typing.List[CleanedText],
+    ]:
         data = []
+        spans = []
+        cleaned_texts = []
         previous_speaker: typing.Optional[str] = None
-        paragraphs = self.soup.select(
-            "div.entry-content.e-content.read__internal_content > p"
-        )
-        for paragraph_id, paragraph in enumerate(paragraphs, start=1):
+        for paragraph_id, paragraph in enumerate(self.page.paragraphs(), start=1):
             paragraph_speaker: typing.Optional[str] = None
-            processed_paragraph_text = self.clean_html(paragraph)
+            processed_paragraph_text = paragraph.cleaned
             m = re.search(RE_SPEAKER, processed_paragraph_text)
             if m is not None:
                 possible_speaker = m.group().strip()
@@ -123,7 +178,8 @@ class Transformer:
 
             doc = self.nlp(paragraph.text)
             for sentence_id, sentence in enumerate(doc.sents, start=1):
-                processed_text = self.clean_text(sentence.text)
+                cleaned = CleanedText.from_text(sentence.text)
+                processed_text = cleaned.text
                 if processed_text:
                     data.append(
                         {
@@ -131,11 +187,7 @@ class Transformer:
                             "paragraph_id": paragraph_id,
                             "sentence_id": sentence_id,
                             "text": processed_text,
-                            "text_lemmatized": " ".join(
-                                t.lemma_.lower()
-                                for t in sentence
-                                if t.is_alpha and not t.is_stop
-                            ),
+                            "text_lemmatized": lemmatize(sentence),
                             "speaker": re.sub(
                                 "\s+\(как переведено\)",
                                 "",
@@ -145,20 +197,14 @@ class Transformer:
                             else None,
                         }
                     )
-        return data
+                    spans.append(sentence)
+                    cleaned_texts.append(cleaned)
+        return data, spans, cleaned_texts
 
     @staticmethod
     def clean_text(text: str) -> str:
-        cleaned_text = text
-        for pattern in (r"\*", r"\xa0", r"\n", r"^\w+\.\w+\:\s+", r"<…>"):
-            cleaned_text = re.sub(pattern, " ", cleaned_text)
-        return cleaned_text.strip()
+        return CleanedText.from_text(text).text
 
     @staticmethod
     def clean_html(tag: Tag) -> str:
-        tag_copy = copy.copy(tag)
-        for tooltip in tag_copy.find_all("span", class_="tooltip__text"):
-            tooltip.decompose()
-        for unwanted in tag_copy.find_all(["a"]):
-            unwanted.unwrap()
-        return tag_copy.get_text().strip()
+        return parsing.clean_html(tag)
@@ -1,6 +1,120 @@
 # -*- coding: utf-8 -*-
-"""HTU's implementation of Penn Treebank's verb-related tags."""
+"""HTU's implementation of Penn Treebank's verb-related tags.
+
+VBD/VBG/VBN/VBP/VBZ depend on morphology only, so they are classified once
+per distinct morphological analysis (keyed by its hash) and read, for a whole
+Doc, as an array of bit flags (see verb_forms).
+"""
+import threading
+import typing
+
+import numpy as np
 import spacy
+from spacy.morphology import Morphology
+from spacy.tokens import Doc
+from spacy.vocab import Vocab
+
+VBD = 1
+VBG = 2
+VBN = 4
+VBP = 8
+VBZ = 16
+
+# key of the flags in Doc.user_data
+USER_DATA_KEY = "verb_forms"
+
+
+def classify_morph(feats: typing.Dict[str, str]) -> int:
+    """Returns flags of the verb-related tags of morphological features."""
+    tense = feats.get("Tense", "").lower()
+    verb_form = feats.get("VerbForm", "").lower()
+    flags = 0
+    if tense == "past":
+        flags |= VBD
+    if verb_form == "conv" or (verb_form == "part" and tense == "pres"):
+        flags |= VBG
+    if verb_form == "part" and tense == "past":
+        flags |= VBN
+    if tense == "pres" and feats.get("Number", "").lower() == "sing":
+        flags |= VBZ if feats.get("Person", "").lower() == "third" else VBP
+    return flags
+
+
+class MorphTable:
+    """Flags of every morphological analysis seen so far, keyed by its hash.
+
+    Keys are kept sorted, so a whole doc is looked up with np.searchsorted;
+    unseen analyses are classified once and merged into the table (by one
+    thread at a time, lookups read the table without locking).
+    """
+
+    def __init__(self) -> None:
+        # hash 0 is the empty analysis (no features, no flags)
+        self._table = (np.zeros(1, dtype=np.uint64), np.zeros(1, dtype=np.uint8))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._table[0])
+
+    def lookup(self, vocab: Vocab, keys: np.ndarray) -> np.ndarray:
+        table_keys, table_flags = self._table
+        positions = np.searchsorted(table_keys, keys)
+        found = np.take(table_keys, positions, mode="clip") == keys
+        if not found.all():
+            self._add(vocab, np.unique(keys[~found]))
+            table_keys, table_flags = self._table
+            positions = np.searchsorted(table_keys, keys)
+            found = np.take(table_keys, positions, mode="clip") == keys
+            if not found.all():
+                raise RuntimeError(
+                    f"Morphological analyses {keys[~found][:5]} missing from table"
+                )
+        return table_flags[positions]
+
+    def _add(self, vocab: Vocab, keys: np.ndarray) -> None:
+        with self._lock:
+            # the table may have grown since the caller read it
+            table_keys, table_flags = self._table
+            keys = keys[~np.isin(keys, table_keys)]
+            if len(keys) == 0:
+                return
+            flags = []
+            for key in keys.tolist():
+                feats = vocab.strings[key] if key in vocab.strings else ""
+                flags.append(classify_morph(Morphology.feats_to_dict(feats)))
+            merged_keys = np.concatenate([table_keys, keys])
+            merged_flags = np.concatenate(
+                [table_flags, np.array(flags, dtype=np.uint8)]
+            )
+            order = np.argsort(merged_keys, kind="stable")
+            # replaced as a whole, lookups in other threads see either table
+            self._table = (merged_keys[order], merged_flags[order])
+
+
+morph_table = MorphTable()
+
+
+def verb_forms(doc: Doc) -> np.ndarray:
+    """Returns flags of every token of the doc (computed once per doc).
+    Parameters
+    ----------
+    doc: spacy.tokens.Doc
+        parsed doc (its morphology should not change afterwards)
+    Returns
+    -------
+    np.ndarray : uint8 flags (VBD | VBG | VBN | VBP | VBZ) indexed by token.i
+    """
+    forms = doc.user_data.get(USER_DATA_KEY)
+    if forms is None or len(forms) != len(doc):
+        keys = doc.to_array("MORPH").reshape(len(doc)).astype(np.uint64, copy=False)
+        forms = morph_table.lookup(doc.vocab, keys)
+        doc.user_data[USER_DATA_KEY] = forms
+    return forms
+
+
+def has_flags(token: spacy.tokens.token.Token, flags: int) -> bool:
+    """Checks if token has any of the flags (see verb_forms)."""
+    return bool(verb_forms(token.doc)[token.i] & flags)
 
 
 def is_vb(token: spacy.tokens.token.Token) -> bool:
@@ -26,8 +140,7 @@ def is_vbd(token: spacy.tokens.token.Token) -> bool:
     -------
     bool : True if complies with our definition of VBD False otherwise.
     """
-    morph = token.morph.to_dict()
-    return morph.get("Tense", "").lower() == "past"
+    return has_flags(token, VBD)
 
 
 def is_vbg(token: spacy.tokens.token.Token) -> bool:
@@ -40,13 +153,7 @@ def is_vbg(token: spacy.tokens.token.Token) -> bool:
     -------
     bool : True if complies with our definition of VBG False otherwise.
     """
-    morph = token.morph.to_dict()
-    is_gerund = morph.get("VerbForm", "").lower() == "conv"
-    is_pres_part = (
-        morph.get("VerbForm", "").lower() == "part"
-        and morph.get("Tense", "").lower() == "pres"
-    )
-    return is_gerund or is_pres_part
+    return has_flags(token, VBG)
 
 
 def is_vbn(token: spacy.tokens.token.Token) -> bool:
@@ -59,11 +166,7 @@ def is_vbn(token: spacy.tokens.token.Token) -> bool:
     -------
     bool : True if complies with our definition of VBN False otherwise.
     """
-    morph = token.morph.to_dict()
-    return (
-        morph.get("VerbForm", "").lower() == "part"
-        and morph.get("Tense", "").lower() == "past"
-    )
+    return has_flags(token, VBN)
 
 
 def is_vbp(token: spacy.tokens.token.Token) -> bool:
@@ -76,12 +179,7 @@ def is_vbp(token: spacy.tokens.token.Token) -> bool:
     -------
     bool : True if complies with our definition of VBP False otherwise.
     """
-    morph = token.morph.to_dict()
-    return (
-        morph.get("Person", "").lower() != "third"
-        and morph.get("Tense", "").lower() == "pres"
-        and morph.get("Number", "").lower() == "sing"
-    )
+    return has_flags(token, VBP)
 
 
 def is_vbz(token: spacy.tokens.token.Token) -> bool:
@@ -94,9 +192,4 @@ def is_vbz(token: spacy.tokens.token.Token) -> bool:
     -------
     bool : True if complies with our definition of VBZ False otherwise.
     """
-    morph = token.morph.to_dict()
-    return (
-        morph.get("Person", "").lower() == "third"
-        and morph.get("Tense", "").lower() == "pres"
-        and morph.get("Number", "").lower() == "sing"
-    )
+    return has_flags(token, VBZ)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""This module contains packed storage format of embedding vectors.
+
+Vectors are stored as little-endian float32 bytes (with the dimension kept
+in a separate column); reading uses numpy.frombuffer, so no Python floats
+are materialized.
+"""
+import typing
+
+import numpy as np
+
+DTYPE = np.dtype("<f4")
+
+
+def pack_vector(vector: typing.Union[np.ndarray, typing.Sequence[float]]) -> bytes:
+    """Packs a vector into little-endian float32 bytes."""
+    return np.asarray(vector, dtype=DTYPE).tobytes()
+
+
+def unpack_vector(data: bytes, dimension: typing.Optional[int] = None) -> np.ndarray:
+    """Returns read-only float32 view of packed bytes (without copying)."""
+    return np.frombuffer(
+        data, dtype=DTYPE, count=-1 if dimension is None else dimension
+    )
+
+
+def unpack_vectors(rows: typing.Sequence[bytes], dimension: int) -> np.ndarray:
+    """Returns (len(rows), dimension) float32 matrix of packed vectors."""
+    if not rows:
+        return np.empty((0, dimension), dtype=DTYPE)
+    return np.frombuffer(b"".join(rows), dtype=DTYPE).reshape(len(rows), dimension)
@@ -6,6 +6,14 @@ from starlette.responses import RedirectResponse
 
 from app.api.api_v1.api import api_router
 from app.core.config import get_settings
+from app.core.jobs import start_workers, stop_workers
+from app.crud.crud_archive import shutdown_process_pool
+from app.db.database import dispose_engine, init_engine
+from app.helpers.ann import AnnIndex
+from app.helpers.cache import create_prediction_cache, set_prediction_cache
+from app.helpers.inference import InferenceClient, set_inference_client
+from app.helpers.registry import models
+from app.helpers.search import index, refresh_in_background, set_ann_index
 
 settings = get_settings()
 tags_metadata = [
@@ -17,6 +25,10 @@ tags_metadata = [
         "name": "NLP pipeline",
         "description": "Classify texts",
     },
+    {
+        "name": "Monitoring",
+        "description": "Inspect service health",
+    },
 ]
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -34,6 +46,51 @@ app.add_middleware(
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+def startup() -> None:
+    """Creates application-wide database engine & starts ingestion workers."""
+    engine = init_engine(settings)
+    set_prediction_cache(create_prediction_cache(settings, engine))
+    if settings.INFERENCE_SOCKET:
+        set_inference_client(
+            InferenceClient(
+                settings.INFERENCE_SOCKET,
+                authkey=settings.SECRET_TOKEN.encode(),
+                timeout=settings.INFERENCE_TIMEOUT,
+            )
+        )
+    if settings.WARM_UP_MODELS:
+        models.warm_up_in_background()
+    index.refresh_interval = settings.SEARCH_REFRESH_INTERVAL
+    if settings.ANN_INDEX_PATH:
+        set_ann_index(
+            AnnIndex(
+                settings.ANN_INDEX_PATH,
+                nprobe=settings.ANN_NPROBE,
+                refresh_interval=settings.SEARCH_REFRESH_INTERVAL,
+            )
+        )
+    if settings.WARM_UP_SEARCH_INDEX:
+        refresh_in_background(engine)
+    start_workers(
+        engine,
+        settings.INGEST_WORKERS,
+        settings.INGEST_POLL_INTERVAL,
+        lease=settings.INGEST_LEASE,
+        max_attempts=settings.INGEST_MAX_ATTEMPTS,
+    )
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    """Stops ingestion workers & disposes application-wide database engine."""
+    stop_workers()
+    shutdown_process_pool()
+    set_inference_client(None)
+    set_prediction_cache(None)
+    dispose_engine()
+
+
 @app.get("/", include_in_schema=False)
 def docs_redirect() -> RedirectResponse:
     """Redirects to /docs page by default."""
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from app.models.models import (
+    CachedPrediction,
     Embeddings,
     Exports,
     ExtractedFeatures,
+    IngestionJob,
     Metadata,
     RedLines,
     Sentences,
@@ -12,9 +14,11 @@ from app.models.models import (
 )
 
 __all__ = [
+    "CachedPrediction",
     "Embeddings",
     "Exports",
     "ExtractedFeatures",
+    "IngestionJob",
     "Metadata",
     "RedLines",
     "Sentences",
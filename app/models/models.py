@@ -4,26 +4,56 @@ import datetime
 import typing
 
 from pydantic import HttpUrl
-from sqlalchemy import Column, Float, Integer
+from sqlalchemy import Column, Computed, ForeignKey, Index, Integer, LargeBinary
 from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import deferred
 from sqlmodel import JSON, Field, Relationship, SQLModel
 
+from app.core.compression import DEFAULT_CODEC, IDENTITY, compress, decompress
 from app.schemas import FakeJSON
 
 
 class Exports(SQLModel, table=True):
     id: typing.Optional[int] = Field(primary_key=True, default=None)
+    # compressed with html_codec (see app.core.compression), read via html
     html_contents: bytes
+    html_codec: str = Field(default=IDENTITY)
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     # Relationship
     # one-to-one
     meta: "Metadata" = Relationship(back_populates="raw_export")
 
+    @classmethod
+    def from_html(
+        cls, id: int, html_contents: bytes, codec: str = DEFAULT_CODEC
+    ) -> "Exports":
+        return cls(
+            id=id, html_contents=compress(html_contents, codec), html_codec=codec
+        )
+
+    @property
+    def html(self) -> bytes:
+        """Decompressed HTML of the export."""
+        return decompress(self.html_contents, self.html_codec)
+
+
+# loaded only when accessed, so that reading an export (or checking that it
+# exists) does not transfer the page
+Exports.__mapper__.add_property(
+    "html_contents", deferred(Exports.__table__.c.html_contents)
+)
+
 
 class Metadata(SQLModel, table=True):
     __tablename__: typing.ClassVar[str] = "documents_metadata"
     id: typing.Optional[int] = Field(
-        default=None, primary_key=True, index=True, foreign_key="exports.id"
+        default=None,
+        sa_column=Column(
+            Integer,
+            ForeignKey("exports.id", ondelete="CASCADE"),
+            primary_key=True,
+            index=True,
+        ),
     )
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     title: str
@@ -45,6 +75,7 @@ class Metadata(SQLModel, table=True):
         sa_relationship_kwargs={
             "primaryjoin": "Metadata.id==Themes.document_id",
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
     # one-to-many
@@ -53,14 +84,31 @@ class Metadata(SQLModel, table=True):
         sa_relationship_kwargs={
             "primaryjoin": "Metadata.id==Sentences.document_id",
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
 
 
+# matches the order of /documents/latest (keyset pagination); url is
+# included so that pages are read with index-only scans
+Index(
+    "ix_documents_metadata_latest",
+    Metadata.__table__.c.date.desc(),
+    Metadata.__table__.c.created_at,
+    Metadata.__table__.c.id,
+    postgresql_include=["url"],
+)
+
+
 class Themes(SQLModel, table=True):
     id: typing.Optional[int] = Field(default=None, primary_key=True)
     document_id: typing.Optional[int] = Field(
-        default=None, foreign_key="documents_metadata.id"
+        default=None,
+        sa_column=Column(
+            Integer,
+            ForeignKey("documents_metadata.id", ondelete="CASCADE"),
+            index=True,
+        ),
     )
     category: str
     theme: str
@@ -72,7 +120,12 @@ class Themes(SQLModel, table=True):
 class Sentences(SQLModel, table=True):
     id: typing.Optional[int] = Field(default=None, primary_key=True)
     document_id: typing.Optional[int] = Field(
-        default=None, foreign_key="documents_metadata.id"
+        default=None,
+        sa_column=Column(
+            Integer,
+            ForeignKey("documents_metadata.id", ondelete="CASCADE"),
+            index=True,
+        ),
     )
     paragraph_id: int
     sentence_id: int
@@ -87,6 +140,7 @@ class Sentences(SQLModel, table=True):
         sa_relationship_kwargs={
             "primaryjoin": "Sentences.id==ExtractedFeatures.sentence_id",
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
     textstats: "TextStatistics" = Relationship(
@@ -94,6 +148,7 @@ class Sentences(SQLModel, table=True):
         sa_relationship_kwargs={
             "uselist": False,
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
     redlines: "RedLines" = Relationship(
@@ -101,6 +156,7 @@ class Sentences(SQLModel, table=True):
         sa_relationship_kwargs={
             "uselist": False,
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
     embeddings: "Embeddings" = Relationship(
@@ -108,6 +164,7 @@ class Sentences(SQLModel, table=True):
         sa_relationship_kwargs={
             "uselist": False,
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
     sentiments: "Sentiment" = Relationship(
@@ -115,14 +172,41 @@ class Sentences(SQLModel, table=True):
         sa_relationship_kwargs={
             "uselist": False,
             "cascade": "all,delete,delete-orphan",
+            "passive_deletes": True,
         },
     )
 
 
+# full-text search vector of the lemmas, generated by the database; it is
+# added to the table only (not to the model's fields), so it is never loaded
+# or serialized along with sentences
+TEXT_SEARCH_CONFIG = "simple"
+Sentences.__table__.append_column(
+    Column(
+        "text_search",
+        postgresql.TSVECTOR(),
+        Computed(
+            f"to_tsvector('{TEXT_SEARCH_CONFIG}'::regconfig, text_lemmatized)",
+            persisted=True,
+        ),
+    )
+)
+Index(
+    "ix_sentences_text_search",
+    Sentences.__table__.c.text_search,
+    postgresql_using="gin",
+)
+
+
 class ExtractedFeatures(SQLModel, table=True):
     __tablename__: typing.ClassVar[str] = "extracted_features"
     id: typing.Optional[int] = Field(default=None, primary_key=True)
-    sentence_id: typing.Optional[int] = Field(default=None, foreign_key="sentences.id")
+    sentence_id: typing.Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            Integer, ForeignKey("sentences.id", ondelete="CASCADE"), index=True
+        ),
+    )
     entity_type: str
     label: str
     match: str
@@ -137,7 +221,12 @@ class ExtractedFeatures(SQLModel, table=True):
 class TextStatistics(SQLModel, table=True):
     __tablename__: typing.ClassVar[str] = "text_statistics"
     id: typing.Optional[int] = Field(default=None, primary_key=True)
-    sentence_id: typing.Optional[int] = Field(default=None, foreign_key="sentences.id")
+    sentence_id: typing.Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            Integer, ForeignKey("sentences.id", ondelete="CASCADE"), index=True
+        ),
+    )
 
     # basic
     n_chars: int
@@ -184,7 +273,12 @@ class TextStatistics(SQLModel, table=True):
 class RedLines(SQLModel, table=True):
     __tablename__: typing.ClassVar[str] = "red_lines"
     id: typing.Optional[int] = Field(default=None, primary_key=True)
-    sentence_id: typing.Optional[int] = Field(default=None, foreign_key="sentences.id")
+    sentence_id: typing.Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            Integer, ForeignKey("sentences.id", ondelete="CASCADE"), index=True
+        ),
+    )
 
     model_language: str
     model_name: str
@@ -202,13 +296,18 @@ class RedLines(SQLModel, table=True):
 class Embeddings(SQLModel, table=True):
     __tablename__: typing.ClassVar[str] = "embeddings"
     id: typing.Optional[int] = Field(default=None, primary_key=True)
-    sentence_id: typing.Optional[int] = Field(default=None, foreign_key="sentences.id")
+    sentence_id: typing.Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            Integer, ForeignKey("sentences.id", ondelete="CASCADE"), index=True
+        ),
+    )
 
     model_language: str
     model_name: str
-    vector: typing.List[float] = Field(
-        sa_column=Column(postgresql.ARRAY(Float())), nullable=False
-    )
+    # packed little-endian float32, see app.helpers.vectors
+    dimension: int
+    vector: bytes = Field(sa_column=Column(LargeBinary(), nullable=False))
 
     # Relationship
     sentences: Sentences = Relationship(back_populates="embeddings")
@@ -217,7 +316,12 @@ class Embeddings(SQLModel, table=True):
 class Sentiment(SQLModel, table=True):
     __tablename__: typing.ClassVar[str] = "sentiments"
     id: typing.Optional[int] = Field(default=None, primary_key=True)
-    sentence_id: typing.Optional[int] = Field(default=None, foreign_key="sentences.id")
+    sentence_id: typing.Optional[int] = Field(
+        default=None,
+        sa_column=Column(
+            Integer, ForeignKey("sentences.id", ondelete="CASCADE"), index=True
+        ),
+    )
 
     model_name: str
     tokenizer_name: str
@@ -229,3 +333,42 @@ class Sentiment(SQLModel, table=True):
 
     # Relationship
     sentences: Sentences = Relationship(back_populates="sentiments")
+
+
+class IngestionJob(SQLModel, table=True):
+    __tablename__: typing.ClassVar[str] = "ingestion_jobs"
+    id: typing.Optional[int] = Field(default=None, primary_key=True)
+    document_id: int = Field(index=True)
+
+    state: str = Field(index=True)
+    stage: typing.Optional[str] = Field(default=None)
+    progress: FakeJSON = Field(sa_column=Column(JSON), default={})
+    error: typing.Optional[str] = Field(default=None)
+    # lease of the worker processing the job (see app.crud.crud_jobs)
+    claimed_at: typing.Optional[datetime.datetime] = Field(default=None)
+    attempts: int = Field(default=0)
+
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class CachedPrediction(SQLModel, table=True):
+    """Prediction of a model for a (normalized) text, see app.helpers.cache."""
+
+    __tablename__: typing.ClassVar[str] = "prediction_cache"
+    model_name: str = Field(primary_key=True)
+    model_version: str = Field(primary_key=True)
+    # sha256 of the normalized text
+    text_hash: bytes = Field(sa_column=Column(LargeBinary(), primary_key=True))
+    value: FakeJSON = Field(sa_column=Column(postgresql.JSONB(), nullable=False))
+
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    last_used_at: datetime.datetime = Field(
+        default_factory=datetime.datetime.utcnow, index=True
+    )
+
+    class Config:
+        arbitrary_types_allowed = True
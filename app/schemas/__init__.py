@@ -1,22 +1,44 @@
 # -*- coding: utf-8 -*-
 from app.schemas.base import (
+    AnnotatedDocument,
+    AnnotatedSentence,
+    ArchiveFile,
+    ArchiveSummary,
     Document,
     Embeddings,
     FakeJSON,
+    IngestionJob,
+    ModelState,
+    PredictionCacheStats,
+    Readiness,
     RedLines,
     Sentence,
+    SentenceMatch,
+    SentenceSearchResults,
     Sentiment,
+    SimilarSentence,
     TextStatisticsJSON,
     Theme,
 )
 
 __all__ = [
+    "AnnotatedDocument",
+    "AnnotatedSentence",
+    "ArchiveFile",
+    "ArchiveSummary",
     "Document",
     "Embeddings",
     "FakeJSON",
+    "IngestionJob",
+    "ModelState",
+    "PredictionCacheStats",
+    "Readiness",
     "RedLines",
     "Sentence",
+    "SentenceMatch",
+    "SentenceSearchResults",
     "Sentiment",
+    "SimilarSentence",
     "TextStatisticsJSON",
     "Theme",
 ]
@@ -89,3 +89,93 @@ class Sentiment(SQLModel):
     tokenizer_name: str
     prediction: float
     prediction_label: str
+
+
+class AnnotatedSentence(SQLModel):
+    sentence: Sentence
+    textstats: typing.Optional[TextStatisticsJSON] = None
+    redlines: RedLines
+    embeddings: Embeddings
+    sentiment: Sentiment
+    phrases: typing.List[FakeJSON] = []
+
+
+class AnnotatedDocument(SQLModel):
+    document: Document
+    html_contents: bytes
+    sentences: typing.List[AnnotatedSentence]
+
+
+class IngestionJob(SQLModel):
+    id: int
+    document_id: int
+    state: str
+    stage: typing.Optional[str] = None
+    progress: FakeJSON
+    error: typing.Optional[str] = None
+    attempts: int = 0
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+class ArchiveFile(SQLModel):
+    name: str
+    id: typing.Optional[int] = None
+    status: str
+    detail: typing.Optional[str] = None
+
+
+class ArchiveSummary(SQLModel):
+    created: int
+    duplicate: int
+    invalid: int
+    failed: int
+    files: typing.List[ArchiveFile]
+
+
+class SentenceMatch(SQLModel):
+    sentence_id: int
+    document_id: int
+    date: datetime.date
+    speaker: typing.Optional[str] = None
+    text: str
+    rank: float
+
+
+class SentenceSearchResults(SQLModel):
+    results: typing.List[SentenceMatch]
+    # token of the following page (passed as `after`)
+    next: typing.Optional[str] = None
+
+
+class SimilarSentence(SQLModel):
+    sentence_id: int
+    document_id: int
+    score: float
+    speaker: typing.Optional[str] = None
+    text: str
+
+
+class ModelState(SQLModel):
+    loaded: bool
+    load_seconds: typing.Optional[float] = None
+
+
+class PredictionCacheStats(SQLModel):
+    memory_entries: int
+    memory_max_entries: int
+    memory_bytes: int
+    memory_hits: int
+    db_hits: int
+    misses: int
+    # requests that waited for an identical one instead of computing
+    coalesced: int
+    hit_rate: typing.Optional[float] = None
+    # estimates (None without the persistent tier)
+    db_rows: typing.Optional[int] = None
+    db_bytes: typing.Optional[int] = None
+
+
+class Readiness(SQLModel):
+    ready: bool
+    models: typing.Dict[str, ModelState]
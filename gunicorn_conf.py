@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Gunicorn config (replaces the default one of the base image).
+
+Worker count & logging follow the base image's environment variables
+(WORKERS_PER_CORE, MAX_WORKERS, WEB_CONCURRENCY, BIND, ...). With
+PRELOAD_MODELS=1 (the default) the master imports the app and loads every
+model before forking, so workers share the weights copy-on-write instead
+of loading a copy each; see scripts/memory_usage.py.
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+workers_per_core = float(os.getenv("WORKERS_PER_CORE", "1"))
+max_workers = int(os.getenv("MAX_WORKERS", "0"))
+cores = multiprocessing.cpu_count()
+web_concurrency = int(os.getenv("WEB_CONCURRENCY", "0"))
+if web_concurrency <= 0:
+    web_concurrency = max(int(workers_per_core * cores), 2)
+if max_workers > 0:
+    web_concurrency = min(web_concurrency, max_workers)
+
+host = os.getenv("HOST", "0.0.0.0")
+port = os.getenv("PORT", "80")
+bind = os.getenv("BIND") or f"{host}:{port}"
+workers = web_concurrency
+worker_class = "uvicorn.workers.UvicornWorker"
+loglevel = os.getenv("LOG_LEVEL", "info")
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = os.getenv("ERROR_LOG", "-") or None
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "120"))
+timeout = int(os.getenv("TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEP_ALIVE", "5"))
+
+preload_app = os.getenv("PRELOAD_MODELS", "1").lower() in ("1", "true", "yes")
+
+if preload_app:
+    # objects allocated while loading should not be traversed (and written
+    # to) by collections of the master, it would unshare their pages
+    gc.disable()
+    # tokenizers refuse to use their thread pool after a fork
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def when_ready(server) -> None:
+    """Loads every model in the master, right before workers are forked."""
+    if not preload_app:
+        return
+    from app.helpers.registry import models
+
+    for name, state in models.warm_up().items():
+        server.log.info("Loaded model %s in %.1f sec", name, state.load_seconds)
+    # moves everything allocated so far to a permanent generation, so that
+    # collections in the workers do not touch (and copy) these pages
+    gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker) -> None:
+    """Splits the cores between workers (instead of a thread per core each)."""
+    if preload_app and "torch" in sys.modules:
+        import torch
+
+        torch.set_num_threads(max(1, cores // web_concurrency))
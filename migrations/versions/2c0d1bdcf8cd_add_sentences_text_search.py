@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""add sentences text search
+
+Adds sentences.text_search, a stored tsvector generated from
+text_lemmatized, and its GIN index. Adding the column rewrites the table;
+the index is built concurrently (outside of the migration's transaction).
+
+Revision ID: 2c0d1bdcf8cd
+Revises: 34eb83a33d72
+Create Date: 2026-10-18 12:41:09.553870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "2c0d1bdcf8cd"
+down_revision = "34eb83a33d72"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "sentences",
+        sa.Column(
+            "text_search",
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('simple'::regconfig, text_lemmatized)", persisted=True
+            ),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_sentences_text_search",
+            "sentences",
+            ["text_search"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_sentences_text_search", table_name="sentences")
+    op.drop_column("sentences", "text_search")
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""pack embedding vectors
+
+Stores embeddings.vector as packed little-endian float32 bytea (instead of
+float8[]) and records vector dimension. The table is rebuilt - packed rows
+are copied into a new table which then replaces the old one - so that its
+size on disk shrinks right away (rewriting rows in place would leave the
+old versions and the dropped column behind until VACUUM FULL). Writes to
+embeddings wait until the migration is committed. Rows with NULL or empty
+vectors are not copied (there is nothing to search by).
+
+Revision ID: 34eb83a33d72
+Revises: b52b135d9c84
+Create Date: 2026-10-18 11:02:47.915024
+
+"""
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "34eb83a33d72"
+down_revision = "b52b135d9c84"
+branch_labels = None
+depends_on = None
+
+# rows converted per statement (downgrade)
+BATCH_SIZE = 50_000
+
+# float4send() is big-endian, bytes of every element are reversed
+COPY_PACKED = """
+INSERT INTO embeddings_packed
+    (id, sentence_id, model_language, model_name, dimension, vector)
+SELECT
+    e.id,
+    e.sentence_id,
+    e.model_language,
+    e.model_name,
+    cardinality(e.vector),
+    (
+        SELECT string_agg(
+            substring(x.b FROM 4 FOR 1) || substring(x.b FROM 3 FOR 1)
+            || substring(x.b FROM 2 FOR 1) || substring(x.b FROM 1 FOR 1),
+            ''::bytea ORDER BY x.ord
+        )
+        FROM (
+            SELECT float4send(u.v::float4) AS b, u.ord
+            FROM unnest(e.vector) WITH ORDINALITY AS u(v, ord)
+        ) x
+    )
+FROM embeddings e
+WHERE cardinality(e.vector) > 0
+"""
+
+
+def _id_ranges(connection):
+    low, high = connection.execute(
+        sa.text("SELECT min(id), max(id) FROM embeddings")
+    ).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, BATCH_SIZE):
+        yield start, start + BATCH_SIZE
+
+
+def upgrade():
+    # reads go on, writes wait for the new table
+    op.execute("LOCK TABLE embeddings IN SHARE MODE")
+    op.create_table(
+        "embeddings_packed",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sentence_id", sa.Integer(), nullable=True),
+        sa.Column("model_language", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("model_name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("dimension", sa.Integer(), nullable=False),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+    )
+    op.execute(COPY_PACKED)
+    # the id sequence is kept (it would be dropped with its owner)
+    op.execute("ALTER SEQUENCE embeddings_id_seq OWNED BY NONE")
+    op.drop_table("embeddings")
+    op.rename_table("embeddings_packed", "embeddings")
+    op.execute(
+        "ALTER TABLE embeddings "
+        "ALTER COLUMN id SET DEFAULT nextval('embeddings_id_seq')"
+    )
+    op.execute("ALTER SEQUENCE embeddings_id_seq OWNED BY embeddings.id")
+    op.create_primary_key("embeddings_pkey", "embeddings", ["id"])
+    op.create_foreign_key(
+        "embeddings_sentence_id_fkey",
+        "embeddings",
+        "sentences",
+        ["sentence_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_index(
+        op.f("ix_embeddings_sentence_id"), "embeddings", ["sentence_id"], unique=False
+    )
+
+
+def downgrade():
+    connection = op.get_bind()
+    op.add_column(
+        "embeddings",
+        sa.Column("vector_array", postgresql.ARRAY(sa.Float()), nullable=True),
+    )
+    for low, high in _id_ranges(connection):
+        rows = connection.execute(
+            sa.text(
+                "SELECT id, vector FROM embeddings WHERE id >= :low AND id < :high"
+            ),
+            {"low": low, "high": high},
+        ).all()
+        if rows:
+            connection.execute(
+                sa.text("UPDATE embeddings SET vector_array = :vector WHERE id = :id"),
+                [
+                    {
+                        "id": row.id,
+                        "vector": np.frombuffer(row.vector, dtype="<f4").tolist(),
+                    }
+                    for row in rows
+                ],
+            )
+    op.drop_column("embeddings", "vector")
+    op.drop_column("embeddings", "dimension")
+    op.alter_column("embeddings", "vector_array", new_column_name="vector")
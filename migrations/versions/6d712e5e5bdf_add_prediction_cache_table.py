@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""add prediction cache table
+
+Predictions keyed by model name, model version and hash of normalized text
+(see app.helpers.cache); least recently used rows are evicted by
+last_used_at.
+
+Revision ID: 6d712e5e5bdf
+Revises: 9bc53a9041a0
+Create Date: 2026-10-18 15:04:36.218407
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "6d712e5e5bdf"
+down_revision = "9bc53a9041a0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "prediction_cache",
+        sa.Column("text_hash", sa.LargeBinary(), nullable=False),
+        sa.Column("value", postgresql.JSONB(), nullable=False),
+        sa.Column("model_name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("model_version", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("text_hash", "model_name", "model_version"),
+    )
+    op.create_index(
+        op.f("ix_prediction_cache_last_used_at"),
+        "prediction_cache",
+        ["last_used_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_prediction_cache_last_used_at"), table_name="prediction_cache"
+    )
+    op.drop_table("prediction_cache")
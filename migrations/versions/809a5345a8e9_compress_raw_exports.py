@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""compress raw exports
+
+Adds exports.html_codec and recompresses existing pages with zstd, reading
+them in batches; every row is committed on its own, so the table is never
+locked as a whole and an interrupted migration picks up the rows still
+marked "identity". pglz compression of the column is turned off, values
+are compressed by the application. Space of the rewritten rows is reused
+by new ones; run VACUUM FULL (or pg_repack) on exports to give it back to
+the filesystem.
+
+Revision ID: 809a5345a8e9
+Revises: 6d712e5e5bdf
+Create Date: 2026-10-18 15:47:12.640395
+
+"""
+import gzip
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import zstandard
+
+
+# revision identifiers, used by Alembic.
+revision = "809a5345a8e9"
+down_revision = "6d712e5e5bdf"
+branch_labels = None
+depends_on = None
+
+# pages read per statement
+BATCH_SIZE = 200
+ZSTD_LEVEL = 9
+
+
+def _compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return data
+
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+def _recode(connection, codecs, target):
+    """Rewrites rows stored with any of codecs with the target codec."""
+    last_id = None
+    while True:
+        query = "SELECT id, html_contents, html_codec FROM exports "
+        query += "WHERE html_codec IN :codecs"
+        if last_id is not None:
+            query += " AND id > :last_id"
+        rows = connection.execute(
+            sa.text(query + " ORDER BY id LIMIT :limit").bindparams(
+                sa.bindparam("codecs", expanding=True)
+            ),
+            {"codecs": list(codecs), "last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not rows:
+            return
+        connection.execute(
+            sa.text(
+                "UPDATE exports SET html_contents = :data, html_codec = :codec "
+                "WHERE id = :id"
+            ),
+            [
+                {
+                    "id": row.id,
+                    "data": _compress(
+                        _decompress(row.html_contents, row.html_codec), target
+                    ),
+                    "codec": target,
+                }
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade():
+    op.add_column(
+        "exports",
+        sa.Column(
+            "html_codec",
+            sqlmodel.sql.sqltypes.AutoString(),
+            server_default="identity",
+            nullable=False,
+        ),
+    )
+    op.execute("ALTER TABLE exports ALTER COLUMN html_contents SET STORAGE EXTERNAL")
+    with op.get_context().autocommit_block():
+        _recode(op.get_bind(), ["identity"], "zstd")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        _recode(op.get_bind(), ["gzip", "zstd"], "identity")
+    op.execute("ALTER TABLE exports ALTER COLUMN html_contents SET STORAGE EXTENDED")
+    op.drop_column("exports", "html_codec")
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""add documents latest index
+
+Composite index matching the order of /documents/latest (date DESC,
+created_at, id), covering url; built concurrently.
+
+Revision ID: 8e2f6347ffff
+Revises: 2c0d1bdcf8cd
+Create Date: 2026-10-18 13:20:44.180337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8e2f6347ffff"
+down_revision = "2c0d1bdcf8cd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_documents_metadata_latest",
+            "documents_metadata",
+            [sa.text("date DESC"), "created_at", "id"],
+            unique=False,
+            postgresql_include=["url"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_documents_metadata_latest", table_name="documents_metadata")
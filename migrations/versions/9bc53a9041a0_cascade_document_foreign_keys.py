@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""cascade document foreign keys
+
+Recreates foreign keys of document rows with ON DELETE CASCADE and indexes
+their referencing columns (needed by cascading deletes). Constraints are
+added NOT VALID and validated in separate transactions, indexes are built
+concurrently, so that writes are not blocked while existing rows are
+checked.
+
+Revision ID: 9bc53a9041a0
+Revises: 8e2f6347ffff
+Create Date: 2026-10-18 13:52:17.606112
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "9bc53a9041a0"
+down_revision = "8e2f6347ffff"
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table)
+FOREIGN_KEYS = [
+    ("documents_metadata", "id", "exports"),
+    ("themes", "document_id", "documents_metadata"),
+    ("sentences", "document_id", "documents_metadata"),
+    ("extracted_features", "sentence_id", "sentences"),
+    ("text_statistics", "sentence_id", "sentences"),
+    ("red_lines", "sentence_id", "sentences"),
+    ("embeddings", "sentence_id", "sentences"),
+    ("sentiments", "sentence_id", "sentences"),
+]
+# documents_metadata.id is its primary key (and already indexed)
+INDEXED = [(table, column) for table, column, _ in FOREIGN_KEYS[1:]]
+
+
+def _recreate_foreign_keys(ondelete):
+    for table, column, referenced in FOREIGN_KEYS:
+        # default name given by PostgreSQL to the unnamed constraints
+        name = f"{table}_{column}_fkey"
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(
+            name,
+            table,
+            referenced,
+            [column],
+            ["id"],
+            ondelete=ondelete,
+            postgresql_not_valid=True,
+        )
+    # validated after the swap is committed, without blocking writes
+    with op.get_context().autocommit_block():
+        for table, column, _ in FOREIGN_KEYS:
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for table, column in INDEXED:
+            op.create_index(
+                op.f(f"ix_{table}_{column}"),
+                table,
+                [column],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+    _recreate_foreign_keys("CASCADE")
+
+
+def downgrade():
+    _recreate_foreign_keys(None)
+    for table, column in INDEXED:
+        op.drop_index(op.f(f"ix_{table}_{column}"), table_name=table)
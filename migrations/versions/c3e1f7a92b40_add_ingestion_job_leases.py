@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""add ingestion job leases
+
+Running jobs are leased to their worker (claimed_at) so that jobs abandoned
+by a crashed worker are claimed again; jobs left running by the previous
+deployment get an expired lease and are picked up by the next worker.
+
+Revision ID: c3e1f7a92b40
+Revises: 809a5345a8e9
+Create Date: 2026-10-18 19:02:45.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3e1f7a92b40"
+down_revision = "809a5345a8e9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "ingestion_jobs", sa.Column("claimed_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "ingestion_jobs",
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+    )
+    # jobs left running by the previous deployment
+    op.execute(
+        "UPDATE ingestion_jobs SET claimed_at = '1970-01-01' WHERE state = 'running'"
+    )
+
+
+def downgrade():
+    op.drop_column("ingestion_jobs", "attempts")
+    op.drop_column("ingestion_jobs", "claimed_at")
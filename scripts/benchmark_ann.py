@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Compares approximate (IVF) similarity search with exact search.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_ann.py [--synthetic 1000000]
+        [--nlist 1000] [--nprobe 1 4 16 64] [--queries 200] [-k 10]
+
+Reports recall@k (overlap with exact top-k) and per-query latency for
+every nprobe value. Uses stored embeddings unless --synthetic is given,
+in which case clustered random vectors are generated instead.
+"""
+import argparse
+import tempfile
+import time
+import typing
+
+import numpy as np
+from sqlmodel import Session
+
+from app.core.config import get_settings
+from app.db.database import create_db_engine
+from app.helpers.ann import AnnIndex, build_index
+from app.helpers.search import EmbeddingRows, fetch_embeddings, normalize
+
+
+def synthetic_rows(
+    n_rows: int, dimension: int, seed: int = 0
+) -> typing.List[EmbeddingRows]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n_rows // 1000), dimension))
+    batches = []
+    for start in range(0, n_rows, 100_000):
+        size = min(100_000, n_rows - start)
+        vectors = centers[rng.integers(0, len(centers), size)]
+        vectors = vectors + 0.5 * rng.normal(size=(size, dimension))
+        ids = np.arange(start + 1, start + size + 1)
+        batches.append(
+            EmbeddingRows(
+                last_id=start + size,
+                ids=ids,
+                vectors=normalize(vectors.astype(np.float32)),
+                sentence_ids=ids,
+                document_ids=ids // 100,
+                dates=np.full(size, np.datetime64("2022-01-01", "D")),
+                speakers=[None] * size,
+            )
+        )
+    return batches
+
+
+def stored_rows() -> typing.List[EmbeddingRows]:
+    engine = create_db_engine(get_settings())
+    with Session(engine) as session:
+        batches = list(fetch_embeddings(session))
+    engine.dispose()
+    return batches
+
+
+def percentile(values: typing.List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--synthetic", type=int, default=None, help="vectors")
+    parser.add_argument("--dimension", type=int, default=96)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        batches = synthetic_rows(args.synthetic, args.dimension)
+    else:
+        batches = stored_rows()
+    matrix = np.concatenate([rows.vectors for rows in batches])
+    sentence_ids = np.concatenate([rows.sentence_ids for rows in batches])
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.choice(len(matrix), args.queries, replace=False)]
+    queries = normalize(queries + 0.1 * rng.normal(size=queries.shape).astype("f4"))
+
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        build_index(path, batches, nlist=args.nlist)
+        print(f"vectors:   {len(matrix)} x {matrix.shape[1]}")
+        print(f"build:     {time.perf_counter() - start:.1f} sec")
+        ann_index = AnnIndex(path)
+
+        exact, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            scores = matrix @ query
+            top = np.argpartition(-scores, args.k - 1)[: args.k]
+            latencies.append(time.perf_counter() - start)
+            exact.append(set(sentence_ids[top].tolist()))
+        print(
+            f"exact:     p50 {percentile(latencies, 50):.2f} ms, "
+            f"p95 {percentile(latencies, 95):.2f} ms"
+        )
+
+        for nprobe in args.nprobe:
+            hits, latencies = 0, []
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                matches = ann_index.search(query, k=args.k, nprobe=nprobe)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {match.sentence_id for match in matches})
+            print(
+                f"nprobe={nprobe:<4} recall@{args.k} "
+                f"{hits / (args.k * len(queries)):.3f}, "
+                f"p50 {percentile(latencies, 50):.2f} ms, "
+                f"p95 {percentile(latencies, 95):.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
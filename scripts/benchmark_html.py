@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Compares HTML backends of Transformer on pages/sec.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_html.py "exports/**/*.html"
+        [--repeat 3] [--backends soup lxml]
+
+Times extraction only (parsing, metadata, themes and paragraphs); the
+spaCy pipeline that follows costs the same for every backend. Pages are
+read into memory first, so disk reads are not measured either.
+"""
+import argparse
+import glob
+import time
+
+from app.helpers.parsing import BACKENDS, InvalidHTML, parse_page
+
+
+def extract(html_contents: bytes, backend: str) -> str:
+    page = parse_page(html_contents, backend)
+    page.metadata()
+    try:
+        page.themes()
+    except InvalidHTML:
+        pass
+    page.paragraphs()
+    return page.backend
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pattern", help="glob of HTML files")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=["soup", "lxml"]
+    )
+    args = parser.parse_args()
+
+    pages = []
+    for path in sorted(glob.glob(args.pattern, recursive=True)):
+        with open(path, "rb") as page:
+            pages.append(page.read())
+    if not pages:
+        raise SystemExit(f"No pages match {args.pattern}")
+    megabytes = sum(len(page) for page in pages) / 2**20
+    print(f"pages: {len(pages)} ({megabytes:.1f} MB)")
+
+    for backend in args.backends:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            used = [extract(page, backend) for page in pages]
+            best = min(best, time.perf_counter() - start)
+        fallbacks = sum(name != backend for name in used)
+        print(
+            f"{backend:<6} {len(pages) / best:8.1f} pages/sec, "
+            f"{megabytes / best:6.2f} MB/sec"
+            + (f" ({fallbacks} pages parsed by soup)" if fallbacks else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Compares in-process inference with the micro-batching model server.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_inference.py [--operation sentiment]
+        [--concurrency 1 8 32] [--requests 256] [--max-batch-size 32]
+        [--max-wait-ms 2]
+
+Every thread sends single-text requests (as the /predict endpoints do).
+In process, threads share the models like request threads of an API worker
+do today; the server (started as a subprocess) batches concurrent requests.
+Reports throughput and per-request latency for every concurrency level.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.helpers.inference import OPERATIONS, InferenceClient
+
+TEXTS = [
+    "Мы не допустим ухудшения ситуации на границе.",
+    "Экономика страны продолжает расти, несмотря на санкции.",
+    "Правительство подготовит новые меры поддержки семей с детьми.",
+    "Переговоры зашли в тупик по вине другой стороны.",
+]
+
+
+def measure(
+    call: typing.Callable[[str], typing.Any], concurrency: int, n_requests: int
+) -> typing.Tuple[float, typing.List[float]]:
+    """Returns requests/sec and latencies (sec) of n_requests calls."""
+
+    def timed(idx: int) -> float:
+        start = time.perf_counter()
+        call(TEXTS[idx % len(TEXTS)])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(n_requests)))
+    return n_requests / (time.perf_counter() - start), latencies
+
+
+def report(label: str, throughput: float, latencies: typing.List[float]) -> None:
+    print(
+        f"{label:<22} {throughput:8.1f} req/s, "
+        f"p50 {np.percentile(latencies, 50) * 1000:7.1f} ms, "
+        f"p95 {np.percentile(latencies, 95) * 1000:7.1f} ms"
+    )
+
+
+def start_server(
+    address: str, max_batch_size: int, max_wait_ms: float
+) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "app.cli",
+            "serve-models",
+            "--socket",
+            address,
+            "--max-batch-size",
+            str(max_batch_size),
+            "--max-wait-ms",
+            str(max_wait_ms),
+        ]
+    )
+    # the socket is created once all models are loaded
+    while not os.path.exists(address):
+        if server.poll() is not None:
+            raise SystemExit("Model server exited")
+        time.sleep(0.1)
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--operation", choices=list(OPERATIONS), default="sentiment")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+    run = OPERATIONS[args.operation]
+
+    for concurrency in args.concurrency:
+        throughput, latencies = measure(
+            lambda text: run([text]), concurrency, args.requests
+        )
+        report(f"in process, x{concurrency}", throughput, latencies)
+
+    with tempfile.TemporaryDirectory() as directory:
+        address = os.path.join(directory, "models.sock")
+        server = start_server(address, args.max_batch_size, args.max_wait_ms)
+        client = InferenceClient(address, authkey=get_settings().SECRET_TOKEN.encode())
+        try:
+            for concurrency in args.concurrency:
+                throughput, latencies = measure(
+                    lambda text: client.run(args.operation, [text]),
+                    concurrency,
+                    args.requests,
+                )
+                report(f"server, x{concurrency}", throughput, latencies)
+        finally:
+            client.close()
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
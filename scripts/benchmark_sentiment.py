@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Compares per-sentence and batched sentiment scoring throughput.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_sentiment.py [sentences.txt] [--batch-size 32]
+
+The input file should contain one sentence per line; defaults to spaCy's
+Russian example sentences repeated to a few hundred items.
+"""
+import argparse
+import time
+from pathlib import Path
+
+from spacy.lang.ru.examples import sentences as example_sentences
+
+from app.helpers.sentiment import DEFAULT_BATCH_SIZE, SentimentScorer
+
+
+def read_sentences(path) -> list:
+    if path is None:
+        return example_sentences * 40
+    with Path(path).open("r", encoding="utf-8") as file_content:
+        return [line.strip() for line in file_content if line.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default=None)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    texts = read_sentences(args.path)
+    scorer = SentimentScorer(batch_size=args.batch_size)
+    scorer.predict_batch(texts[: args.batch_size])  # warm-up
+
+    start = time.perf_counter()
+    single = [scorer.predict(text) for text in texts]
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = scorer.predict_batch(texts)
+    batched_elapsed = time.perf_counter() - start
+
+    mismatches = sum(
+        a.prediction_label != b.prediction_label for a, b in zip(single, batched)
+    )
+    print(f"sentences:        {len(texts)} (batch size {args.batch_size})")
+    print(f"per-sentence:     {len(texts) / single_elapsed:.1f} sentences/sec")
+    print(f"batched:          {len(texts) / batched_elapsed:.1f} sentences/sec")
+    print(f"label mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
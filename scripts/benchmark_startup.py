@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Measures cold start of the application and load time of every model.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_startup.py [--runs 5] [--models]
+        [--modules 15]
+
+Imports app.main in fresh interpreters (no model should be loaded by that),
+lists the slowest imported modules (python -X importtime) and, with
+--models, loads each model of the registry in turn.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import typing
+
+IMPORT_APP = """
+import time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+from app.helpers.registry import models
+loaded = [name for name, state in models.status().items() if state.loaded]
+print(elapsed, ",".join(loaded))
+"""
+
+LOAD_MODELS = """
+from app.helpers.registry import models
+for name, state in models.warm_up().items():
+    print(name, state.load_seconds)
+"""
+
+
+def run(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def slowest_modules(limit: int) -> typing.List[typing.Tuple[int, str]]:
+    """Returns (cumulative microseconds, module) of the slowest imports."""
+    stderr = run("import app.main", "-X", "importtime").stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        timings.append((int(cumulative), module.rstrip()))
+    return sorted(timings, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--models", action="store_true", help="load models too")
+    parser.add_argument("--modules", type=int, default=15)
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        elapsed, _, loaded = run(IMPORT_APP).stdout.strip().partition(" ")
+        timings.append(float(elapsed))
+    print(
+        f"import app.main: median {statistics.median(timings):.2f} sec, "
+        f"max {max(timings):.2f} sec ({args.runs} runs)"
+    )
+    print(f"models loaded on import: {loaded or 'none'}")
+
+    print("\nslowest imports (cumulative):")
+    for cumulative, module in slowest_modules(args.modules):
+        print(f"{cumulative / 1e6:8.2f} sec  {module}")
+
+    if args.models:
+        print("\nmodel load time:")
+        for line in run(LOAD_MODELS).stdout.splitlines():
+            name, seconds = line.split()
+            print(f"{float(seconds):8.2f} sec  {name}")
+
+
+if __name__ == "__main__":
+    main()
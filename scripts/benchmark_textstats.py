@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Compares throughput of app.helpers.textstats with ruts.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_textstats.py [sentences.txt]
+        [--batch-size 200]
+
+The input file should contain one sentence per line; defaults to spaCy's
+Russian example sentences, alone and joined into long texts. Sentences are
+passed to calculate_stats_many in batches (a document's worth each) and to
+ruts' analyzers one at a time; reports sentences/sec of both. Metrics are
+checked against ruts by tests/test_textstats.py.
+"""
+import argparse
+import time
+import typing
+from pathlib import Path
+
+from spacy.lang.ru.examples import sentences as example_sentences
+
+from app.helpers.textstats import calculate_stats_many
+
+
+def read_sentences(path: typing.Optional[str]) -> typing.List[str]:
+    if path is None:
+        long_texts = [
+            " ".join(example_sentences[start:] + example_sentences[:start])
+            for start in range(len(example_sentences))
+        ]
+        return (example_sentences + long_texts) * 10
+    with Path(path).open("r", encoding="utf-8") as file_content:
+        return [line.strip() for line in file_content if line.strip()]
+
+
+def ruts_stats(sentence: str) -> None:
+    import ruts  # type: ignore
+
+    try:
+        ruts.BasicStats(sentence).get_stats()
+        ruts.ReadabilityStats(sentence).get_stats()
+        ruts.DiversityStats(sentence).get_stats()
+        ruts.MorphStats(sentence).get_stats()
+    except (AttributeError, ValueError):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default=None)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    sentences = read_sentences(args.path)
+    calculate_stats_many(sentences[:1])  # loads pymorphy2 dictionaries
+
+    start = time.perf_counter()
+    for sentence in sentences:
+        ruts_stats(sentence)
+    ruts_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for first in range(0, len(sentences), args.batch_size):
+        calculate_stats_many(sentences[first : first + args.batch_size])
+    batch_elapsed = time.perf_counter() - start
+
+    print(f"sentences: {len(sentences)} (batches of {args.batch_size})")
+    print(f"ruts:      {len(sentences) / ruts_elapsed:.1f} sentences/sec")
+    print(f"batched:   {len(sentences) / batch_elapsed:.1f} sentences/sec")
+    print(f"speed-up:  {ruts_elapsed / batch_elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Compares per-token and per-doc classification of verb-related tags.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_verb_forms.py [sentences.txt]
+        [--repeat 3]
+
+The input file should contain one sentence per line; defaults to spaCy's
+Russian example sentences repeated to a few thousand items. Sentences are
+parsed once (not measured); then the VERB-labelled key phrase filter of
+ML.match is timed both ways: token.morph.to_dict() for every token of every
+match (the former is_vbg/is_vbn) and slices of treebank.verb_forms (one
+array per doc, built from morph hashes). Flags of every token are compared
+as well; exits with status 1 if any differ.
+"""
+import argparse
+import sys
+import time
+import typing
+from pathlib import Path
+
+from spacy.lang.ru.examples import sentences as example_sentences
+from spacy.tokens import Doc, Token
+
+from app.helpers import treebank
+from app.helpers.registry import get_key_phrase_matcher
+
+
+def read_sentences(path: typing.Optional[str]) -> typing.List[str]:
+    if path is None:
+        return example_sentences * 200
+    with Path(path).open("r", encoding="utf-8") as file_content:
+        return [line.strip() for line in file_content if line.strip()]
+
+
+def token_flags(token: Token) -> int:
+    """Flags as computed by the former per-token helpers."""
+    return treebank.classify_morph(token.morph.to_dict())
+
+
+def per_token(docs: typing.List[Doc], matches) -> int:
+    kept = 0
+    for doc, spans in zip(docs, matches):
+        for start, end in spans:
+            kept += any(
+                token_flags(token) & (treebank.VBG | treebank.VBN)
+                for token in doc[start:end]
+            )
+    return kept
+
+
+def per_doc(docs: typing.List[Doc], matches) -> int:
+    kept = 0
+    for doc, spans in zip(docs, matches):
+        doc.user_data.pop(treebank.USER_DATA_KEY, None)
+        forms = treebank.verb_forms(doc)
+        for start, end in spans:
+            kept += any(
+                flags & (treebank.VBG | treebank.VBN)
+                for flags in forms[start:end].tobytes()
+            )
+    return kept
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", nargs="?", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    key_phrases = get_key_phrase_matcher()
+    docs = list(key_phrases.nlp.pipe(read_sentences(args.path)))
+    matches = [
+        [
+            (start, end)
+            for match_id, start, end in key_phrases.matcher(doc)
+            if "VERB" in key_phrases.nlp.vocab[match_id].text
+        ]
+        for doc in docs
+    ]
+    tokens = sum(len(doc) for doc in docs)
+    spans = sum(len(spans) for spans in matches)
+
+    mismatches = 0
+    for doc in docs:
+        forms = treebank.verb_forms(doc)
+        mismatches += sum(token_flags(token) != forms[token.i] for token in doc)
+
+    timings = {}
+    for name, run in (("per-token", per_token), ("per-doc", per_doc)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            kept = run(docs, matches)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(
+            f"{name:<10} {len(docs) / best:10.1f} sentences/sec, "
+            f"{spans / best:10.1f} matches/sec ({kept} kept)"
+        )
+    print(f"sentences: {len(docs)}, tokens: {tokens}, VERB matches: {spans}")
+    print(f"speed-up:  {timings['per-token'] / timings['per-doc']:.1f}x")
+    print(f"tokens with different flags: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
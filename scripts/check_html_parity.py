@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Checks that the HTML backends of Transformer return identical documents.
+
+Usage:
+    PYTHONPATH=. python scripts/check_html_parity.py "exports/**/*.html"
+        [--backends soup lxml] [--extraction-only]
+    PYTHONPATH=. python scripts/check_html_parity.py --database [--limit 1000]
+
+Every page of the corpus (HTML files or stored exports) is transformed with
+each backend; Document JSON (metadata, themes and sentences) is compared
+byte for byte with the first backend's. The fixture pages of assets/html
+are checked by tests/test_parsing.py. --extraction-only compares parsed
+metadata, themes and paragraphs without running the spaCy pipeline. Lists
+pages the lxml backend hands over to BeautifulSoup, and why; exits with
+status 1 if any page differs.
+"""
+import argparse
+import collections
+import glob
+import sys
+import typing
+
+from app.helpers.parsing import BACKENDS, LxmlPage, parse_page
+from app.helpers.transform import InvalidHTML, Transformer
+
+
+def read_files(pattern: str) -> typing.Iterator[typing.Tuple[str, bytes]]:
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        with open(path, "rb") as page:
+            yield path, page.read()
+
+
+def read_exports(limit: int) -> typing.Iterator[typing.Tuple[str, bytes]]:
+    from sqlmodel import Session, select
+
+    from app.core.config import get_settings
+    from app.db.database import create_db_engine
+    from app.models import Exports
+
+    engine = create_db_engine(get_settings())
+    with Session(engine) as session:
+        for export in session.exec(select(Exports).order_by(Exports.id).limit(limit)):
+            yield f"exports/{export.id}", export.html
+    engine.dispose()
+
+
+def extract(html_contents: bytes, backend: str) -> typing.Any:
+    page = parse_page(html_contents, backend)
+    try:
+        themes: typing.Any = page.themes()
+    except InvalidHTML:
+        themes = None
+    return page.metadata(), themes, page.paragraphs()
+
+
+def transform(html_contents: bytes, backend: str) -> typing.Any:
+    return Transformer(html_contents, backend=backend).as_model().json()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pattern", nargs="?", help="glob of HTML files")
+    parser.add_argument("--database", action="store_true", help="use stored exports")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=["soup", "lxml"]
+    )
+    parser.add_argument("--extraction-only", action="store_true")
+    args = parser.parse_args()
+    if args.pattern is None and not args.database:
+        parser.error("pass a glob of HTML files or --database")
+
+    pages = read_exports(args.limit) if args.database else read_files(args.pattern)
+    run = extract if args.extraction_only else transform
+    reference, *others = args.backends
+    total = mismatched = invalid = 0
+    fallbacks: typing.Counter[str] = collections.Counter()
+    for name, html_contents in pages:
+        total += 1
+        try:
+            expected = run(html_contents, reference)
+        except InvalidHTML:
+            invalid += 1
+            continue
+        reason = LxmlPage(html_contents).diverges()
+        if reason is not None:
+            fallbacks[reason.split(" (")[0]] += 1
+        for backend in others:
+            if run(html_contents, backend) != expected:
+                mismatched += 1
+                print(f"MISMATCH {name}: {reference} != {backend}")
+
+    print(f"pages:     {total} ({invalid} invalid)")
+    print(f"identical: {total - invalid - mismatched}")
+    print(f"lxml falls back to soup for {sum(fallbacks.values())} pages")
+    for reason, count in fallbacks.most_common():
+        print(f"    {count:6d}  {reason}")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Reports memory of gunicorn master & workers (Linux only).
+
+Usage:
+    python scripts/memory_usage.py [--pid MASTER_PID] [--match gunicorn]
+
+RSS counts pages shared with other processes in full, so it overstates
+memory of forked workers. USS (private pages) is what a worker costs on its
+own, PSS splits shared pages between the processes sharing them, so the sum
+of PSS is the memory used by the whole group. With preloaded models a
+worker's USS should stay far below the size of the models.
+"""
+import argparse
+import typing
+from pathlib import Path
+
+
+def read_memory(pid: int) -> typing.Dict[str, int]:
+    """Returns smaps_rollup counters of the process (in kB)."""
+    counters = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        counters[name] = int(value.split()[0])
+    return counters
+
+
+def children(pid: int) -> typing.List[int]:
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    return [int(child) for child in path.read_text().split()]
+
+
+def matching(pattern: str) -> typing.List[int]:
+    """Returns ids of processes whose command line contains the pattern."""
+    pids = []
+    for path in Path("/proc").iterdir():
+        if not path.name.isdigit():
+            continue
+        try:
+            cmdline = (path / "cmdline").read_bytes().replace(b"\0", b" ")
+        except OSError:
+            continue
+        if pattern.encode() in cmdline and b"memory_usage" not in cmdline:
+            pids.append(int(path.name))
+    return sorted(pids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pid", type=int, default=None, help="master process")
+    parser.add_argument("--match", default="gunicorn")
+    args = parser.parse_args()
+
+    pids = [args.pid, *children(args.pid)] if args.pid else matching(args.match)
+    if not pids:
+        raise SystemExit(f"No processes matching {args.match!r}")
+
+    print(f"{'pid':>8} {'rss':>10} {'pss':>10} {'uss':>10} {'shared':>10}  (MiB)")
+    totals = {"rss": 0, "pss": 0, "uss": 0}
+    for pid in pids:
+        counters = read_memory(pid)
+        uss = counters["Private_Clean"] + counters["Private_Dirty"]
+        shared = counters["Shared_Clean"] + counters["Shared_Dirty"]
+        print(
+            f"{pid:>8} {counters['Rss'] / 1024:>10.1f} {counters['Pss'] / 1024:>10.1f}"
+            f" {uss / 1024:>10.1f} {shared / 1024:>10.1f}"
+        )
+        totals["rss"] += counters["Rss"]
+        totals["pss"] += counters["Pss"]
+        totals["uss"] += uss
+    print(
+        f"{'total':>8} {totals['rss'] / 1024:>10.1f} {totals['pss'] / 1024:>10.1f}"
+        f" {totals['uss'] / 1024:>10.1f}"
+    )
+    print(
+        f"\nprocesses: {len(pids)}, memory in use (sum of PSS): "
+        f"{totals['pss'] / 1024:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Checks that the HTML backends return identical documents over the fixture
+pages of assets/html."""
+import typing
+from pathlib import Path
+
+import pytest
+import spacy
+
+from app.helpers.parsing import LxmlPage, Page, SoupPage, parse_page
+from app.helpers.transform import InvalidHTML, Transformer
+
+FIXTURES = sorted(
+    (Path(__file__).resolve().parent.parent / "assets" / "html").glob("*.html")
+)
+# fixture pages libxml2 parses differently from html.parser -> reason
+FALLBACKS = {
+    "cdata.html": "CDATA sections",
+    "crlf.html": "carriage returns",
+    "entity_query_attr.html": "entity &lang",
+    "entity_unknown.html": "entity &notit;",
+    "implied_p.html": "implicitly closed <p>",
+    "li_implied.html": "implicitly closed <li>",
+    "misnest.html": "parser errors",
+    "p_div.html": "parser errors",
+    "script_endtag.html": "implicitly closed <p>",
+}
+
+
+def extract(page: Page) -> typing.Any:
+    try:
+        themes: typing.Any = page.themes()
+    except InvalidHTML:
+        themes = None
+    return page.metadata(), themes, page.paragraphs()
+
+
+def transform(html_contents: bytes, backend: str) -> str:
+    try:
+        return Transformer(html_contents, backend=backend).as_model().json()
+    except InvalidHTML as error:
+        return repr(error)
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.name)
+def test_fallback(path: Path):
+    reason = LxmlPage(path.read_bytes()).diverges()
+    if path.name in FALLBACKS:
+        assert reason is not None and reason.startswith(FALLBACKS[path.name])
+        assert isinstance(parse_page(path.read_bytes(), "lxml"), SoupPage)
+    else:
+        assert reason is None
+        assert isinstance(parse_page(path.read_bytes(), "lxml"), LxmlPage)
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.name)
+def test_extraction_parity(path: Path):
+    html_contents = path.read_bytes()
+    assert extract(parse_page(html_contents, "lxml")) == extract(
+        SoupPage(html_contents)
+    )
+
+
+@pytest.mark.skipif(
+    not spacy.util.is_package("ru_core_news_sm"), reason="spaCy model is missing"
+)
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.name)
+def test_document_parity(path: Path):
+    html_contents = path.read_bytes()
+    assert transform(html_contents, "lxml") == transform(html_contents, "soup")
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Checks text statistics of calculate_stats_many against ruts' analyzers."""
+import math
+import typing
+
+import pytest
+from spacy.lang.ru.examples import sentences as example_sentences
+
+from app.helpers.textstats import calculate_stats_many
+
+ruts = pytest.importorskip("ruts")
+
+# relative & absolute tolerance of numeric metrics (morphology is exact)
+TOLERANCE = 1e-9
+SENTENCES = [
+    "",
+    "   ",
+    "...!?",
+    "— «»",
+    "2022 14 3.5",
+    "Apple выпустила iPhone 14 в 2022 году.",
+    "COVID-19 и ВВП: рост на 4,7% (по данным Росстата).",
+    "Путин В.В.: Добрый день, уважаемые коллеги!",
+    *example_sentences,
+    # diversity metrics use windows of 50 words
+    " ".join(example_sentences * 3),
+]
+
+
+def ruts_stats(sentence: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    try:
+        stats = ruts.BasicStats(sentence).get_stats()
+        stats.update(ruts.ReadabilityStats(sentence).get_stats())
+        stats.update(ruts.DiversityStats(sentence).get_stats())
+        stats.update(morphology=ruts.MorphStats(sentence).get_stats())
+    except (AttributeError, ValueError):
+        return None
+    return stats
+
+
+@pytest.fixture(scope="module")
+def computed() -> typing.Dict[str, typing.Any]:
+    try:
+        ruts.MorphStats("проверка").get_stats()
+    except Exception as error:
+        pytest.skip(f"pymorphy2 is unavailable: {error!r}")
+    # a document's worth of sentences at once
+    return dict(zip(SENTENCES, calculate_stats_many(SENTENCES)))
+
+
+@pytest.mark.parametrize("sentence", SENTENCES, ids=lambda value: repr(value[:30]))
+def test_stats_match_ruts(sentence: str, computed: typing.Dict[str, typing.Any]):
+    expected, stats = ruts_stats(sentence), computed[sentence]
+    if expected is None:
+        assert stats is None
+        return
+    assert stats is not None
+    for name, value in stats.dict().items():
+        if name == "morphology":
+            assert value == expected[name]
+        else:
+            assert math.isclose(
+                value, expected[name], rel_tol=TOLERANCE, abs_tol=TOLERANCE
+            ), name